@@ -0,0 +1,648 @@
+#!/usr/bin/env python3
+#\"\"\"bench_snapshots.py
+
+#Tamamen çevrimdışı, tekrarlanabilir performans ölçümü.
+# - Yerel bir HTTP sunucusu, boyut / DOM derinliği / asset sayısı matrisine göre üretilmiş sayfaları sunar
+# - İkinci sürümde sayfaların bir kısmı değiştirilir; her sayfa için sentetik bir PNG çifti yazılır
+# - Ölçülenler: sayfa başına parse gecikmesi, yakalama hızı (sayfa/sn), görselli ve görselsiz
+#   karşılaştırma hızı (çift/sn), her aşamanın tepe RSS'i
+# - startup: küçük bir çift için pair / compare alt komutlarının açılış süresi (ayrı process'lerde)
+#   ve import sırasında yüklenmemesi gereken ağır modüller; --startup-budget-ms aşılırsa çıkış kodu 1
+# - Sonuçlar JSON'a yazılır; --baseline ile önceki bir sonuç dosyasına göre gerileme raporlanır
+
+#Kullanım:
+#python3 bench_snapshots.py --out bench_results.json
+#python3 bench_snapshots.py --quick --baseline bench_results.json --tolerance 0.25
+#\"\"\"
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+from capture_snapshot import capture_from_list, extract_signals, fingerprint_snapshot_dir
+import compare_snapshots
+from compare_snapshots import compare_dirs
+from snapshot_profiling import percentile
+
+# Tepe bellek ölçümü opsiyonel (resource modülü Windows'ta yok)
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Sentetik ekran görüntüleri opsiyonel
+_PIL = False
+try:
+    from PIL import Image, ImageDraw
+    _PIL = True
+except Exception:
+    _PIL = False
+
+BENCH_FORMAT_VERSION = 1
+DEFAULT_SIZES = '8k,64k,512k'
+DEFAULT_DEPTHS = '4,32'
+DEFAULT_ASSETS = '0,50'
+QUICK_MATRIX = {'sizes': '8k,64k', 'depths': '4', 'assets': '0,20', 'pages_per_case': 1, 'repeat': 1}
+PARAGRAPHS_PER_SECTION = 8
+SCREENSHOT_WIDTH = 1280
+COMPARE_MODES = ('none', 'full', 'thumb', 'tiled')
+STAGES = ('parse', 'capture', 'startup', 'compare')
+STARTUP_RUNS = 7
+# pair alt komutunun yalın interpreter açılışına eklediği süre (medyan, ms) için üst sınır
+STARTUP_BUDGET_MS = 60.0
+# CLI modülleri import edilirken yüklenmemesi gereken (yalnızca ihtiyaç duyan kod yolunda yüklenen) modüller
+LAZY_MODULES = ('requests', 'numpy', 'scipy', 'skimage', 'PIL', 'imagehash', 'sqlite3', 'multiprocessing',
+                'cProfile', 'tracemalloc')
+
+_WORDS = ('snapshot', 'sayfa', 'içerik', 'değişim', 'haber', 'ürün', 'fiyat', 'kampanya', 'güncel',
+          'lorem', 'ipsum', 'dolor', 'network', 'cache', 'server', 'başlık', 'özet', 'kategori',
+          'müşteri', 'sipariş', 'teslimat', 'yorum', 'puan', 'stok', 'indirim', 'arama', 'menü')
+_NEST_TAGS = ('div', 'section', 'article', 'div', 'aside')
+
+# gerileme karşılaştırmasında hangi yön "daha iyi"
+_HIGHER, _LOWER = 'higher', 'lower'
+
+
+def parse_size(value: str) -> int:
+    """'64k' / '1m' / '2048' biçimindeki boyutu byte'a çevirir."""
+    value = value.strip().lower()
+    mult = {'k': 1024, 'm': 1024 * 1024}.get(value[-1:], 1)
+    return int(float(value[:-1] if mult > 1 else value) * mult)
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v.strip()]
+
+def page_cases(sizes: List[int], depths: List[int], assets: List[int], pages_per_case: int,
+               change_ratio: float, seed: int) -> List[Dict[str, Any]]:
+    """Matristeki her (boyut, derinlik, asset) birleşimi için pages_per_case sayfa tanımı üretir."""
+    cases = []
+    for size in sizes:
+        for depth in depths:
+            for n_assets in assets:
+                group = f's{size // 1024}k-d{depth}-a{n_assets}'
+                for i in range(pages_per_case):
+                    name = f'{group}-{i}'
+                    rng = random.Random(f'{seed}:{name}:changed')
+                    cases.append({'name': name, 'group': group, 'size': size, 'depth': depth,
+                                  'assets': n_assets, 'changed': rng.random() < change_ratio})
+    return cases
+
+def _paragraph(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(30, 90))]
+    return ' '.join(words).capitalize() + '.'
+
+def make_page(case: Dict[str, Any], variant: str, seed: int) -> str:
+    """
+    Tanımdan deterministik HTML üretir. variant 'b' ve sayfa 'changed' ise paragrafların
+    ~%5'i ve ilk görselin adresi değiştirilir; diğer sayfalar iki sürümde byte byte aynıdır.
+    """
+    rng = random.Random(f'{seed}:{case["name"]}')
+    depth, n_assets = case['depth'], case['assets']
+    nest_overhead = depth * 40
+    sections, est = [], 0
+    while est < case['size']:
+        paras = [_paragraph(rng) for _ in range(PARAGRAPHS_PER_SECTION)]
+        sections.append(paras)
+        est += sum(len(p) + 7 for p in paras) + nest_overhead
+    img_srcs = [f'/assets/img{i}.png' for i in range(n_assets - 2 * (n_assets // 3))]
+    css_hrefs = [f'/assets/style{i}.css' for i in range(n_assets // 3)]
+    js_srcs = [f'/assets/app{i}.js' for i in range(n_assets // 3)]
+
+    if variant == 'b' and case['changed']:
+        rng_b = random.Random(f'{seed}:{case["name"]}:b')
+        flat = [(si, pi) for si in range(len(sections)) for pi in range(PARAGRAPHS_PER_SECTION)]
+        for si, pi in rng_b.sample(flat, max(1, len(flat) // 20)):
+            sections[si][pi] = _paragraph(rng_b)
+        if img_srcs:
+            img_srcs[0] += '?v=2'
+
+    out = ['<!DOCTYPE html>\n<html lang="tr"><head><meta charset="utf-8">',
+           f'<title>Bench {case["name"]}</title>']
+    out.extend(f'<link rel="stylesheet" href="{h}">' for h in css_hrefs)
+    out.extend(f'<script src="{s}"></script>' for s in js_srcs)
+    out.append('<style>body{font-family:sans-serif}</style><script>window.bench=1;</script></head><body>')
+    img_iter = iter(img_srcs)
+    per_section = -(-len(img_srcs) // len(sections)) if img_srcs else 0
+    for si, paras in enumerate(sections):
+        tags = [_NEST_TAGS[d % len(_NEST_TAGS)] for d in range(depth)]
+        out.extend(f'<{t} class="lvl{d} sec{si % 7}">' for d, t in enumerate(tags))
+        out.extend(f'<p>{p}</p>' for p in paras)
+        for _ in range(per_section):
+            src = next(img_iter, None)
+            if src:
+                out.append(f'<img src="{src}" alt="">')
+        out.extend(f'</{t}>' for t in reversed(tags))
+    out.append('</body></html>\n')
+    return '\n'.join(out)
+
+def make_screenshot(case: Dict[str, Any], variant: str, seed: int, height: int) -> Optional[bytes]:
+    """Sayfaya karşılık gelen sentetik PNG; değişen sayfaların 'b' sürümünde bir bölge farklı boyanır."""
+    if not _PIL:
+        return None
+    import io
+    rng = random.Random(f'{seed}:{case["name"]}:png')
+    img = Image.new('RGB', (SCREENSHOT_WIDTH, height), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    y = 0
+    while y < height:
+        h = rng.randint(20, 160)
+        shade = rng.randint(120, 240)
+        draw.rectangle((rng.randint(0, 80), y, SCREENSHOT_WIDTH - rng.randint(0, 80), y + h),
+                       fill=(shade, shade - 20, shade - 40))
+        y += h + rng.randint(8, 40)
+    if variant == 'b' and case['changed']:
+        rng_b = random.Random(f'{seed}:{case["name"]}:png-b')
+        x0, y0 = rng_b.randint(0, SCREENSHOT_WIDTH - 300), rng_b.randint(0, height - 200)
+        draw.rectangle((x0, y0, x0 + 300, y0 + 200), fill=(220, 30, 30))
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+# ---- Yerel sentetik site ----
+
+class SyntheticSite:
+    """Üretilmiş sayfaları bellekten sunan yerel HTTP sunucusu; version 'a' / 'b' arasında geçiş yapılır."""
+
+    def __init__(self, cases: List[Dict[str, Any]], seed: int):
+        self.pages = {
+            variant: {f'/{c["name"]}.html': make_page(c, variant, seed).encode('utf-8') for c in cases}
+            for variant in ('a', 'b')
+        }
+        self.version = 'a'
+        site = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                body = site.pages[site.version].get(self.path.split('?', 1)[0])
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# ---- Ölçüm yardımcıları ----
+
+def peak_rss_kb() -> Optional[int]:
+    """Bu process'in şimdiye kadarki tepe RSS'i (KiB); ölçülemiyorsa None."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+def _measured(fn: Callable[..., Dict[str, Any]], *args) -> Dict[str, Any]:
+    res = fn(*args)
+    res['peak_rss_kb'] = peak_rss_kb()
+    return res
+
+def run_stage(fn: Callable[..., Dict[str, Any]], *args, isolate: bool = True) -> Dict[str, Any]:
+    """
+    Aşamayı taze bir (spawn) process'te çalıştırır; böylece tepe RSS yalnızca o aşamaya aittir.
+    isolate=False ise aynı process'te çalışır (RSS o ana kadarki tepe değer olur).
+    """
+    if not isolate:
+        return _measured(fn, *args)
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as ex:
+        return ex.submit(_measured, fn, *args).result()
+
+
+# ---- Aşamalar (spawn ile çağrılabilmeleri için modül seviyesinde) ----
+
+def stage_idle() -> Dict[str, Any]:
+    """Yalnızca modüllerin yüklendiği process; diğer aşamaların RSS'i için taban değer."""
+    return {}
+
+def stage_parse(cases: List[Dict[str, Any]], seed: int, repeat: int) -> Dict[str, Any]:
+    """Her sayfa için extract_signals süresi (repeat denemenin en iyisi), grup ve toplam bazında."""
+    groups: Dict[str, Dict[str, Any]] = {}
+    latencies, total_bytes, total_time = [], 0, 0.0
+    for case in cases:
+        html = make_page(case, 'a', seed)
+        best = None
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            extract_signals(html)
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        size = len(html.encode('utf-8'))
+        latencies.append(best)
+        total_bytes += size
+        total_time += best
+        g = groups.setdefault(case['group'], {'pages': 0, 'bytes': 0, 'latencies': []})
+        g['pages'] += 1
+        g['bytes'] += size
+        g['latencies'].append(best)
+    by_group = {}
+    for name, g in groups.items():
+        lat = g.pop('latencies')
+        by_group[name] = dict(g, median_ms=round(percentile(lat, 0.5) * 1000, 3),
+                              max_ms=round(max(lat) * 1000, 3),
+                              mb_per_s=round(g['bytes'] / sum(lat) / 1e6, 3))
+    return {
+        'pages': len(cases),
+        'bytes': total_bytes,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3),
+        'mb_per_s': round(total_bytes / total_time / 1e6, 3),
+        'groups': by_group,
+    }
+
+def stage_capture(url_file: str, out_dir: str, workers: int) -> Dict[str, Any]:
+    """capture_from_list ile tüm listeyi yakalar; sayfa/sn ve MB/sn döner."""
+    t0 = time.perf_counter()
+    results = capture_from_list(url_file, out_dir, workers=workers, per_host=workers)
+    elapsed = time.perf_counter() - t0
+    ok = [r for r in results if r['status'] == 'ok' and 'error' not in r['out']]
+    total_bytes = sum(r['out'].get('length') or 0 for r in ok)
+    return {
+        'pages': len(results),
+        'errors': len(results) - len(ok),
+        'seconds': round(elapsed, 4),
+        'pages_per_s': round(len(ok) / elapsed, 3) if elapsed else None,
+        'mb_per_s': round(total_bytes / elapsed / 1e6, 3) if elapsed else None,
+    }
+
+def stage_fingerprint(dirs: List[str]) -> Dict[str, Any]:
+    """fingerprint_snapshot_dir ile ekran görüntülerinin phash + küçük kopyalarını önceden hesaplar."""
+    t0 = time.perf_counter()
+    updated = sum(fingerprint_snapshot_dir(d)['updated'] for d in dirs)
+    elapsed = time.perf_counter() - t0
+    return {'images': updated, 'seconds': round(elapsed, 4),
+            'images_per_s': round(updated / elapsed, 3) if elapsed and updated else None}
+
+def _cli_env() -> Dict[str, str]:
+    # CLI'lar normalde .pyc önbelleğiyle çalışır; ortam bytecode yazmayı kapatmışsa açılış derleme içerir
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+def _median_run_ms(cmd: List[str], runs: int) -> float:
+    """Komutu bir kez ısınma için, sonra runs kez çalıştırır; duvar saati medyanı (ms)."""
+    here, env = os.path.dirname(os.path.abspath(__file__)), _cli_env()
+    times = []
+    for i in range(runs + 1):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, cwd=here, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if i:
+            times.append((time.perf_counter() - t0) * 1000)
+    return round(percentile(times, 0.5), 3)
+
+def _slowest_imports(module: str, top: int = 5) -> List[Dict[str, Any]]:
+    """python -X importtime çıktısından modülün doğrudan import ettiği en pahalı modüller (kümülatif)."""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True,
+                         text=True, cwd=os.path.dirname(os.path.abspath(__file__)), env=_cli_env())
+    entries = []   # (derinlik, ad, kümülatif µs); alt modüller üst modülden önce yazılır
+    for line in out.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            name = parts[2].rstrip()
+            entries.append(((len(name) - len(name.lstrip()) - 1) // 2, name.strip(), int(parts[1])))
+    rows = []
+    for i in range(len(entries) - 1, -1, -1):
+        if entries[i][:2] == (0, module):
+            # modülün satırından geriye, bir önceki kök satırına kadar: yalnızca doğrudan import ettikleri
+            for depth, name, cumulative in reversed(entries[:i]):
+                if depth == 0:
+                    break
+                if depth == 1:
+                    rows.append({'module': name, 'cumulative_ms': cumulative / 1000})
+            break
+    return sorted(rows, key=lambda r: -r['cumulative_ms'])[:top]
+
+def stage_startup(first: str, second: str, out_dir: str, runs: int = STARTUP_RUNS) -> Dict[str, Any]:
+    """
+    Küçük, ekran görüntüsüz bir çift için 'compare_snapshots pair' ve 'capture_snapshot compare'
+    komutlarının açılış + kıyas süresi; yalın interpreter açılışı ayrıca ölçülüp çıkarılır.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    py = sys.executable
+    interpreter = _median_run_ms([py, '-c', 'pass'], runs)
+    pair = _median_run_ms([py, '-m', 'compare_snapshots', 'pair', '--first', first, '--second', second,
+                           '--out', os.path.join(out_dir, 'pair.json')], runs)
+    capture_compare = _median_run_ms([py, '-m', 'capture_snapshot', 'compare', '--first', first, '--second', second,
+                                      '--out', os.path.join(out_dir, 'capture_compare.json')], runs)
+    probe = subprocess.run([py, '-c', 'import json, sys, capture_snapshot, compare_snapshots; '
+                                      f'print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))'],
+                           capture_output=True, text=True, check=True, env=_cli_env(),
+                           cwd=os.path.dirname(os.path.abspath(__file__)))
+    return {
+        'runs': runs,
+        'interpreter_ms': interpreter,
+        'pair_ms': pair,
+        'pair_overhead_ms': round(pair - interpreter, 3),
+        'capture_compare_ms': capture_compare,
+        'capture_compare_overhead_ms': round(capture_compare - interpreter, 3),
+        'eager_modules': json.loads(probe.stdout),
+        'slowest_imports': {m: _slowest_imports(m) for m in ('compare_snapshots', 'capture_snapshot')},
+    }
+
+def check_startup_budget(startup: Dict[str, Any], budget_ms: float) -> List[Dict[str, Any]]:
+    """Açılış bütçesi ihlalleri: pair'in interpreter üstü süresi ve import'ta yüklenen ağır modüller."""
+    violations = []
+    if startup.get('pair_overhead_ms') is not None and startup['pair_overhead_ms'] > budget_ms:
+        violations.append({'check': 'pair_overhead_ms', 'budget': budget_ms, 'current': startup['pair_overhead_ms']})
+    if startup.get('eager_modules'):
+        violations.append({'check': 'eager_modules', 'modules': startup['eager_modules']})
+    return violations
+
+def stage_compare(base_dir: str, current_dir: str, out_dir: str, mode: str, cached: bool = False) -> Dict[str, Any]:
+    """
+    compare_dirs'i tek process'te (jobs=1) çalıştırıp çift/sn döner. cached=True ise önce
+    önbellek doldurulur, ölçülen ikinci (artımlı) çalıştırmadır.
+    """
+    visual_mode = compare_snapshots.DEFAULT_VISUAL_MODE if mode == 'none' else mode
+    if cached:
+        compare_dirs(base_dir, current_dir, out_dir, visual_mode=visual_mode)
+    t0 = time.perf_counter()
+    res = compare_dirs(base_dir, current_dir, out_dir, incremental=cached, visual_mode=visual_mode)
+    elapsed = time.perf_counter() - t0
+    if 'error' in res:
+        return res
+    changed = sum(1 for r in res['results'] if (r.get('summary') or {}).get('text_changed'))
+    return {
+        'pairs': res['count_compared'],
+        'cached': res['count_cached'],
+        'text_changed': changed,
+        'seconds': round(elapsed, 4),
+        'pairs_per_s': round(res['count_compared'] / elapsed, 3) if elapsed else None,
+    }
+
+
+# ---- Sonuçlar ve gerileme karşılaştırması ----
+
+def flatten_metrics(results: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Karşılaştırılabilir metrikleri 'aşama.ad' -> {'value', 'better'} biçiminde düzleştirir."""
+    metrics: Dict[str, Dict[str, Any]] = {}
+
+    def _put(name, value, better):
+        if isinstance(value, (int, float)):
+            metrics[name] = {'value': value, 'better': better}
+
+    parse = results.get('parse') or {}
+    _put('parse.p50_ms', parse.get('p50_ms'), _LOWER)
+    _put('parse.p95_ms', parse.get('p95_ms'), _LOWER)
+    _put('parse.mb_per_s', parse.get('mb_per_s'), _HIGHER)
+    _put('parse.peak_rss_kb', parse.get('peak_rss_kb'), _LOWER)
+    capture = results.get('capture') or {}
+    _put('capture.pages_per_s', capture.get('pages_per_s'), _HIGHER)
+    _put('capture.mb_per_s', capture.get('mb_per_s'), _HIGHER)
+    _put('capture.peak_rss_kb', capture.get('peak_rss_kb'), _LOWER)
+    startup = results.get('startup') or {}
+    _put('startup.pair_ms', startup.get('pair_ms'), _LOWER)
+    _put('startup.pair_overhead_ms', startup.get('pair_overhead_ms'), _LOWER)
+    _put('startup.capture_compare_overhead_ms', startup.get('capture_compare_overhead_ms'), _LOWER)
+    fp = results.get('fingerprint') or {}
+    _put('fingerprint.images_per_s', fp.get('images_per_s'), _HIGHER)
+    for mode, res in (results.get('compare') or {}).items():
+        _put(f'compare.{mode}.pairs_per_s', res.get('pairs_per_s'), _HIGHER)
+        _put(f'compare.{mode}.peak_rss_kb', res.get('peak_rss_kb'), _LOWER)
+    return metrics
+
+def find_regressions(metrics: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                     tolerance: float) -> List[Dict[str, Any]]:
+    """Baseline'a göre 'better' yönünün tersine tolerance oranından fazla kötüleşen metrikler."""
+    regressions = []
+    for name, cur in sorted(metrics.items()):
+        base = baseline.get(name)
+        if not base or not base.get('value'):
+            continue
+        change = (cur['value'] - base['value']) / base['value']
+        worse = -change if cur['better'] == _HIGHER else change
+        if worse > tolerance:
+            regressions.append({'metric': name, 'baseline': base['value'], 'current': cur['value'],
+                                'change': round(change, 4)})
+    return regressions
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+def run_benchmarks(cases: List[Dict[str, Any]], seed: int = 1, repeat: int = 3, workers: int = 4,
+                   png_height: int = 2048, stages: tuple = STAGES,
+                   isolate: bool = True, work_dir: Optional[str] = None,
+                   progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Tüm aşamaları sırayla çalıştırır. startup ve compare aşamaları capture'ın yazdığı klasörleri
+    kullanır; capture seçilmemişse ikisi de atlanır.
+    """
+    note = progress or (lambda msg: None)
+    keep = work_dir is not None
+    work_dir = os.path.abspath(work_dir) if keep else tempfile.mkdtemp(prefix='snapbench-')
+    os.makedirs(work_dir, exist_ok=True)
+    results: Dict[str, Any] = {}
+    try:
+        note('idle')
+        results['baseline_rss_kb'] = run_stage(stage_idle, isolate=isolate)['peak_rss_kb']
+
+        if 'parse' in stages:
+            note('parse')
+            results['parse'] = run_stage(stage_parse, cases, seed, repeat, isolate=isolate)
+
+        if 'capture' not in stages:
+            return results
+        site = SyntheticSite(cases, seed)
+        site.start()
+        try:
+            url_file = os.path.join(work_dir, 'urls.txt')
+            with open(url_file, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(f'{site.base_url}/{c["name"]}.html' for c in cases) + '\n')
+            base_dir, curr_dir = os.path.join(work_dir, 'base'), os.path.join(work_dir, 'current')
+            passes = []
+            for version, out_dir in (('a', base_dir), ('b', curr_dir)):
+                note(f'capture ({version})')
+                site.version = version
+                passes.append(run_stage(stage_capture, url_file, out_dir, workers, isolate=isolate))
+        finally:
+            site.stop()
+        seconds = sum(p['seconds'] for p in passes)
+        pages = sum(p['pages'] - p['errors'] for p in passes)
+        results['capture'] = {
+            'pages': sum(p['pages'] for p in passes),
+            'errors': sum(p['errors'] for p in passes),
+            'workers': workers,
+            'seconds': round(seconds, 4),
+            'pages_per_s': round(pages / seconds, 3) if seconds else None,
+            'mb_per_s': round(sum(p['mb_per_s'] * p['seconds'] for p in passes if p['mb_per_s']) / seconds, 3)
+                        if seconds else None,
+            'peak_rss_kb': max((p['peak_rss_kb'] or 0) for p in passes) or None,
+        }
+
+        if 'startup' in stages:
+            note('startup')
+            # en küçük sayfanın çifti, ekran görüntüleri yazılmadan önce (görsel kütüphaneler yüklenmemeli)
+            stem = '001_'
+            first, second = (os.path.join(d, next(n for n in sorted(os.listdir(d)) if n.startswith(stem)))
+                             for d in (base_dir, curr_dir))
+            results['startup'] = stage_startup(first, second, os.path.join(work_dir, 'startup'))
+
+        if 'compare' not in stages:
+            return results
+        compare: Dict[str, Any] = {}
+        note('compare (none)')
+        compare['none'] = run_stage(stage_compare, base_dir, curr_dir, os.path.join(work_dir, 'diffs-none'),
+                                    'none', isolate=isolate)
+        if not (_PIL and compare_snapshots._VIS_LIBS):
+            results['compare'] = compare
+            results['visual_skipped'] = 'visual_libs_missing'
+            return results
+        for case in cases:
+            stem = f'{cases.index(case) + 1:03d}'
+            for version, out_dir in (('a', base_dir), ('b', curr_dir)):
+                json_name = next(n for n in os.listdir(out_dir) if n.startswith(stem + '_') and n.endswith('.json'))
+                with open(os.path.join(out_dir, json_name[:-5] + '.png'), 'wb') as f:
+                    f.write(make_screenshot(case, version, seed, png_height))
+        for mode in COMPARE_MODES[1:]:
+            note(f'compare ({mode})')
+            compare[mode] = run_stage(stage_compare, base_dir, curr_dir, os.path.join(work_dir, f'diffs-{mode}'),
+                                      mode, isolate=isolate)
+        note('fingerprint')
+        results['fingerprint'] = run_stage(stage_fingerprint, [base_dir, curr_dir], isolate=isolate)
+        note('compare (tiled_fp)')
+        compare['tiled_fp'] = run_stage(stage_compare, base_dir, curr_dir, os.path.join(work_dir, 'diffs-tiled-fp'),
+                                        'tiled', isolate=isolate)
+        note('compare (tiled_cached)')
+        compare['tiled_cached'] = run_stage(stage_compare, base_dir, curr_dir,
+                                            os.path.join(work_dir, 'diffs-tiled-cached'), 'tiled', True,
+                                            isolate=isolate)
+        results['compare'] = compare
+        return results
+    finally:
+        if keep:
+            results['work_dir'] = work_dir
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Offline benchmark suite for capture/compare against a local synthetic site')
+    ap.add_argument('--out', '-o', default='bench_results.json', help='Machine-readable results file (default: %(default)s)')
+    ap.add_argument('--baseline', help='Previous results file; metrics worse than --tolerance are reported as regressions')
+    ap.add_argument('--tolerance', type=float, default=0.2,
+                    help='Allowed relative slowdown / memory growth vs. baseline (default: %(default)s)')
+    ap.add_argument('--sizes', default=DEFAULT_SIZES, help='Page sizes, e.g. 8k,64k,512k (default: %(default)s)')
+    ap.add_argument('--depths', default=DEFAULT_DEPTHS, help='DOM nesting depths (default: %(default)s)')
+    ap.add_argument('--assets', default=DEFAULT_ASSETS, help='Asset references per page (default: %(default)s)')
+    ap.add_argument('--pages-per-case', type=int, default=2, help='Pages per size/depth/asset combination (default: 2)')
+    ap.add_argument('--change-ratio', type=float, default=0.5, help='Fraction of pages that differ between the two captures (default: 0.5)')
+    ap.add_argument('--png-height', type=int, default=2048, help='Synthetic screenshot height in px (width 1280, default: 2048)')
+    ap.add_argument('--workers', '-w', type=int, default=4, help='Capture workers (default: 4)')
+    ap.add_argument('--repeat', type=int, default=3, help='Parse timing repetitions per page; the best is kept (default: 3)')
+    ap.add_argument('--seed', type=int, default=1, help='Seed for the generated site (default: 1)')
+    ap.add_argument('--stages', default=','.join(STAGES), help='Comma-separated stages to run (default: %(default)s)')
+    ap.add_argument('--startup-budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                    help='Max median startup cost of the pair subcommand above bare interpreter start (default: %(default)s)')
+    ap.add_argument('--quick', action='store_true', help='Small matrix for a fast smoke run')
+    ap.add_argument('--no-isolate', action='store_true', help='Run stages in this process (peak RSS becomes cumulative)')
+    ap.add_argument('--keep-dir', help='Keep generated snapshots/diffs in this directory instead of a temp dir')
+    args = ap.parse_args()
+
+    if args.quick:
+        for key, value in QUICK_MATRIX.items():
+            setattr(args, key, value)
+    config = {
+        'sizes': [parse_size(s) for s in args.sizes.split(',') if s.strip()],
+        'depths': _int_list(args.depths),
+        'assets': _int_list(args.assets),
+        'pages_per_case': args.pages_per_case,
+        'change_ratio': args.change_ratio,
+        'png_height': args.png_height,
+        'workers': args.workers,
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'isolated': not args.no_isolate,
+    }
+    stages = tuple(s.strip() for s in args.stages.split(',') if s.strip())
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        print(json.dumps({'error': 'unknown_stage', 'stages': unknown}, ensure_ascii=False, indent=2))
+        sys.exit(2)
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(json.dumps({'error': 'baseline_unreadable', 'path': os.path.abspath(args.baseline), 'msg': str(e)},
+                             ensure_ascii=False, indent=2))
+            sys.exit(2)
+
+    cases = page_cases(config['sizes'], config['depths'], config['assets'], config['pages_per_case'],
+                       config['change_ratio'], config['seed'])
+    results = run_benchmarks(cases, seed=config['seed'], repeat=config['repeat'], workers=config['workers'],
+                             png_height=config['png_height'], stages=stages, isolate=config['isolated'],
+                             work_dir=args.keep_dir,
+                             progress=lambda stage: print(f'[bench] {stage}', file=sys.stderr, flush=True))
+    report = {
+        'format_version': BENCH_FORMAT_VERSION,
+        'created_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'git_revision': _git_revision(),
+        'host': {'python': platform.python_version(), 'platform': platform.platform(),
+                 'cpu_count': os.cpu_count()},
+        'config': config,
+        'results': results,
+        'metrics': flatten_metrics(results),
+    }
+    if baseline is not None:
+        report['baseline'] = {'path': os.path.abspath(args.baseline), 'git_revision': baseline.get('git_revision'),
+                              'tolerance': args.tolerance}
+        report['regressions'] = find_regressions(report['metrics'], baseline.get('metrics') or {}, args.tolerance)
+    if 'startup' in results:
+        report['startup_budget'] = {'budget_ms': args.startup_budget_ms,
+                                    'violations': check_startup_budget(results['startup'], args.startup_budget_ms)}
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps({'out': os.path.abspath(args.out), 'metrics': {k: v['value'] for k, v in report['metrics'].items()},
+                      'regressions': report.get('regressions'),
+                      'startup_budget': report.get('startup_budget')}, ensure_ascii=False, indent=2))
+    if report.get('regressions') or (report.get('startup_budget') or {}).get('violations'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,17 +15,53 @@
 #\"\"\"
 
 import argparse
+import array
+import codecs
 import json
 import os
 import sys
 import hashlib
-import requests
-from requests.exceptions import RequestException
+import heapq
+import random
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
 from dataclasses import asdict
-from typing import List, Optional, Dict, Any
-from bs4 import BeautifulSoup
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Optional, Dict, Any
+from urllib.parse import urldefrag, urljoin, urlsplit
 from collections import Counter
+from snapshot_store import (SNAPSHOT_EXT, BlobStore, HistoryStore, JobQueue, absolutize_refs, externalize,
+                            is_snapshot_file, load_screenshot, load_snapshot, relink_refs, screenshot_digest,
+                            write_snapshot_file)
+from snapshot_masking import CompiledMask, MaskRules
+from snapshot_profiling import SlowestProfiles, StageTimer, summarize_timings, timed
+from html.entities import html5 as _HTML5_ENTITIES
+from html.parser import HTMLParser
 import re
+import zlib
+
+# requests (urllib3, charset tespiti, certifi ile ~80 ms) yalnızca ağa çıkan kod yollarında yüklenir;
+# compare / convert / pack gibi alt komutlar ve modülü import eden araçlar bunu ödemez.
+if TYPE_CHECKING:
+    import requests
+
+REQUEST_TIMEOUT = 10
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+CHARSET_SCAN_BYTES = 4096          # <meta charset> aranan baş kısım
+CHARSET_DETECT_BYTES = 64 * 1024   # istatistiksel tahmine verilen en fazla bayt
+SNAPSHOT_FORMATS = {'json': '.json', 'snap': SNAPSHOT_EXT}   # liste modunda dosya uzantısı
+ASSET_WORKERS = 8             # asset içerik indirme havuzu (tüm sayfalar için ortak)
+ASSET_MAX_BYTES = 20 * 1024 * 1024
+QUEUE_LEASE_SECONDS = 300.0   # kuyruk modunda bir işin kirası; çalışırken lease/3 aralıkla yenilenir
+QUEUE_RETRY_DELAY = 30.0      # başarısız denemeden sonra işin yeniden alınabileceği en erken süre
+QUEUE_POLL_SECONDS = 5.0      # alınacak iş yokken (başka worker'ların kirası sürerken) bekleme aralığı
+
+def utc_now_iso() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
 
 def _sha(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
@@ -44,65 +80,593 @@ def slugify(url: str) -> str:
     s = re.sub(r"[^a-zA-Z0-9]+", "-", url)  # harf/rakam dışındaki her şeyi tire yap
     return s.strip("-").lower()[:120]
 
-def take_snapshot(url: str) -> dict:
+# ---- Tek geçişli sinyal çıkarıcı ----
+# BeautifulSoup(html, "html.parser") ağacını kurmadan, aynı HTMLParser olaylarından
+# title / görünür metin / tag_counts / asset listeleri / normalize HTML hash'ini tek
+# geçişte üretir. Ağaç kurma ve serileştirme kuralları (boşluk birleştirme, void tag'ler,
+# çok değerli attribute'lar, <meta charset> değişimi, entity kaçışları) BeautifulSoup
+# ile birebir aynı tutulur; böylece eski snapshot'ların hash'leri değişmez.
+
+_VOID_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link',
+    'menuitem', 'meta', 'param', 'source', 'track', 'wbr',
+    'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+])
+_EXTRACTED_TAGS = frozenset(['script', 'style'])                    # hash/sayım öncesi çıkarılan tag'ler
+_STRING_CONTAINER_TAGS = frozenset(['rt', 'rp', 'style', 'script', 'template'])  # get_text'e girmeyen metinler
+_PRESERVE_WS_TAGS = frozenset(['pre', 'textarea'])
+# içeriği asset olarak indirilen <link rel=...> türleri (canonical/alternate gibi sayfa bağlantıları hariç)
+_FETCHABLE_LINK_RELS = frozenset(['stylesheet', 'icon', 'apple-touch-icon', 'preload', 'modulepreload', 'manifest'])
+_ASSET_FIELDS = ('status', 'sha256', 'size', 'content_type', 'truncated')   # asset özetinde saklanan alanlar
+_MULTI_VALUED_ATTRS = {
+    '*': frozenset(['class', 'accesskey', 'dropzone']),
+    'a': frozenset(['rel', 'rev']),
+    'link': frozenset(['rel', 'rev']),
+    'td': frozenset(['headers']),
+    'th': frozenset(['headers']),
+    'form': frozenset(['accept-charset']),
+    'object': frozenset(['archive']),
+    'area': frozenset(['rel']),
+    'icon': frozenset(['sizes']),
+    'iframe': frozenset(['sandbox']),
+    'output': frozenset(['for']),
+}
+_ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+_META_CHARSET_RE = re.compile(r"((^|;)\s*charset=)([^;]*)", re.M)
+_HEADER_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([^\s;"\']+)', re.I)
+_META_CHARSET_BYTES_RE = re.compile(rb'<meta\s[^>]*?charset\s*=\s*["\']?\s*([A-Za-z0-9_.:-]+)', re.I)
+_BOMS = ((codecs.BOM_UTF8, 'utf-8'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+_XML_ESCAPE_RE = re.compile(r"([<>&])")
+_XML_ESCAPES = {'<': '&lt;', '>': '&gt;', '&': '&amp;'}
+_DECIMAL_REF_RE = re.compile(r"^([0-9]+)(.*)")
+_HEX_REF_RE = re.compile(r"^([0-9a-f]+)(.*)")
+_WS_RE = re.compile(r'\s+')
+
+_ENTITY_TO_CHAR: Dict[str, str] = {}
+for _name, _char in sorted(_HTML5_ENTITIES.items()):
+    _ENTITY_TO_CHAR.setdefault(_name[:-1] if _name.endswith(';') else _name, _char)
+
+# endData türleri
+_TEXT, _COMMENT, _CDATA, _DOCTYPE, _DECL, _PI = range(6)
+_WRAPPERS = {
+    _COMMENT: ('<!--', '-->'),
+    _CDATA: ('<![CDATA[', ']]>'),
+    _DOCTYPE: ('<!DOCTYPE ', '>\n'),
+    _DECL: ('<?', '?>'),
+    _PI: ('<?', '>'),
+}
+
+def _xml_escape(s: str) -> str:
+    return _XML_ESCAPE_RE.sub(lambda m: _XML_ESCAPES[m.group(0)], s)
+
+def _quote_attr(value: str) -> str:
+    value = _xml_escape(value)
+    if '"' in value:
+        if "'" in value:
+            return '"' + value.replace('"', '&quot;') + '"'
+        return "'" + value + "'"
+    return '"' + value + '"'
+
+def _charref_to_text(name: str) -> tuple:
+    """Sayısal karakter referansını (&#...;) çözer -> (karakter, artık veri)."""
+    base, reg = 10, _DECIMAL_REF_RE
+    if name.startswith('x') or name.startswith('X'):
+        name, base, reg = name[1:], 16, _HEX_REF_RE
+    extra = ''
+    try:
+        num = int(name, base)
+    except ValueError:
+        m = reg.search(name)
+        if m is None:
+            return '', name
+        num, extra = int(m.group(1), base), m.group(2)
+    if num == 0 or num > 0x10ffff or 0xd800 <= num <= 0xdfff:
+        return '\ufffd', extra
+    if 0x80 <= num <= 0x9f:
+        try:
+            return bytes([num]).decode('cp1252'), extra
+        except UnicodeDecodeError:
+            pass
+    return chr(num), extra
+
+class _WsCollapsingHasher:
+    """Boşlukları tek boşluğa indirilmiş (\\s+ -> ' ') metnin sha256'sını parça parça hesaplar."""
+    _FLUSH_AT = 1 << 16
+
+    def __init__(self):
+        self._h = hashlib.sha256()
+        self._buf: List[str] = []
+        self._size = 0
+        self._last_ws = False
+
+    def update(self, piece: str):
+        self._buf.append(piece)
+        self._size += len(piece)
+        if self._size >= self._FLUSH_AT:
+            self._flush()
+
+    def _flush(self):
+        chunk = _WS_RE.sub(' ', ''.join(self._buf))
+        self._buf, self._size = [], 0
+        if self._last_ws and chunk.startswith(' '):
+            chunk = chunk[1:]
+        if chunk:
+            self._last_ws = chunk.endswith(' ')
+            self._h.update(chunk.encode('utf-8'))
+
+    def hexdigest(self) -> str:
+        self._flush()
+        return self._h.hexdigest()
+
+# Görünür metin parçaları: token akışı üzerinde gear tarzı kayan hash; üst CHUNK_MASK bitleri
+# sıfır olduğunda parça biter (ortalama ~CHUNK_MIN_TOKENS + 64 token). Sınırlar içerikle
+# belirlendiği için bir yerdeki ekleme/silme yalnızca çevresindeki parçaların hash'ini değiştirir.
+CHUNK_MIN_TOKENS = 16
+CHUNK_MAX_TOKENS = 256
+CHUNK_MASK = 0x3F << 26
+
+class _TextChunker:
+    """Normalize görünür metni [hash16, byte offset, byte uzunluğu] parçalarına böler (offset'ler UTF-8)."""
+
+    def __init__(self):
+        self.chunks: List[list] = []
+        self._tokens: List[bytes] = []
+        self._start = 0
+        self._pos = 0
+        self._roll = 0
+
+    def feed(self, norm: str) -> List[int]:
+        """
+        norm: tek boşlukla ayrılmış token'lar (text_hash'e giren akışın bir parçası).
+        Token'ların crc32'lerini döndürür (SimHash shingle'ları için yeniden kullanılır).
+        """
+        toks = norm.encode('utf-8').split(b' ')
+        crcs = list(map(zlib.crc32, toks))
+        tokens, roll, pos = self._tokens, self._roll, self._pos
+        if pos:
+            pos += 1
+        for b, g in zip(toks, crcs):
+            if not tokens:
+                self._start = pos
+            tokens.append(b)
+            pos += len(b) + 1
+            roll = ((roll << 1) + g) & 0xFFFFFFFF
+            if (len(tokens) >= CHUNK_MIN_TOKENS and not roll & CHUNK_MASK) or len(tokens) >= CHUNK_MAX_TOKENS:
+                self._pos = pos - 1
+                self._emit()
+                tokens = self._tokens
+        self._roll, self._pos = roll, pos - 1
+        return crcs
+
+    def _emit(self):
+        if self._tokens:
+            data = b' '.join(self._tokens)
+            self.chunks.append([hashlib.sha256(data).hexdigest()[:16], self._start, self._pos - self._start])
+            self._tokens = []
+
+    def finish(self) -> List[list]:
+        self._emit()
+        return self.chunks
+
+# Benzerlik taslakları: görünür metin için 64 bit SimHash (3 token'lık shingle'lar),
+# tag/asset kümeleri için 64 slotluk MinHash. İkisi de sabit boyutlu; kıyas O(1).
+SIMHASH_SHINGLE = 3
+MINHASH_SLOTS = 64
+_M64 = (1 << 64) - 1
+_MERSENNE61 = (1 << 61) - 1
+# bytes.translate tabloları: k. bit set ise 1, değilse 0
+_BIT_TABLES = [bytes((i >> k) & 1 for i in range(256)) for k in range(8)]
+
+def _mix64(h: int) -> int:
+    h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & _M64
+    h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & _M64
+    return h ^ (h >> 31)
+
+class _TextSimHasher:
     """
-    Verilen URL'den snapshot alır:
-      - status code
-      - title
-      - visible text hash
-      - tam HTML
+    Token crc32'lerinden 3'lü shingle hash'leri toplar. SimHash bit çoğunluğu sonda
+    sütun dilimleri + popcount ile (shingle başına Python döngüsü olmadan) sayılır.
     """
-    try:
-        resp = requests.get(url, timeout=10)
-    except Exception as e:
-        return {"url": url, "error": str(e)}
 
-    # sayfanın ham HTML'i
-    html = resp.text
+    def __init__(self):
+        self._hashes = array.array('Q')
+        self._tail: List[int] = []
 
-    # BeautifulSoup ile parse
-    soup = BeautifulSoup(html, "html.parser")
+    def update(self, crcs: List[int]):
+        seq = self._tail + crcs
+        # shingle hash'i = (a*K1 ^ b*K2 ^ c*K3) mod 2^64; crc32'ler zaten karışık olduğu için
+        # çarpma/xor 64 biti yaymaya yeter
+        self._hashes.extend(
+            (a * 0x9E3779B97F4A7C15 ^ b * 0xC2B2AE3D27D4EB4F ^ c * 0x165667B19E3779F9) & _M64
+            for a, b, c in zip(seq, seq[1:], seq[2:])
+        )
+        self._tail = seq[-(SIMHASH_SHINGLE - 1):]
 
-    # Başlık
-    title = soup.title.string.strip() if soup.title else ""
+    def hexdigest(self) -> Optional[str]:
+        hashes = self._hashes
+        if not hashes and self._tail:
+            # SIMHASH_SHINGLE token'dan kısa metin: tek shingle
+            h = 0
+            for c in self._tail:
+                h = (h * 0x9E3779B97F4A7C15 + c) & _M64
+            hashes = array.array('Q', [_mix64(h)])
+        n = len(hashes)
+        if not n:
+            return None
+        if sys.byteorder != 'little':
+            hashes = array.array('Q', hashes)
+            hashes.byteswap()
+        data = hashes.tobytes()
+        value = 0
+        for j in range(8):
+            column = data[j::8]
+            for k in range(8):
+                if 2 * int.from_bytes(column.translate(_BIT_TABLES[k]), 'little').bit_count() > n:
+                    value |= 1 << (8 * j + k)
+        return '%016x' % value
 
-    # Görünür metin (script/style hariç)
-    for tag in soup(["script", "style"]):
-        tag.extract()
+def _minhash_params():
+    state, params = 0x2545F4914F6CDD1D, []
+    for _ in range(MINHASH_SLOTS):
+        state = _mix64(state + 0x9E3779B97F4A7C15)
+        a = (state % (_MERSENNE61 - 1)) + 1
+        state = _mix64(state + 0x9E3779B97F4A7C15)
+        params.append((a, state % _MERSENNE61))
+    return params
 
-    visible_text = soup.get_text(separator=" ", strip=True)
-    norm = re.sub(r'\s+', ' ', visible_text).strip()
+_MINHASH_PARAMS = _minhash_params()
 
-    # Kelime-dışı metinleri (noktalama/emoji vs.) de yakala:
-    tokens = re.findall(r'[^\s]+', norm)   # boşluk olmayan tüm parçalar
-    text_hash = hashlib.sha256(' '.join(tokens).encode('utf-8')).hexdigest()
-    # DOM özet bilgisi
-    dom = {
-        "hash": text_hash,
-        "text_len": len(visible_text)
-    }
+def structure_features(tag_counts: Dict[str, int], assets: Dict[str, Any]) -> List[str]:
+    """
+    MinHash kümesi: her tag için 1, 2, 4, ... sayısına kadar birer öğe (sayı değişimi
+    logaritmik ölçekte yansır) + benzersiz img/link/script adresleri.
+    """
+    feats = []
+    for tag, count in tag_counts.items():
+        level = 1
+        while level <= count:
+            feats.append(f'tag:{tag}#{level}')
+            level <<= 1
+    for kind, key in (('img', 'img_srcs_unique'), ('link', 'link_hrefs_unique'), ('script', 'script_srcs_unique')):
+        feats.extend(f'{kind}:{v}' for v in assets.get(key) or ())
+    return feats
 
-    # HTTP özet bilgisi (basit: sadece status_code üzerinden)
-    http = {
-        "status_code": resp.status_code,
-        "hash": hashlib.sha256(str(resp.status_code).encode("utf-8")).hexdigest()
-    }
-    
-    # soup hazırlandıktan sonra:
-    # --- tag_counts ---
-    tags = [t.name for t in soup.find_all(True)]
-    tag_counts = dict(Counter(tags))  # JSON'a uygun
+def minhash_signature(features: List[str]) -> Optional[str]:
+    """MINHASH_SLOTS adet 32 bit minimumu tek hex string olarak döndürür (boş kümede None)."""
+    if not features:
+        return None
+    xs = [int.from_bytes(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest(), 'little') for f in set(features)]
+    return ''.join('%08x' % (min((a * x + b) % _MERSENNE61 for x in xs) & 0xFFFFFFFF)
+                   for a, b in _MINHASH_PARAMS)
+
+# DOM Merkle ağacı: her eleman için sha256(açılış tag'i + metin parçaları + çocuk hash'leri).
+# Yalnızca MERKLE_MAX_DEPTH'e kadar olan düğümler saklanır (daha derinler ebeveyn hash'ine girer).
+# Kodlama: ön-sıra (preorder) satırlar "etiket hash16 alt_düğüm_sayısı öz_hash16"; alt düğüm sayısı
+# sayesinde kıyasta aynı hash'li alt ağaçlar okunmadan atlanır. öz hash yalnızca elemanın kendi açılış
+# tag'i ve doğrudan metnidir (çocuklar hariç); çocuğu da değişen bir elemanın kendi değişikliği kaybolmaz.
+MERKLE_MAX_DEPTH = 8
+_MERKLE_ID_RE = re.compile(r'^[A-Za-z][\w-]*$')
+
+class _OpenTag:
+    __slots__ = ('name', 'skip', 'container', 'preserve', 'children', 'depth', 'merkle', 'own', 'node')
+
+    def __init__(self, name, skip=False, container=False, preserve=False, children=None, depth=0):
+        self.name = name
+        self.skip = skip            # script/style içinde: sayılmaz, hash'e girmez
+        self.container = container  # rt/rp/template vb. içinde: görünür metne girmez
+        self.preserve = preserve    # pre/textarea içinde: boşluklar korunur
+        self.children = children    # yalnızca ilk <title> alt ağacında: .string hesabı için
+        self.depth = depth
+        self.merkle = None          # alt ağaç hash'i (skip olmayan tag'lerde)
+        self.own = None             # öz hash (yalnızca saklanan düğümlerde)
+        self.node = -1              # saklanan düğümün _merkle_nodes içindeki sırası
+
+class _SignalExtractor(HTMLParser):
+    """
+    HTMLParser olaylarını BeautifulSoup'un html.parser ağaç kurucusuyla aynı kurallarla
+    işler ama ağaç kurmaz; snapshot sinyallerini akış halinde toplar.
+    """
+    def __init__(self, merkle_depth: int = MERKLE_MAX_DEPTH, mask: Optional[CompiledMask] = None):
+        super().__init__(convert_charrefs=False)
+        root = _OpenTag('[document]')
+        root.merkle = hashlib.sha256()
+        root.own = hashlib.sha256()
+        root.node = 0
+        self._merkle_depth = merkle_depth
+        self._merkle_nodes: List[list] = [[':root', None, 0, None]]
+        self._stack = [root]
+        self._open_counts: Counter = Counter()
+        self._already_closed_void: Counter = Counter()   # bs4'te liste; sayaçla O(1)
+        self._data: List[str] = []
+        self._html_hasher = _WsCollapsingHasher()
+        self._text_hasher = hashlib.sha256()
+        self._text_chunker = _TextChunker()
+        self._text_simhasher = _TextSimHasher()
+        self._text_started = False
+        self._token_started = False
+        self._title_node: Optional[list] = None
+        self.text_len = 0
+        self.tag_counts: Counter = Counter()
+        self.img_srcs: List[str] = []
+        self.link_hrefs: List[str] = []
+        self.script_srcs: List[str] = []
+        self.asset_refs: List[tuple] = []       # (tür, ham URL): içeriği indirilebilecek asset'ler
+        self.base_href: Optional[str] = None
+        self._mask = mask
+        self._mask_text = mask.mask_text if mask is not None and mask.has_text else None
+        self.mask_counts: Counter = Counter()   # elements / attributes / urls / text
+
+    # -- HTMLParser olayları (bs4 BeautifulSoupHTMLParser ile aynı davranış) --
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        attr_dict: Dict[str, str] = {}
+        for key, value in attrs:
+            attr_dict[key] = '' if value is None else value
+        self._start_tag(tag, attr_dict)
+        if handle_empty_element and tag in _VOID_TAGS:
+            self.handle_endtag(tag, check_already_closed=False)
+            self._already_closed_void[tag] += 1
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and self._already_closed_void[tag]:
+            self._already_closed_void[tag] -= 1
+        else:
+            self._end_data()
+            self._pop_to(tag)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_charref(self, name):
+        char, extra = _charref_to_text(name)
+        self._data.append(char)
+        self._data.append(extra)
+
+    def handle_entityref(self, name):
+        char = _ENTITY_TO_CHAR.get(name)
+        self._data.append(char if char is not None else '&%s' % name)
+
+    def handle_comment(self, data):
+        self._special(data, _COMMENT)
+
+    def handle_decl(self, decl):
+        self._special(decl[len('DOCTYPE '):], _DOCTYPE)
+
+    def unknown_decl(self, data):
+        if data.upper().startswith('CDATA['):
+            self._special(data[len('CDATA['):], _CDATA)
+        else:
+            self._special(data, _DECL)
+
+    def handle_pi(self, data):
+        self._special(data, _PI)
+
+    # -- ağaç kurma kuralları --
+    def _special(self, data: str, kind: int):
+        self._end_data()
+        self._data.append(data)
+        self._end_data(kind)
+
+    def _start_tag(self, name: str, attrs: Dict[str, str]):
+        self._end_data()
+        parent = self._stack[-1]
+        children = None
+        if parent.children is not None:
+            children = []
+            parent.children.append(children)
+        elif name == 'title' and self._title_node is None:
+            children = self._title_node = []
+        raw_attrs = attrs
+        masked = False
+        if self._mask is not None and not parent.skip:
+            # uçucu eleman alt ağacıyla script/style gibi çıkarılır; diğerlerinde uçucu değerler maskelenir
+            masked = self._mask.match_element(name, attrs)
+            if masked:
+                self.mask_counts['elements'] += 1
+            else:
+                attrs, n_attrs, n_urls = self._mask.mask_attrs(name, attrs)
+                if n_attrs:
+                    self.mask_counts['attributes'] += n_attrs
+                if n_urls:
+                    self.mask_counts['urls'] += n_urls
+        tag = _OpenTag(
+            name,
+            skip=parent.skip or masked or name in _EXTRACTED_TAGS,
+            container=parent.container or name in _STRING_CONTAINER_TAGS,
+            preserve=parent.preserve or name in _PRESERVE_WS_TAGS,
+            children=children,
+            depth=parent.depth + 1,
+        )
+        self._stack.append(tag)
+        self._open_counts[name] += 1
+        if name == 'script' and not parent.skip and not masked and raw_attrs.get('src'):
+            # script_srcs'e girmez (aşağıdaki not); yalnızca asset içeriği yakalamada kullanılır
+            self.asset_refs.append(('script', raw_attrs['src'].strip()))
+        if tag.skip:
+            # Orijinal akışta script/style asset taramasından önce ağaçtan çıkarıldığı için
+            # script_srcs hep boş kalır; eski snapshot'larla uyum için aynen korunur.
+            return
+
+        self.tag_counts[name] += 1
+        if name == 'img' and attrs.get('src'):
+            src = attrs['src'].strip()
+            self.img_srcs.append(src)
+            self.asset_refs.append(('img', raw_attrs['src'].strip()))
+        elif name == 'link' and attrs.get('href'):
+            href = attrs['href'].strip()
+            self.link_hrefs.append(href)
+            if _FETCHABLE_LINK_RELS.intersection(attrs.get('rel', '').lower().split()):
+                self.asset_refs.append(('link', raw_attrs['href'].strip()))
+        elif name == 'base' and raw_attrs.get('href') and self.base_href is None:
+            self.base_href = raw_attrs['href'].strip()
+
+        start = self._format_start(name, attrs)
+        self._html_hasher.update(start)
+        tag.merkle = hashlib.sha256(start.encode('utf-8'))
+        if tag.depth <= self._merkle_depth:
+            label = name
+            if _MERKLE_ID_RE.match(attrs.get('id', '')):
+                label += '#' + attrs['id']
+            tag.own = tag.merkle.copy()
+            tag.node = len(self._merkle_nodes)
+            self._merkle_nodes.append([label, None, 0, None])
 
-    # --- assets (liste + unique + sayılar + hash) ---
-    img_srcs   = [ (t.get('src') or '').strip()   for t in soup.find_all('img')    if t.get('src') ]
-    link_hrefs = [ (t.get('href') or '').strip()  for t in soup.find_all('link')   if t.get('href') ]
-    script_srcs= [ (t.get('src') or '').strip()   for t in soup.find_all('script') if t.get('src') ]
+    def _format_start(self, name: str, attrs: Dict[str, str]) -> str:
+        if not attrs:
+            return '<%s/>' % name if name in _VOID_TAGS else '<%s>' % name
+        multi = _MULTI_VALUED_ATTRS['*'] | _MULTI_VALUED_ATTRS.get(name, frozenset())
+        if name == 'meta':
+            if 'charset' in attrs:
+                attrs['charset'] = 'utf-8'
+            elif 'content' in attrs and attrs.get('http-equiv', '').lower() == 'content-type':
+                attrs['content'] = _META_CHARSET_RE.sub(lambda m: m.group(1) + 'utf-8', attrs['content'])
+        parts = []
+        for key, value in sorted(attrs.items()):
+            if key in multi:
+                value = ' '.join(value.split())
+            parts.append(key + '=' + _quote_attr(value))
+        return '<%s %s%s>' % (name, ' '.join(parts), '/' if name in _VOID_TAGS else '')
 
+    def _pop_to(self, name: str):
+        if not self._open_counts.get(name):
+            return
+        while len(self._stack) > 1:
+            tag = self._stack.pop()
+            self._open_counts[tag.name] -= 1
+            if not tag.skip and tag.name not in _VOID_TAGS:
+                self._html_hasher.update('</%s>' % tag.name)
+            if tag.merkle is not None:
+                self._close_merkle(tag)
+            if tag.name == name:
+                break
+
+    def _close_merkle(self, tag: _OpenTag):
+        digest = tag.merkle.digest()
+        if tag.node >= 0:
+            node = self._merkle_nodes[tag.node]
+            node[1] = digest.hex()[:16]
+            node[2] = len(self._merkle_nodes) - tag.node - 1
+            node[3] = tag.own.hexdigest()[:16]
+        self._stack[-1].merkle.update(b'\x01' + digest)
+
+    def _end_data(self, kind: int = _TEXT):
+        if not self._data:
+            return
+        data = ''.join(self._data)
+        self._data = []
+        top = self._stack[-1]
+        if not top.preserve and not data.strip(_ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+        if top.children is not None:
+            top.children.append(data)
+        if top.skip:
+            return
+        if self._mask_text is not None and kind == _TEXT:
+            data, n = self._mask_text(data)
+            if n:
+                self.mask_counts['text'] += n
+
+        if kind == _TEXT:
+            piece = _xml_escape(data)
+        else:
+            prefix, suffix = _WRAPPERS[kind]
+            piece = prefix + data + suffix
+        self._html_hasher.update(piece)
+        piece_bytes = b'\x00' + _WS_RE.sub(' ', piece).encode('utf-8')
+        top.merkle.update(piece_bytes)
+        if top.own is not None:
+            top.own.update(piece_bytes)
+
+        # get_text(separator=" ", strip=True): yalnızca düz metin ve CDATA
+        if (kind == _TEXT and not top.container) or kind == _CDATA:
+            stripped = data.strip()
+            if stripped:
+                self.text_len += len(stripped) + (1 if self._text_started else 0)
+                self._text_started = True
+                norm = ' '.join(stripped.split())
+                self._text_hasher.update(((' ' if self._token_started else '') + norm).encode('utf-8'))
+                self._text_simhasher.update(self._text_chunker.feed(norm))
+                self._token_started = True
+
+    # -- sonuçlar --
+    def finish(self):
+        self.close()
+        self._end_data()
+        while len(self._stack) > 1:
+            self._pop_to(self._stack[-1].name)
+
+    @property
+    def title(self) -> str:
+        node = self._title_node
+        # Tag.string: tek çocuk varsa o string (ya da tek çocuk tag'in .string'i)
+        while node is not None and len(node) == 1 and isinstance(node[0], list):
+            node = node[0]
+        if node is None or len(node) != 1:
+            return ''
+        return node[0].strip()
+
+    @property
+    def text_hash(self) -> str:
+        return self._text_hasher.hexdigest()
+
+    @property
+    def html_hash(self) -> str:
+        return self._html_hasher.hexdigest()
+
+    @property
+    def dom_tree(self) -> Dict[str, Any]:
+        root = self._stack[0]
+        self._merkle_nodes[0][1] = root.merkle.hexdigest()[:16]
+        self._merkle_nodes[0][2] = len(self._merkle_nodes) - 1
+        self._merkle_nodes[0][3] = root.own.hexdigest()[:16]
+        return {
+            'max_depth': self._merkle_depth,
+            'nodes': '\n'.join('%s %s %d %s' % tuple(n) for n in self._merkle_nodes),
+        }
+
+    @property
+    def text_chunks(self) -> List[list]:
+        return self._text_chunker.finish()
+
+    @property
+    def text_simhash(self) -> Optional[str]:
+        return self._text_simhasher.hexdigest()
+
+def extract_signals(html: str, merkle_depth: int = MERKLE_MAX_DEPTH,
+                    mask: Optional[CompiledMask] = None) -> Dict[str, Any]:
+    """
+    HTML'den snapshot sinyallerini tek geçişte çıkarır.
+    mask verilirse uçucu elemanlar / attribute'lar / metinler hash'lenmeden önce aynı geçişte maskelenir.
+    """
+    parser = _SignalExtractor(merkle_depth, mask)
+    parser.feed(html)
+    parser.finish()
+    return {
+        'title': parser.title,
+        'text_hash': parser.text_hash,
+        'text_len': parser.text_len,
+        'text_chunks': parser.text_chunks,
+        'text_simhash': parser.text_simhash,
+        'tag_counts': dict(parser.tag_counts),
+        'img_srcs': parser.img_srcs,
+        'link_hrefs': parser.link_hrefs,
+        'script_srcs': parser.script_srcs,
+        'asset_refs': parser.asset_refs,
+        'base_href': parser.base_href,
+        'html_hash': parser.html_hash,
+        'dom_tree': parser.dom_tree,
+        'mask_counts': dict(parser.mask_counts),
+    }
+
+def build_assets(img_srcs: List[str], link_hrefs: List[str], script_srcs: List[str]) -> Dict[str, Any]:
     img_srcs_u   = sorted(set(img_srcs))
     link_hrefs_u = sorted(set(link_hrefs))
     script_srcs_u= sorted(set(script_srcs))
 
-    assets = {
+    return {
         'img_srcs': img_srcs,                     # duplikasyonlar korunur
         'link_hrefs': link_hrefs,
         'script_srcs': script_srcs,
@@ -125,24 +689,459 @@ def take_snapshot(url: str) -> dict:
         'scripts_unique_hash': _sha('\n'.join(script_srcs_u)),
     }
 
-    # --- normalize HTML hash ---
-    normalized_html = re.sub(r'\s+', ' ', soup.decode())
-    html_hash = _sha(normalized_html)
+def make_session(pool_size: int = 10) -> 'requests.Session':
+    """
+    Bağlantıları yeniden kullanan (keep-alive) ortak bir Session oluşturur.
+    pool_size: host başına havuzda tutulacak bağlantı sayısı (worker sayısı kadar olmalı)
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class HostLimiter:
+    """
+    Host başına eşzamanlılık ve hız sınırı.
+    - per_host: aynı host'a aynı anda en fazla kaç istek gidebileceği
+    - min_interval: aynı host'a iki istek başlangıcı arasındaki minimum süre (saniye)
+    """
+    def __init__(self, per_host: int = 2, min_interval: float = 0.0):
+        self.per_host = max(1, per_host)
+        self.min_interval = max(0.0, min_interval)
+        self._lock = threading.Lock()
+        self._sems: Dict[str, threading.BoundedSemaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    @contextmanager
+    def slot(self, url: str):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            sem = self._sems.get(host)
+            if sem is None:
+                sem = self._sems[host] = threading.BoundedSemaphore(self.per_host)
+        sem.acquire()
+        try:
+            if self.min_interval:
+                with self._lock:
+                    now = time.monotonic()
+                    start = max(now, self._next_start.get(host, 0.0))
+                    self._next_start[host] = start + self.min_interval
+                if start > now:
+                    time.sleep(start - now)
+            yield
+        finally:
+            sem.release()
+
+def load_previous_snapshot(url: str, path: str) -> Optional[dict]:
+    """Koşullu GET için önceki snapshot'ı yükler; dosya yoksa, URL uyuşmuyorsa ya da validator yoksa None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        prev = load_snapshot(path)
+    except (OSError, ValueError):
+        return None
+    if prev.get('url') != url or prev.get('error') or not prev.get('validators'):
+        return None
+    # blob referansları yeni snapshot başka klasöre yazılsa da çözülebilsin
+    return absolutize_refs(prev, path)
 
-    structure = {
-        'tag_counts': tag_counts,
-        'assets': assets,
-        'html_hash': html_hash,
+class ValidatorCache:
+    """
+    URL -> (ETag, Last-Modified, son snapshot yolu) eşlemesini JSON dosyasında tutar.
+    Sonraki yakalamalarda koşullu GET için kullanılır; sunucu 304 dönerse
+    önceki snapshot'ın sinyalleri parse edilmeden yeniden kullanılır.
+    """
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f) or {}
+            except (OSError, ValueError):
+                self._entries = {}
+
+    def previous_snapshot(self, url: str) -> Optional[dict]:
+        """Önbellekteki son snapshot'ı yükler; dosya yoksa/uyuşmuyorsa None."""
+        with self._lock:
+            entry = self._entries.get(url)
+        if not entry:
+            return None
+        return load_previous_snapshot(url, entry.get('snapshot') or '')
+
+    def record(self, url: str, snap: dict, out_path: str):
+        validators = snap.get('validators') or {}
+        if snap.get('error') or not (validators.get('etag') or validators.get('last_modified')):
+            return
+        with self._lock:
+            self._entries[url] = {
+                'etag': validators.get('etag'),
+                'last_modified': validators.get('last_modified'),
+                'snapshot': os.path.abspath(out_path),
+            }
+
+    def save(self):
+        dirpath = os.path.dirname(self.path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+        tmp = self.path + '.tmp'
+        with self._lock:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+class AssetCache:
+    """
+    Sayfaların referans verdiği asset'lerin (img, script, stylesheet/icon/preload link'leri) içerik
+    hash'lerini tutan, sayfalar arasında paylaşılan önbellek. Anahtar mutlak URL'dir: bir çalıştırmada
+    her URL en fazla bir kez indirilir, aynı asset'i aynı anda isteyen sayfalar tek indirmeyi bekler.
+    İndirmeler ortak bir Session ve thread havuzunda, host sınırına uyarak yapılır; gövde saklanmaz,
+    akış halinde hash'lenir. path verilirse ETag / Last-Modified ve hash'ler JSON dosyasında tutulur;
+    sonraki çalıştırmalarda koşullu GET yapılır, 304 gelirse asset yeniden indirilmez.
+    """
+    def __init__(self, path: Optional[str] = None, workers: int = ASSET_WORKERS, per_host: int = 4,
+                 max_bytes: Optional[int] = ASSET_MAX_BYTES):
+        self.path = os.path.abspath(path) if path else None
+        self.max_bytes = max_bytes or None
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f) or {}
+            except (OSError, ValueError):
+                self._entries = {}
+        self._futures: Dict[str, Future] = {}
+        workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asset')
+        self._session = make_session(pool_size=max(workers, per_host))
+        self._limiter = HostLimiter(per_host=per_host)
+        self._stats: Counter = Counter()
+
+    def fetch_many(self, urls: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Mutlak URL'lerin içerik özetlerini döner; bu çalıştırmada istenmemiş olanlar havuzda paralel indirilir."""
+        futures: Dict[str, Future] = {}
+        with self._lock:
+            for url in urls:
+                if url in futures:
+                    continue
+                fut = self._futures.get(url)
+                if fut is None:
+                    fut = self._futures[url] = self._executor.submit(self._fetch, url)
+                else:
+                    self._stats['shared'] += 1
+                futures[url] = fut
+        return {url: fut.result() for url, fut in futures.items()}
+
+    def _count(self, key: str, value: int = 1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _fetch(self, url: str) -> Dict[str, Any]:
+        with self._lock:
+            previous = self._entries.get(url)
+        headers = _conditional_headers({'validators': previous}) if previous else {}
+        try:
+            with self._limiter.slot(url):
+                resp = self._session.get(url, timeout=REQUEST_TIMEOUT, headers=headers, stream=True)
+                if resp.status_code == 304 and previous:
+                    resp.close()
+                    self._count('not_modified')
+                    return {k: previous[k] for k in _ASSET_FIELDS if k in previous}
+                if resp.status_code != 200:
+                    resp.close()
+                    self._count('errors')
+                    return {'status': resp.status_code}
+                _, info = _read_body(resp, self.max_bytes, keep=False)
+        except Exception as e:
+            self._count('errors')
+            return {'error': str(e)}
+        result = {
+            'status': 200,
+            'sha256': info['sha256'],
+            'size': info['bytes'],
+            'content_type': (resp.headers.get('Content-Type') or '').split(';')[0].strip().lower() or None,
+        }
+        if info['truncated']:
+            result['truncated'] = True
+        self._count('fetched')
+        self._count('bytes', info['bytes'])
+        etag, last_modified = resp.headers.get('ETag'), resp.headers.get('Last-Modified')
+        with self._lock:
+            if etag or last_modified:
+                self._entries[url] = dict(result, etag=etag, last_modified=last_modified)
+            else:
+                self._entries.pop(url, None)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, urls=len(self._futures))
+
+    def save(self):
+        if not self.path:
+            return
+        dirpath = os.path.dirname(self.path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+        tmp = self.path + '.tmp'
+        with self._lock:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._session.close()
+
+def asset_content(refs: Iterable[tuple], base_url: str, cache: AssetCache,
+                  mask: Optional[CompiledMask] = None) -> Dict[str, Any]:
+    """
+    (tür, URL) referanslarını base_url'e göre mutlak URL'ye çevirip (http/https dışındakiler atlanır)
+    içeriklerini cache üzerinden hash'ler. 'hash' tüm URL + içerik çiftlerinin özetidir; kıyasta
+    önce bu karşılaştırılır, 'items' yalnızca fark varsa açılır. mask verilirse asset gerçek URL'sinden
+    indirilir ama 'items' anahtarı maskelenmiş URL olur (cache-busting parametreleri fark yaratmaz);
+    anahtar gerçek URL'den farklıysa gerçek URL kaydın 'url' alanında tutulur (304'te yeniden indirme için).
+    """
+    kinds: Dict[str, str] = {}
+    for kind, ref in refs:
+        url = urldefrag(urljoin(base_url, ref))[0]
+        if urlsplit(url).scheme in ('http', 'https'):
+            kinds.setdefault(url, kind)
+    results = cache.fetch_many(kinds)
+    keys = {url: mask.mask_url(url)[0] if mask is not None else url for url in kinds}
+    items = {}
+    for url in sorted(kinds, key=keys.get):
+        item = dict(results[url], kind=kinds[url])
+        if keys[url] != url:
+            item['url'] = url
+        items.setdefault(keys[url], item)
+    return {
+        'count': len(items),
+        'errors': sum(1 for item in items.values() if 'sha256' not in item),
+        'bytes': sum(item.get('size') or 0 for item in items.values()),
+        'hash': _sha('\n'.join(f"{url} {item.get('sha256') or item.get('status') or 'error'}"
+                               for url, item in items.items())),
+        'items': items,
     }
+
+def _conditional_headers(previous: Optional[dict]) -> Dict[str, str]:
+    validators = (previous or {}).get('validators') or {}
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+def _read_body(resp: 'requests.Response', max_bytes: Optional[int] = None, keep: bool = True) -> tuple:
     """
-    result['structure'] = {
-        'tag_counts': tag_counts,
-        'assets': assets,
-        'html_hash': html_hash,
+    Yanıt gövdesini parça parça okur; ham gövdenin sha256'sını okurken hesaplar.
+    max_bytes aşılırsa okuma kesilir ve gövde 'truncated' olarak işaretlenir.
+    keep=False ise parçalar tutulmaz (yalnızca hash gerektiğinde); dönen gövde boştur.
+    """
+    hasher = hashlib.sha256()
+    chunks = []
+    size = 0
+    truncated = False
+    try:
+        for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            if not chunk:
+                continue
+            if max_bytes and size + len(chunk) > max_bytes:
+                chunk = chunk[:max_bytes - size]
+                truncated = True
+            hasher.update(chunk)
+            if keep:
+                chunks.append(chunk)
+            size += len(chunk)
+            if truncated:
+                break
+    finally:
+        resp.close()
+    info = {
+        'bytes': size,
+        'sha256': hasher.hexdigest(),
+        'truncated': truncated,
+        'max_bytes': max_bytes or None,
     }
+    return b''.join(chunks), info
+
+def _lookup_encoding(label: Optional[str]) -> Optional[str]:
+    """Charset etiketini Python codec adına çevirir; bilinmiyorsa None."""
+    if not label:
+        return None
+    try:
+        return codecs.lookup(label.strip().strip('"\'')).name
+    except LookupError:
+        return None
+
+def detect_encoding(content_type: Optional[str], body: bytes) -> tuple:
     """
+    Gövdenin karakter kodlamasını ucuzdan pahalıya doğru belirler; (codec adı, yöntem) döner.
+      bom     : UTF-8/16 BOM (HTML standardında olduğu gibi header'dan önce gelir)
+      header  : Content-Type'taki charset parametresi
+      meta    : ilk CHARSET_SCAN_BYTES içinde <meta charset> / http-equiv
+      utf-8   : bildirim yok ama gövde geçerli UTF-8 (saf ASCII dahil)
+      detected: istatistiksel tahmin (chardet / charset_normalizer), yalnızca ilk CHARSET_DETECT_BYTES üzerinde
+      default : hiçbiri sonuç vermedi (ya da gövde boş) -> utf-8
+    """
+    for bom, encoding in _BOMS:
+        if body.startswith(bom):
+            return encoding, 'bom'
+    m = _HEADER_CHARSET_RE.search(content_type or '')
+    encoding = _lookup_encoding(m.group(1)) if m else None
+    if encoding:
+        return encoding, 'header'
+    m = _META_CHARSET_BYTES_RE.search(body, 0, CHARSET_SCAN_BYTES)
+    encoding = _lookup_encoding(m.group(1).decode('ascii', 'replace')) if m else None
+    if encoding:
+        # bayt düzeyinde ASCII uyumlu olmayan bir kodlamayı bildiren meta kendi kendini okuyamaz
+        return ('utf-8' if encoding.startswith('utf-16') else encoding), 'meta'
+    if not body:
+        return 'utf-8', 'default'
+    try:
+        body.decode('utf-8')
+        return 'utf-8', 'utf-8'
+    except UnicodeDecodeError as e:
+        # max_bytes ile kesilen gövdenin sonunda yarım kalan çok baytlı karakter
+        if e.start >= len(body) - 3 and e.reason == 'unexpected end of data':
+            return 'utf-8', 'utf-8'
+    import requests
+    encoding = _lookup_encoding(requests.compat.chardet.detect(body[:CHARSET_DETECT_BYTES])['encoding'])
+    return (encoding, 'detected') if encoding else ('utf-8', 'default')
 
-    return {
+def _decode_body(resp: 'requests.Response', body: bytes) -> tuple:
+    """Gövdeyi detect_encoding ile belirlenen kodlamayla çözer; (metin, kodlama, yöntem) döner."""
+    encoding, source = detect_encoding(resp.headers.get('Content-Type'), body)
+    if source == 'bom' and encoding == 'utf-8':
+        encoding = 'utf-8-sig'   # resp.text gibi BOM'u metne katmaz
+    return str(body, encoding, errors='replace'), encoding, source
+
+def take_snapshot(url: str, session: Optional['requests.Session'] = None,
+                  limiter: Optional[HostLimiter] = None,
+                  previous: Optional[dict] = None,
+                  max_bytes: Optional[int] = None,
+                  merkle_depth: int = MERKLE_MAX_DEPTH,
+                  timer: Optional[StageTimer] = None,
+                  asset_cache: Optional[AssetCache] = None,
+                  mask_rules: Optional[MaskRules] = None) -> dict:
+    """
+    Verilen URL'den snapshot alır:
+      - status code
+      - title
+      - visible text hash
+      - tam HTML
+    session verilirse bağlantı havuzu kullanılır, limiter verilirse host sınırlarına uyulur.
+    previous (aynı URL'nin önceki snapshot'ı) verilirse koşullu GET yapılır; 304 gelirse
+    önceki snapshot'ın sinyalleri olduğu gibi döndürülür. Önceki snapshot farklı maske kurallarıyla
+    (ya da maskesiz / maskeli) alınmışsa hash'leri yeniden kullanılamaz; koşulsuz GET yapılır.
+    Gövde akış halinde okunur; max_bytes'tan büyük sayfalar kesilip 'body.truncated' ile işaretlenir.
+    merkle_depth: structure.dom_tree'de saklanacak en derin eleman seviyesi.
+    timer verilirse wait / request / download / decode / parse / structure / assets aşamaları ölçülür.
+    asset_cache verilirse referans verilen asset'lerin içerikleri hash'lenip structure.asset_content'e
+    yazılır; 304'te önceki snapshot'taki asset URL'leri yeniden doğrulanır.
+    mask_rules verilirse URL'nin sitesine ait uçucu içerik kuralları parse sırasında, hash'lemeden önce
+    uygulanır; eşleşme sayıları 'masking' alanına yazılır.
+    """
+    if session is not None:
+        getter = session
+    else:
+        import requests
+        getter = requests
+    if previous is not None and \
+            (previous.get('masking') or {}).get('rules') != (mask_rules.digest if mask_rules is not None else None):
+        previous = None
+    headers = _conditional_headers(previous)
+    captured_at = utc_now_iso()
+
+    def _fetch():
+        # request: bağlantı + yanıt başlıkları (TTFB); download: gövdenin akışla okunması
+        with timed(timer, 'request'):
+            resp = getter.get(url, timeout=REQUEST_TIMEOUT, headers=headers, stream=True)
+        if resp.status_code == 304 and previous:
+            resp.close()
+            return resp, b'', None
+        with timed(timer, 'download'):
+            body, info = _read_body(resp, max_bytes)
+        if timer is not None:
+            timer.count('response_bytes', info['bytes'])
+        return resp, body, info
+
+    try:
+        if limiter is not None:
+            wait_started = time.perf_counter()
+            with limiter.slot(url):
+                if timer is not None:
+                    timer.add('wait', time.perf_counter() - wait_started)
+                resp, body, body_info = _fetch()
+        else:
+            resp, body, body_info = _fetch()
+    except Exception as e:
+        return {"url": url, "error": str(e), "captured_at": captured_at}
+
+    prev_validators = (previous or {}).get('validators') or {}
+    validators = {
+        'etag': resp.headers.get('ETag') or (prev_validators.get('etag') if resp.status_code == 304 else None),
+        'last_modified': resp.headers.get('Last-Modified') or (prev_validators.get('last_modified') if resp.status_code == 304 else None),
+    }
+
+    mask, mask_sites = mask_rules.for_url(url) if mask_rules is not None else (None, [])
+    if resp.status_code == 304 and previous:
+        # Sayfa değişmemiş: önceki sinyaller (text hash, tag_counts, assets, html_hash) aynen kullanılır
+        snap = {k: v for k, v in previous.items() if k != 'meta'}
+        snap['captured_at'] = captured_at
+        snap['validators'] = dict(validators, not_modified=True)
+        prev_items = ((snap.get('structure') or {}).get('asset_content') or {}).get('items')
+        if asset_cache is not None and prev_items:
+            # sayfa aynı olsa da asset içerikleri değişmiş olabilir; maskelenmiş anahtar değil gerçek URL indirilir
+            with timed(timer, 'assets'):
+                content = asset_content(((item.get('kind'), item.get('url') or key) for key, item in prev_items.items()),
+                                        url, asset_cache, mask)
+            snap['structure'] = dict(snap['structure'], asset_content=content)
+        return snap
+
+    # sayfanın ham HTML'i; ham byte'lar çözüldükten sonra bırakılır
+    with timed(timer, 'decode'):
+        html, body_info['encoding'], body_info['encoding_source'] = _decode_body(resp, body)
+    # ölçülmüş bir tepe değil, tahmin: ham gövde + çözülmüş metin (akış parçaları, chardet girdisi ve
+    # çözme sırasındaki ara kopyalar dahil değil)
+    body_info['est_buffer_bytes'] = len(body) + sys.getsizeof(html)
+    del body
+
+    # Tek geçişte: başlık, görünür metin hash'i, tag sayıları, asset'ler, normalize HTML hash
+    with timed(timer, 'parse'):
+        signals = extract_signals(html, merkle_depth, mask)
+    title = signals['title']
+    text_hash = signals['text_hash']
+
+    # HTTP özet bilgisi (basit: sadece status_code üzerinden)
+    http = {
+        "status_code": resp.status_code,
+        "hash": hashlib.sha256(str(resp.status_code).encode("utf-8")).hexdigest()
+    }
+
+    with timed(timer, 'structure'):
+        assets = build_assets(signals['img_srcs'], signals['link_hrefs'], signals['script_srcs'])
+        structure = {
+            'tag_counts': signals['tag_counts'],
+            'assets': assets,
+            'html_hash': signals['html_hash'],
+            'minhash': minhash_signature(structure_features(signals['tag_counts'], assets)),
+            'dom_tree': signals['dom_tree'],
+        }
+    if asset_cache is not None:
+        with timed(timer, 'assets'):
+            base_url = urljoin(resp.url or url, signals['base_href'] or '')
+            structure['asset_content'] = asset_content(signals['asset_refs'], base_url, asset_cache, mask)
+        if timer is not None:
+            timer.count('asset_count', structure['asset_content']['count'])
+
+    snap = {
         "url": url,
         "status_code": resp.status_code,
         "title": title,
@@ -151,12 +1150,50 @@ def take_snapshot(url: str) -> dict:
         "html": html,
         #"dom": dom,
         "http": http,
-        "dom": {"hash": text_hash, "text_len": len(visible_text)},
-        "structure": structure
+        "dom": {"hash": text_hash, "text_len": signals['text_len'], "simhash": signals['text_simhash'],
+                "chunks": signals['text_chunks']},
+        "structure": structure,
+        "validators": validators,
+        "body": body_info,
+        "captured_at": captured_at,
     }
+    if mask_rules is not None:
+        # hash'lere (ve kıyas parmak izine) girmez; yalnızca neyin maskelendiğini gösterir
+        snap['masking'] = dict({'rules': mask_rules.digest, 'sites': mask_sites},
+                               **{k: signals['mask_counts'].get(k, 0) for k in ('elements', 'attributes', 'urls', 'text')})
+    return snap
 
-def capture_single(url: str, out_path: str, meta: dict | None = None) -> dict:
-    snap = take_snapshot(url)
+def capture_single(url: str, out_path: str, meta: dict | None = None,
+                   session: Optional['requests.Session'] = None,
+                   limiter: Optional[HostLimiter] = None,
+                   validator_cache: Optional[ValidatorCache] = None,
+                   max_bytes: Optional[int] = None,
+                   merkle_depth: int = MERKLE_MAX_DEPTH,
+                   blob_store: Optional[BlobStore] = None,
+                   history: Optional[HistoryStore] = None,
+                   run: Optional[str] = None,
+                   previous: Optional[dict] = None,
+                   timings: bool = False,
+                   asset_cache: Optional[AssetCache] = None,
+                   mask_rules: Optional[MaskRules] = None) -> dict:
+    """
+    Tek URL'yi yakalayıp out_path'e JSON olarak (uzantısı .snap ise ikili snapshot biçiminde) yazar.
+    blob_store verilirse ham HTML (ve varsa ekran görüntüsü) içerik adresli depoya yazılır,
+    JSON'da yalnızca 'html_blob' / 'screenshot_blob' referansları kalır.
+    history verilirse sinyal hash'leri SQLite geçmişine (run etiketiyle) de yazılır.
+    previous verilirse koşullu GET için validator önbelleği yerine o kullanılır.
+    asset_cache verilirse asset içerikleri (ortak önbellek üzerinden) hash'lenir.
+    mask_rules verilirse uçucu içerik hash'lemeden önce maskelenir.
+    timings=True ise aşama süreleri meta.timings'e yazılır; 'serialize' (JSON / .snap kodlama ve
+    sıkıştırma) ölçülüp meta yazılmadan hemen önce eklenir. Dosyaya yazma anında diske yazma ('write')
+    ve 'history' henüz bitmediği için bu ikisi yalnızca dönen dict'te yer alır.
+    """
+    timer = StageTimer() if timings else None
+    if previous is None and validator_cache is not None:
+        previous = validator_cache.previous_snapshot(url)
+    snap = take_snapshot(url, session=session, limiter=limiter, previous=previous,
+                         max_bytes=max_bytes, merkle_depth=merkle_depth, timer=timer, asset_cache=asset_cache,
+                         mask_rules=mask_rules)
 
     # Hem dict hem dataclass ile uyumlu olsun:
     if 'get' in dir(snap) and isinstance(snap, dict):
@@ -173,41 +1210,638 @@ def capture_single(url: str, out_path: str, meta: dict | None = None) -> dict:
     if dirpath:
         os.makedirs(dirpath, exist_ok=True)
 
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(snap_dict, f, ensure_ascii=False, indent=2)
+    with timed(timer, 'visual_fp'):
+        add_visual_fingerprint(snap_dict, out_path)
+    if blob_store is not None:
+        with timed(timer, 'externalize'):
+            externalize(snap_dict, blob_store, out_path)
+    relink_refs(snap_dict, out_path)
+
+    # serialize süresi yazılan meta.timings'e girer: ağır kısımlar kodlandıktan sonra, meta en son eklenir
+    serialize_wall, serialize_cpu = time.perf_counter(), time.thread_time()
+    finalized = []
 
+    def _finalize(target: dict):
+        finalized.append((time.perf_counter(), time.thread_time()))
+        if timer is not None:
+            timer.add('serialize', finalized[0][0] - serialize_wall, finalized[0][1] - serialize_cpu)
+            target['meta'] = dict(target.get('meta') or {}, timings=timer.as_dict())
+
+    if is_snapshot_file(out_path):
+        # .snap'te kodlama ve yazma tek çağrıda; 'write' başlık hazırlandıktan sonraki kısımdır
+        write_snapshot_file(out_path, snap_dict, finalize=_finalize)
+        if timer is not None:
+            timer.add('write', time.perf_counter() - finalized[0][0], time.thread_time() - finalized[0][1])
+    else:
+        text = _dump_snapshot_json(snap_dict, _finalize)
+        with timed(timer, 'write'):
+            with open(out_path, "w", encoding="utf-8") as f:
+                f.write(text)
+        del text
+
+    if validator_cache is not None:
+        validator_cache.record(url, snap_dict, out_path)
+    if history is not None:
+        with timed(timer, 'history'):
+            history.record(snap_dict, path=out_path, run=run)
+    if timer is not None:
+        snap_dict['meta'] = dict(snap_dict.get('meta') or {}, timings=timer.as_dict())
     return snap_dict
 
-def read_urls_from_file(path: str) -> List[str]:
+def _dump_snapshot_json(snap: dict, finalize: Callable[[dict], None]) -> str:
+    """
+    json.dumps(snap, ensure_ascii=False, indent=2) ile aynı metni üretir ama üst düzey 'meta' alanını
+    diğerleri serileştirildikten sonra, finalize(snap) çağrıldıktan sonra kodlar.
+    """
+    parts = {k: json.dumps(v, ensure_ascii=False, indent=2) for k, v in snap.items() if k != 'meta'}
+    finalize(snap)
+    if not snap:
+        return '{}'
+    for k in snap.keys() - parts.keys():
+        parts[k] = json.dumps(snap[k], ensure_ascii=False, indent=2)
+    # JSON metinlerinde ham satır sonu yoktur; iç satırlar bir seviye (2 boşluk) içeri alınır
+    return '{\n' + ',\n'.join('  %s: %s' % (json.dumps(k, ensure_ascii=False), parts[k].replace('\n', '\n  '))
+                               for k in snap) + '\n}'
+
+def add_visual_fingerprint(snap: dict, json_path: str) -> bool:
+    """
+    Snapshot'ın ekran görüntüsü (satır içi, blob ya da yanındaki .png) varsa phash ve
+    küçük gri kopyayı bir kez hesaplayıp 'visual_fp' olarak ekler. Kayıtlı parmak izi
+    güncelse ya da görsel kütüphaneler yoksa dokunmaz; eklendiyse True döner.
+    """
+    digest = screenshot_digest(snap, json_path)
+    if digest is None or (snap.get('visual_fp') or {}).get('screenshot_sha256') == digest:
+        return False
+    from compare_snapshots import visual_fingerprint
+    fp = visual_fingerprint(load_screenshot(snap, json_path), digest)
+    if fp is None:
+        return False
+    snap['visual_fp'] = fp
+    return True
+
+def iter_urls_from_file(path: str) -> Iterator[str]:
+    """URL dosyasını satır satır okur (liste kurmadan); dosya yoksa hemen FileNotFoundError verir."""
     path = os.path.abspath(path)
     if not os.path.exists(path):
         raise FileNotFoundError(path)
-    urls = []
-    with open(path, 'r', encoding='utf-8') as fh:
-        for line in fh:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            urls.append(line)
-    return urls
 
+    def _lines():
+        with open(path, 'r', encoding='utf-8') as fh:
+            for line in fh:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                yield line
+    return _lines()
+
+def read_urls_from_file(path: str) -> List[str]:
+    return list(iter_urls_from_file(path))
+
+def snapshot_record(snap: dict, path: Optional[str] = None) -> Dict[str, Any]:
+    """Akış çıktısı için snapshot'ın kompakt özeti: ham HTML, metin parçaları ve DOM ağacı içermez."""
+    rec = {k: snap[k] for k in ('status_code', 'title', 'text_hash', 'length', 'captured_at', 'error') if k in snap}
+    if path:
+        rec['path'] = path
+    html_hash = (snap.get('structure') or {}).get('html_hash')
+    if html_hash:
+        rec['html_hash'] = html_hash
+    if (snap.get('validators') or {}).get('not_modified'):
+        rec['not_modified'] = True
+    if (snap.get('body') or {}).get('truncated'):
+        rec['truncated'] = True
+    assets = (snap.get('structure') or {}).get('asset_content')
+    if assets:
+        rec['assets'] = {k: assets[k] for k in ('count', 'errors', 'hash')}
+    timings = (snap.get('meta') or {}).get('timings')
+    if timings:
+        rec['timings'] = timings
+    return rec
 
-def capture_from_list(file_path: str, out_dir: str) -> List[Dict[str, Any]]:
+def iter_capture_from_list(file_path: str, out_dir: str, workers: int = 1,
+                           per_host: int = 2, host_delay: float = 0.0,
+                           validator_cache: Optional[ValidatorCache] = None,
+                           max_bytes: Optional[int] = None,
+                           merkle_depth: int = MERKLE_MAX_DEPTH,
+                           blob_store: Optional[BlobStore] = None,
+                           history: Optional[HistoryStore] = None,
+                           run: Optional[str] = None,
+                           timings: bool = False,
+                           profiler: Optional[SlowestProfiles] = None,
+                           ordered: bool = False,
+                           compact: bool = True,
+                           snapshot_format: str = 'json',
+                           asset_cache: Optional[AssetCache] = None,
+                           mask_rules: Optional[MaskRules] = None) -> Iterator[Dict[str, Any]]:
+    """
+    capture_from_list'in akış sürümü: her URL bittiği anda bir sonuç kaydı üretir.
+    compact=True ise kayıtta tam snapshot yerine snapshot_record() özeti bulunur; tam snapshot
+    yalnızca diske yazılır. ordered=False ise kayıtlar bitiş sırasıyla gelir ve aynı anda en fazla
+    workers*2 iş bekler; böylece URL listesi ne kadar uzun olursa olsun bellek sabit kalır.
+    snapshot_format: 'json' ya da 'snap' (ikili biçim, NNN_slug.snap).
+    asset_cache tüm sayfalar arasında paylaşılır; aynı asset bir kez indirilir.
+    """
     out_dir = os.path.abspath(out_dir)
     ensure_dir(out_dir)
-    urls = read_urls_from_file(file_path)
-    results = []
-    for idx, url in enumerate(urls, start=1):
-        slug = slugify(url) or f'url{idx}'
-        fname = f"{idx:03d}_{slug}.json"
-        out_json = os.path.join(out_dir, fname)
+    urls = iter_urls_from_file(file_path)
+    workers = max(1, workers)
+
+    def _jobs():
+        for idx, url in enumerate(urls, start=1):
+            slug = slugify(url) or f'url{idx}'
+            fname = f"{idx:03d}_{slug}{SNAPSHOT_FORMATS[snapshot_format]}"
+            yield idx, url, os.path.join(out_dir, fname)
+
+    session = make_session(pool_size=max(workers, per_host))
+    limiter = HostLimiter(per_host=per_host, min_interval=host_delay)
+
+    def _capture_job(job):
+        idx, url, out_json = job
+        try:
+            with profiler.profile(f'{idx:03d}_{url}') if profiler is not None else nullcontext():
+                res = capture_single(url, out_json, session=session, limiter=limiter,
+                                     validator_cache=validator_cache, max_bytes=max_bytes,
+                                     merkle_depth=merkle_depth, blob_store=blob_store, history=history, run=run,
+                                     timings=timings, asset_cache=asset_cache, mask_rules=mask_rules)
+            return {'index': idx, 'url': url, 'status': 'ok', 'out': snapshot_record(res, out_json) if compact else res}
+        except Exception as e:
+            return {'index': idx, 'url': url, 'status': 'error', 'exception': repr(e)}
+
+    try:
+        if workers == 1:
+            for job in _jobs():
+                yield _capture_job(job)
+        elif ordered:
+            # executor.map sonuçları giriş sırasıyla döndürür
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                yield from ex.map(_capture_job, _jobs())
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                pending = set()
+                for job in _jobs():
+                    pending.add(ex.submit(_capture_job, job))
+                    if len(pending) >= workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for fut in done:
+                            yield fut.result()
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        yield fut.result()
+    finally:
+        session.close()
+
+def capture_from_list(file_path: str, out_dir: str, workers: int = 1,
+                      per_host: int = 2, host_delay: float = 0.0,
+                      validator_cache: Optional[ValidatorCache] = None,
+                      max_bytes: Optional[int] = None,
+                      merkle_depth: int = MERKLE_MAX_DEPTH,
+                      blob_store: Optional[BlobStore] = None,
+                      history: Optional[HistoryStore] = None,
+                      run: Optional[str] = None,
+                      timings: bool = False,
+                      profiler: Optional[SlowestProfiles] = None,
+                      snapshot_format: str = 'json',
+                      asset_cache: Optional[AssetCache] = None,
+                      mask_rules: Optional[MaskRules] = None) -> List[Dict[str, Any]]:
+    """
+    Dosyadaki URL'leri yakalayıp out_dir altına NNN_slug.json olarak kaydeder.
+    workers > 1 ise yakalama bir thread havuzunda paralel yapılır; dosya adları ve
+    sonuç sırası yine de dosyadaki sıraya göre (deterministik) kalır.
+    timings=True ise her snapshot'ın meta.timings'i doldurulur; profiler verilirse her yakalama
+    cProfile/tracemalloc altında (sırayla) çalışır ve en yavaşların profili tutulur.
+    Tüm snapshot'lar (html dahil) bellekte toplanır; uzun listeler için iter_capture_from_list.
+    """
+    return list(iter_capture_from_list(file_path, out_dir, workers=workers, per_host=per_host,
+                                       host_delay=host_delay, validator_cache=validator_cache,
+                                       max_bytes=max_bytes, merkle_depth=merkle_depth, blob_store=blob_store,
+                                       history=history, run=run, timings=timings, profiler=profiler,
+                                       ordered=True, compact=False, snapshot_format=snapshot_format,
+                                       asset_cache=asset_cache, mask_rules=mask_rules))
+
+
+# ---- Kuyruk modu (queue) ----
+# URL'ler bir SQLite kuyruğuna (JobQueue) eklenir; aynı veritabanını gören her process / makine
+# 'queue work' ile iş kiralayıp yakalar. Her iş bittiği anda 'done' olarak kaydedilir, bu yüzden
+# kesilen bir çalıştırma yeniden başlatıldığında yalnızca kalan işler yapılır.
+
+def enqueue_urls(queue: JobQueue, file_path: str, out_dir: str, snapshot_format: str = 'json') -> Dict[str, Any]:
+    """URL dosyasını kuyruğa ekler; çıktı yolları liste moduyla aynı (out_dir/NNN_slug.<ext>)."""
+    out_dir = os.path.abspath(out_dir)
+    ext = SNAPSHOT_FORMATS[snapshot_format]
+    res = queue.add(iter_urls_from_file(file_path),
+                    lambda idx, url: os.path.join(out_dir, f"{idx:03d}_{slugify(url) or f'url{idx}'}{ext}"))
+    return dict(res, db=queue.path, out_dir=out_dir)
+
+def default_worker_id() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+def run_queue_worker(queue: JobQueue, worker_id: Optional[str] = None, workers: int = 1,
+                     lease: float = QUEUE_LEASE_SECONDS, retry_delay: float = QUEUE_RETRY_DELAY,
+                     poll: float = QUEUE_POLL_SECONDS, wait_for_leases: bool = True,
+                     max_jobs: Optional[int] = None, per_host: int = 2, host_delay: float = 0.0,
+                     max_bytes: Optional[int] = None, merkle_depth: int = MERKLE_MAX_DEPTH,
+                     blob_store: Optional[BlobStore] = None, history: Optional[HistoryStore] = None,
+                     run: Optional[str] = None, timings: bool = False,
+                     asset_cache: Optional[AssetCache] = None, mask_rules: Optional[MaskRules] = None,
+                     progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Kuyruktan iş kiralayıp workers thread'le yakalar; kuyrukta bitmemiş iş kalmayınca döner.
+    wait_for_leases=False ise alınacak iş kalmadığında başka worker'ların kiradaki işlerini beklemez.
+    Kiralar lease/3 aralıkla yenilenir; process çökerse kira dolunca iş başka worker'a geçer.
+    Aynı worker_id ile yeniden başlatılırsa önceki çalıştırmanın yarım kalan işleri hemen geri alınır.
+    Ağ hatası içeren snapshot'lar (snap['error']) retry_delay sonra yeniden denenir.
+    progress verilirse her iş bitiminde tek satırlık bir kayıtla çağrılır.
+    """
+    worker_id = worker_id or default_worker_id()
+    workers = max(1, workers)
+    released = queue.release_worker(worker_id)
+    session = make_session(pool_size=max(workers, per_host))
+    limiter = HostLimiter(per_host=per_host, min_interval=host_delay)
+    lock = threading.Lock()
+    stop = threading.Event()
+    in_flight: Dict[int, str] = {}
+    counts: Counter = Counter()
+    timing_list = []
+
+    def _take() -> Optional[Dict[str, Any]]:
+        while not stop.is_set():
+            with lock:
+                if max_jobs is not None and counts['claimed'] >= max_jobs:
+                    return None
+            job = queue.claim(worker_id, lease)
+            if job is not None:
+                with lock:
+                    counts['claimed'] += 1
+                    in_flight[job['id']] = job['url']
+                return job
+            # kalan işlerin hepsi bu process'in diğer thread'lerindeyse beklemeye gerek yok
+            remaining = queue.remaining()
+            with lock:
+                own = len(in_flight)
+            if not wait_for_leases or remaining <= own:
+                return None
+            stop.wait(poll)
+        return None
+
+    def _work(finished: threading.Event):
+        try:
+            while True:
+                job = _take()
+                if job is None:
+                    return
+                _run(job)
+        finally:
+            finished.set()
+
+    def _run(job: Dict[str, Any]):
         try:
-            res = capture_single(url, out_json)
-            results.append({'index': idx, 'url': url, 'status': 'ok', 'out': res})
+            snap = capture_single(job['url'], job['out_path'], session=session, limiter=limiter,
+                                  max_bytes=max_bytes, merkle_depth=merkle_depth, blob_store=blob_store,
+                                  history=history, run=run, timings=timings, asset_cache=asset_cache,
+                                  mask_rules=mask_rules)
+            rec = snapshot_record(snap, job['out_path'])
+            if snap.get('error'):
+                state = queue.fail(job['id'], worker_id, snap['error'], retry_delay)
+            else:
+                state = 'done' if queue.complete(job['id'], worker_id, rec) else 'lost'
         except Exception as e:
-            results.append({'index': idx, 'url': url, 'status': 'error', 'exception': repr(e)})
-    return results
+            rec = {'exception': repr(e)}
+            state = queue.fail(job['id'], worker_id, repr(e), retry_delay)
+        with lock:
+            in_flight.pop(job['id'], None)
+            counts[state] += 1
+            if timings and state == 'done':
+                timing_list.append(rec.get('timings'))
+        if progress is not None:
+            progress({'id': job['id'], 'url': job['url'], 'attempt': job['attempts'], 'state': state, 'out': rec})
+
+    def _heartbeat():
+        while not stop.wait(lease / 3):
+            with lock:
+                ids = list(in_flight)
+            queue.renew(ids, worker_id, lease)
 
+    # Thread.join Ctrl+C ile kesilirse thread hâlâ çalışırken dönebilir; bitiş bu yüzden Event'lerle izlenir
+    finished = [threading.Event() for _ in range(workers)]
+    threads = [threading.Thread(target=_work, args=(ev,), daemon=True) for ev in finished]
+    beat = threading.Thread(target=_heartbeat, daemon=True)
+    started = time.monotonic()
+    interrupted = False
+    try:
+        beat.start()
+        for t in threads:
+            t.start()
+        for ev in finished:
+            # kısa aralıklarla beklemek Ctrl+C'nin ana thread'e ulaşmasını sağlar
+            while not ev.wait(0.5):
+                pass
+    except KeyboardInterrupt:
+        # yeni iş alınmaz; süren yakalamalar bitirilip kaydedilir
+        interrupted = True
+        stop.set()
+        for ev in finished:
+            ev.wait()
+    finally:
+        stop.set()
+        beat.join()
+        session.close()
+    res = {'worker': worker_id, 'released': released, 'interrupted': interrupted,
+           'seconds': round(time.monotonic() - started, 3),
+           'jobs': {k: counts[k] for k in ('claimed', 'done', 'retry', 'failed', 'lost')},
+           'queue': queue.status(failed_limit=0)['counts']}
+    if asset_cache is not None:
+        res['assets'] = asset_cache.stats()
+    if timings:
+        res['timings'] = summarize_timings(timing_list)
+    return res
+
+
+# ---- Sürekli izleme (monitor) ----
+# Her URL kendi aralığıyla bir öncelik kuyruğunda (heap) bekler. Yakalanan snapshot hemen bir
+# öncekiyle kıyaslanır; değişen sayfanın aralığı daralır, değişmeyenin geri çekilir.
+# Dosya yapısı: <out>/current/NNN_slug.json, <out>/previous/NNN_slug.json,
+#               <out>/diffs/NNN_slug_diff.json (yalnızca değişimde), <out>/_monitor_state.json
+MONITOR_STATE_FILE = '_monitor_state.json'
+
+class RateLimiter:
+    """Tüm host'lar için ortak hız sınırı: iki istek başlangıcı arasında en az 1/rate saniye (0 = sınırsız)."""
+    def __init__(self, rate: float = 0.0):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def next_interval(interval: float, changed: bool, min_interval: float, max_interval: float,
+                  backoff: float = 1.5, tighten: float = 0.5) -> float:
+    """Değişen sayfada aralık tighten ile çarpılıp daralır, değişmeyende backoff ile uzar; sınırlar içinde kalır."""
+    return min(max_interval, max(min_interval, interval * (tighten if changed else backoff)))
+
+def _load_monitor_state(path: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f) or {}
+    except (OSError, ValueError):
+        return {}
+
+def _save_monitor_state(path: str, states: Dict[str, Dict[str, Any]]):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(states, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def print_event(event: Dict[str, Any]):
+    """Her kontrol için stdout'a tek satırlık JSON olay kaydı yazar."""
+    print(json.dumps(event, ensure_ascii=False), flush=True)
+
+def monitor(file_path: str, out_dir: str,
+            min_interval: float = 60.0, max_interval: float = 86400.0, initial_interval: float = 900.0,
+            backoff: float = 1.5, tighten: float = 0.5, jitter: float = 0.1,
+            rate: float = 0.0, workers: int = 4, per_host: int = 2, host_delay: float = 0.0,
+            max_bytes: Optional[int] = None, merkle_depth: int = MERKLE_MAX_DEPTH,
+            blob_store: Optional[BlobStore] = None, history: Optional[HistoryStore] = None,
+            duration: Optional[float] = None, max_checks: Optional[int] = None,
+            emit: Optional[Any] = None, mask_rules: Optional[MaskRules] = None) -> Dict[str, Any]:
+    """
+    URL listesini sürekli izler. İlk turda her URL hemen yakalanır; sonrasında her URL
+    gözlenen değişim oranına göre uyarlanan aralıkla (± jitter) yeniden yakalanır.
+    rate: tüm host'lar için saniyedeki en fazla istek başlangıcı; per_host/host_delay host başına sınırlar.
+    duration (saniye) ya da max_checks dolunca veya Ctrl+C ile durur; öğrenilen aralıklar
+    _monitor_state.json'a yazılır ve yeniden başlatmada kaldığı yerden devam edilir.
+    mask_rules verilirse uçucu içerik (nonce, zaman damgası, reklam alanı) her değişimi tetiklemez.
+    """
+    from compare_snapshots import compare
+
+    out_dir = os.path.abspath(out_dir)
+    cur_dir, prev_dir, diff_dir = (os.path.join(out_dir, d) for d in ('current', 'previous', 'diffs'))
+    for d in (cur_dir, prev_dir, diff_dir):
+        ensure_dir(d)
+    state_path = os.path.join(out_dir, MONITOR_STATE_FILE)
+    saved = _load_monitor_state(state_path)
+    emit = emit or print_event
+    workers = max(1, workers)
+
+    states: Dict[str, Dict[str, Any]] = {}
+    order: Dict[str, int] = {}
+    heap: List[tuple] = []
+    now_mono, now_wall = time.monotonic(), time.time()
+    for idx, url in enumerate(read_urls_from_file(file_path), start=1):
+        st = dict({'interval': initial_interval, 'checks': 0, 'changes': 0, 'errors': 0,
+                   'last_checked': None, 'last_changed': None, 'next_due': None},
+                  **saved.get(url, {}))
+        st['file'] = f"{idx:03d}_{slugify(url) or f'url{idx}'}.json"
+        states[url] = st
+        order[url] = idx
+        due = now_mono + max(0.0, (st['next_due'] or now_wall) - now_wall)
+        heapq.heappush(heap, (due, idx, url))
+
+    session = make_session(pool_size=max(workers, per_host))
+    limiter = HostLimiter(per_host=per_host, min_interval=host_delay)
+    rate_limiter = RateLimiter(rate)
+
+    def _check(url: str) -> Dict[str, Any]:
+        st = states[url]
+        cur = os.path.join(cur_dir, st['file'])
+        prev = os.path.join(prev_dir, st['file'])
+        had_current = os.path.exists(cur)
+        if had_current:
+            os.replace(cur, prev)
+        previous = load_previous_snapshot(url, prev) if had_current else None
+        rate_limiter.acquire()
+        snap = capture_single(url, cur, session=session, limiter=limiter, max_bytes=max_bytes,
+                              merkle_depth=merkle_depth, blob_store=blob_store, history=history,
+                              previous=previous, mask_rules=mask_rules)
+        event = {'url': url, 'captured_at': snap.get('captured_at')}
+        if snap.get('error'):
+            if had_current:
+                os.replace(prev, cur)   # son sağlam snapshot kıyas tabanı olarak kalsın
+            event.update(status='error', error=snap['error'])
+        elif not had_current:
+            event['status'] = 'first'
+        elif (snap.get('validators') or {}).get('not_modified'):
+            event['status'] = 'not_modified'
+        else:
+            diff_path = os.path.join(diff_dir, st['file'][:-len('.json')] + '_diff.json')
+            diff = compare(prev, cur, out_json=diff_path, save=False)
+            summary = diff.get('summary') or {}
+            if summary.get('changed'):
+                with open(diff_path, 'w', encoding='utf-8') as f:
+                    json.dump(diff, f, ensure_ascii=False, indent=2)
+                event.update(status='changed', diff=diff_path,
+                             significant=summary.get('significant_change'),
+                             text_similarity=summary.get('text_similarity'))
+            else:
+                event['status'] = 'unchanged'
+        return event
+
+    def _persisted() -> Dict[str, Dict[str, Any]]:
+        return {u: {k: v for k, v in st.items() if k != 'file'} for u, st in states.items()}
+
+    started = time.monotonic()
+    checks = 0
+    stop = False
+    inflight: Dict[Any, str] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            while heap or inflight:
+                now = time.monotonic()
+                if duration is not None and now - started >= duration:
+                    stop = True
+                if max_checks is not None and checks + len(inflight) >= max_checks:
+                    stop = True
+                while not stop and heap and heap[0][0] <= now and len(inflight) < workers:
+                    _, _, url = heapq.heappop(heap)
+                    inflight[ex.submit(_check, url)] = url
+                    if max_checks is not None and checks + len(inflight) >= max_checks:
+                        stop = True
+                if stop and not inflight:
+                    break
+                timeout = None if stop or not heap else max(0.0, heap[0][0] - time.monotonic())
+                if inflight:
+                    done, _ = wait(list(inflight), timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(min(timeout, 1.0) if timeout is not None else 1.0)
+                    done = ()
+                for fut in done:
+                    url = inflight.pop(fut)
+                    st = states[url]
+                    try:
+                        event = fut.result()
+                    except Exception as e:
+                        event = {'url': url, 'status': 'error', 'error': repr(e)}
+                    checks += 1
+                    changed = event['status'] == 'changed'
+                    st['checks'] += 1
+                    st['changes'] += int(changed)
+                    st['errors'] += int(event['status'] == 'error')
+                    st['last_checked'] = utc_now_iso()
+                    if changed:
+                        st['last_changed'] = st['last_checked']
+                    if event['status'] != 'first':
+                        # hata veren host'lar da geri çekilir; ilk yakalama aralığı değiştirmez
+                        st['interval'] = next_interval(st['interval'], changed, min_interval, max_interval,
+                                                       backoff, tighten)
+                    delay = st['interval'] * random.uniform(1.0 - jitter, 1.0 + jitter)
+                    st['next_due'] = time.time() + delay
+                    heapq.heappush(heap, (time.monotonic() + delay, order[url], url))
+                    event.update(interval=round(st['interval'], 1), next_in=round(delay, 1))
+                    emit(event)
+                if done:
+                    _save_monitor_state(state_path, _persisted())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        session.close()
+        _save_monitor_state(state_path, _persisted())
+    return {'out_dir': out_dir, 'checks': checks,
+            'urls': {u: {k: st[k] for k in ('interval', 'checks', 'changes', 'errors', 'last_changed')}
+                     for u, st in states.items()}}
+
+
+def pack_snapshot_dir(dir_path: str, blob_store: BlobStore) -> Dict[str, Any]:
+    """
+    Var olan bir snapshot klasörünü yerinde dönüştürür: satır içi html/screenshot_hex
+    alanları blob deposuna taşınır, JSON'larda yalnızca referanslar kalır.
+    """
+    dir_path = os.path.abspath(dir_path)
+    packed, skipped, bytes_before, bytes_after = 0, 0, 0, 0
+    for name in sorted(os.listdir(dir_path)):
+        if not name.lower().endswith('.json') or name.startswith('_'):
+            continue
+        path = os.path.join(dir_path, name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            skipped += 1
+            continue
+        if not isinstance(snap, dict) or ('html' not in snap and 'screenshot_hex' not in snap):
+            skipped += 1
+            continue
+        bytes_before += os.path.getsize(path)
+        externalize(snap, blob_store, path)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(snap, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        bytes_after += os.path.getsize(path)
+        packed += 1
+    return {'dir': dir_path, 'store': blob_store.root, 'packed': packed, 'skipped': skipped,
+            'json_bytes_before': bytes_before, 'json_bytes_after': bytes_after}
+
+def fingerprint_snapshot_dir(dir_path: str) -> Dict[str, Any]:
+    """Var olan bir klasördeki snapshot'lara (ekran görüntüsü sonradan eklenmiş olabilir) 'visual_fp' yazar."""
+    dir_path = os.path.abspath(dir_path)
+    updated, unchanged, skipped = 0, 0, 0
+    for name in sorted(os.listdir(dir_path)):
+        if not name.lower().endswith('.json') or name.startswith('_'):
+            continue
+        path = os.path.join(dir_path, name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            skipped += 1
+            continue
+        if not isinstance(snap, dict):
+            skipped += 1
+            continue
+        if not add_visual_fingerprint(snap, path):
+            unchanged += 1
+            continue
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(snap, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        updated += 1
+    return {'dir': dir_path, 'updated': updated, 'unchanged': unchanged, 'skipped': skipped}
+
+def convert_snapshot_dir(dir_path: str, to: str = 'snap', remove_source: bool = False) -> Dict[str, Any]:
+    """
+    Klasördeki JSON snapshot'ları .snap'e (to='snap') ya da .snap'leri JSON'a (to='json') çevirir.
+    Hedef dosya kaynaktan yeniyse atlanır; remove_source=True ise başarılı dönüşümden sonra kaynak silinir.
+    """
+    dir_path = os.path.abspath(dir_path)
+    src_ext = '.json' if to == 'snap' else SNAPSHOT_EXT
+    converted, up_to_date, skipped, bytes_before, bytes_after = 0, 0, 0, 0, 0
+    for name in sorted(os.listdir(dir_path)):
+        if not name.lower().endswith(src_ext) or name.startswith('_'):
+            continue
+        path = os.path.join(dir_path, name)
+        target = os.path.splitext(path)[0] + SNAPSHOT_FORMATS[to]
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+            up_to_date += 1
+            continue
+        try:
+            snap = load_snapshot(path)
+        except (OSError, ValueError):
+            skipped += 1
+            continue
+        if not isinstance(snap, dict) or 'url' not in snap:
+            skipped += 1
+            continue
+        if to == 'snap':
+            write_snapshot_file(target, snap)
+        else:
+            tmp = target + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(snap, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, target)
+        bytes_before += os.path.getsize(path)
+        bytes_after += os.path.getsize(target)
+        if remove_source:
+            os.remove(path)
+        converted += 1
+    return {'dir': dir_path, 'to': to, 'converted': converted, 'up_to_date': up_to_date, 'skipped': skipped,
+            'bytes_before': bytes_before, 'bytes_after': bytes_after}
 
 def _read_png_hex_near_json(json_path: str) -> Optional[str]:
     try:
@@ -225,16 +1859,165 @@ def _read_png_hex_near_json(json_path: str) -> Optional[str]:
         return None
     return None
 
+def stream_capture(args, validator_cache: Optional[ValidatorCache], blob_store: Optional[BlobStore],
+                   history: Optional[HistoryStore], run: str, profiler: Optional[SlowestProfiles],
+                   asset_cache: Optional[AssetCache] = None, mask_rules: Optional[MaskRules] = None):
+    """capture --ndjson: her URL bittiğinde stdout'a bir satır, en sonda bir özet satırı yazar."""
+    count = errors = 0
+    timing_list = []
+    for rec in iter_capture_from_list(args.file, args.out_dir, workers=args.workers,
+                                      per_host=args.per_host, host_delay=args.host_delay,
+                                      validator_cache=validator_cache, max_bytes=args.max_bytes,
+                                      merkle_depth=args.dom_depth, blob_store=blob_store, history=history,
+                                      run=run, timings=args.timings, profiler=profiler,
+                                      snapshot_format=args.format, asset_cache=asset_cache,
+                                      mask_rules=mask_rules):
+        count += 1
+        if rec['status'] != 'ok' or 'error' in rec['out']:
+            errors += 1
+        if args.timings:
+            timing_list.append(rec['out'].get('timings') if rec['status'] == 'ok' else None)
+        print_event(rec)
+    if validator_cache is not None:
+        validator_cache.save()
+    if asset_cache is not None:
+        asset_cache.save()
+    summary = {'message': 'batch_complete', 'count': count, 'errors': errors}
+    if asset_cache is not None:
+        summary['assets'] = asset_cache.stats()
+    if args.timings:
+        summary['timings'] = summarize_timings(timing_list)
+    if profiler is not None:
+        summary['profiles'] = profiler.dump()
+    print_event(summary)
+
+def asset_cache_from_args(args) -> Optional[AssetCache]:
+    """--assets / --asset-cache seçeneklerinden ortak AssetCache; ikisi de yoksa None."""
+    if not (args.assets or args.asset_cache):
+        return None
+    return AssetCache(args.asset_cache, workers=args.asset_workers, per_host=args.per_host,
+                      max_bytes=args.asset_max_bytes)
+
+def mask_rules_from_args(args) -> Optional[MaskRules]:
+    """--mask-rules dosyasını yükleyip derler; dosya yoksa ya da kural hatalıysa hata JSON'u basıp çıkar."""
+    if not args.mask_rules:
+        return None
+    try:
+        return MaskRules(args.mask_rules)
+    except OSError:
+        err = {'error': 'file_not_found', 'path': os.path.abspath(args.mask_rules)}
+    except ValueError as e:
+        err = {'error': 'invalid_mask_rules', 'path': os.path.abspath(args.mask_rules), 'msg': str(e)}
+    print(json.dumps(err, ensure_ascii=False, indent=2))
+    sys.exit(2)
+
 def main():
     ap = argparse.ArgumentParser(description='Capture and compare snapshots (merged tool)')
     sub = ap.add_subparsers(dest='cmd', required=True)
 
-    cap = sub.add_parser('capture', help='Capture snapshot(s)')
+    asg = argparse.ArgumentParser(add_help=False)
+    asg.add_argument('--assets', action='store_true',
+                     help='Fetch referenced images, scripts and stylesheet/icon/preload links once per run '
+                          'and store their content hashes in structure.asset_content')
+    asg.add_argument('--asset-cache', help='ETag/Last-Modified + hash cache file for assets across runs (implies --assets)')
+    asg.add_argument('--asset-workers', type=int, default=ASSET_WORKERS,
+                     help='Concurrent asset downloads shared by all pages (default: %(default)s)')
+    asg.add_argument('--asset-max-bytes', type=int, default=ASSET_MAX_BYTES,
+                     help='Max bytes hashed per asset; larger ones are marked truncated (default: 20 MiB, 0 = no limit)')
+
+    msk = argparse.ArgumentParser(add_help=False)
+    msk.add_argument('--mask-rules', help='Per-site JSON rules (selectors, attribute patterns, text/URL regexes, query params) '
+                                          'for volatile content masked before hashing')
+
+    cap = sub.add_parser('capture', parents=[asg, msk], help='Capture snapshot(s)')
     capgrp = cap.add_mutually_exclusive_group(required=True)
     capgrp.add_argument('--url', '-u', help='Single URL to capture')
     capgrp.add_argument('--file', '-f', help='File with URLs (one per line) to capture')
     cap.add_argument('--out', help='Output JSON path for single URL mode (e.g. snapshots/first.json)')
     cap.add_argument('--out-dir', help='Output directory for list mode (e.g. snapshots/)')
+    cap.add_argument('--workers', '-w', type=int, default=1, help='Concurrent capture workers for list mode (default: 1)')
+    cap.add_argument('--per-host', type=int, default=2, help='Max concurrent requests per host (default: 2)')
+    cap.add_argument('--host-delay', type=float, default=0.0, help='Min seconds between request starts to the same host (default: 0)')
+    cap.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES,
+                     help='Max response body bytes to read; larger pages are truncated (default: 10 MiB, 0 = no limit)')
+    cap.add_argument('--dom-depth', type=int, default=MERKLE_MAX_DEPTH,
+                     help='Deepest element level stored in the DOM Merkle tree (default: %(default)s)')
+    cap.add_argument('--blob-store', help='Content-addressed store dir for raw HTML/screenshots; JSON keeps only references')
+    cap.add_argument('--history', help='SQLite history DB to record signal hashes into (e.g. snapshots/history.db)')
+    cap.add_argument('--run', help='Run label stored in the history DB (default: capture start time, UTC)')
+    cap.add_argument('--validator-cache', help='ETag/Last-Modified cache file; unchanged pages (304) reuse the previous snapshot')
+    cap.add_argument('--timings', action='store_true',
+                     help='Record per-stage wall/CPU times in meta.timings and add percentile stats to the batch output')
+    cap.add_argument('--profile-dir', help='Run captures under cProfile + tracemalloc and dump the slowest here (memory figures are process-wide under --workers > 1)')
+    cap.add_argument('--profile-top', type=int, default=5, help='How many of the slowest URLs to keep profiles for (default: 5)')
+    cap.add_argument('--format', choices=sorted(SNAPSHOT_FORMATS), default='json',
+                     help='Snapshot file format for list mode: json or binary snap (default: json)')
+    cap.add_argument('--ndjson', action='store_true',
+                     help='Stream one compact JSON line per URL as it completes (no HTML), then a summary line')
+
+    mon = sub.add_parser('monitor', parents=[msk], help='Continuously recapture URLs with adaptive per-URL intervals and compare each new snapshot')
+    mon.add_argument('--file', '-f', required=True, help='File with one URL per line')
+    mon.add_argument('--out-dir', required=True, help='Monitor directory (current/, previous/, diffs/, state)')
+    mon.add_argument('--min-interval', type=float, default=60.0, help='Shortest recapture interval in seconds (default: 60)')
+    mon.add_argument('--max-interval', type=float, default=86400.0, help='Longest recapture interval in seconds (default: 86400)')
+    mon.add_argument('--initial-interval', type=float, default=900.0, help='Starting interval for new URLs in seconds (default: 900)')
+    mon.add_argument('--backoff', type=float, default=1.5, help='Interval multiplier after an unchanged check (default: 1.5)')
+    mon.add_argument('--tighten', type=float, default=0.5, help='Interval multiplier after a changed check (default: 0.5)')
+    mon.add_argument('--jitter', type=float, default=0.1, help='Random +/- fraction applied to each interval (default: 0.1)')
+    mon.add_argument('--rate', type=float, default=0.0, help='Global max request starts per second (default: 0 = unlimited)')
+    mon.add_argument('--workers', '-w', type=int, default=4, help='Parallel captures (default: 4)')
+    mon.add_argument('--per-host', type=int, default=2, help='Max concurrent requests per host (default: 2)')
+    mon.add_argument('--host-delay', type=float, default=1.0, help='Min seconds between request starts to the same host (default: 1)')
+    mon.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES,
+                     help='Max response body bytes to read; larger pages are truncated (default: 10 MiB, 0 = no limit)')
+    mon.add_argument('--dom-depth', type=int, default=MERKLE_MAX_DEPTH,
+                     help='Deepest element level stored in the DOM Merkle tree (default: %(default)s)')
+    mon.add_argument('--blob-store', help='Content-addressed store dir for raw HTML/screenshots; JSON keeps only references')
+    mon.add_argument('--history', help='SQLite history DB to record every capture into')
+    mon.add_argument('--duration', type=float, help='Stop after this many seconds (default: run until Ctrl+C)')
+    mon.add_argument('--max-checks', type=int, help='Stop after this many captures')
+
+    que = sub.add_parser('queue', help='Resumable SQLite job queue: enqueue URLs, then run workers on any host sharing the DB')
+    qsub = que.add_subparsers(dest='queue_cmd')
+    qdb = argparse.ArgumentParser(add_help=False)
+    qdb.add_argument('--db', required=True, help='Queue database (SQLite) path, e.g. snapshots/queue.db')
+    qadd = qsub.add_parser('add', parents=[qdb], help='Enqueue URLs from a file (URLs already in the queue are skipped)')
+    qadd.add_argument('--file', '-f', required=True, help='File with one URL per line')
+    qadd.add_argument('--out-dir', required=True, help='Directory the snapshots are written to (must be the same path on every worker host)')
+    qadd.add_argument('--format', choices=sorted(SNAPSHOT_FORMATS), default='json', help='Snapshot file format (default: json)')
+    qwrk = qsub.add_parser('work', parents=[qdb, asg, msk], help='Claim and capture queued URLs until the queue is drained')
+    qwrk.add_argument('--worker-id', help='Lease owner name; reusing it after a crash reclaims its leases at once (default: host-pid)')
+    qwrk.add_argument('--workers', '-w', type=int, default=1, help='Capture threads in this process (default: 1)')
+    qwrk.add_argument('--lease', type=float, default=QUEUE_LEASE_SECONDS, help='Lease length in seconds, renewed while running (default: %(default)s)')
+    qwrk.add_argument('--retry-delay', type=float, default=QUEUE_RETRY_DELAY, help='Seconds before a failed URL is retried (default: %(default)s)')
+    qwrk.add_argument('--max-attempts', type=int, default=3, help='Attempts per URL before it is marked failed (default: 3)')
+    qwrk.add_argument('--poll', type=float, default=QUEUE_POLL_SECONDS, help='Seconds between checks while other workers hold the remaining leases (default: %(default)s)')
+    qwrk.add_argument('--no-wait', action='store_true', help='Exit when nothing is claimable instead of waiting for other workers\' leases')
+    qwrk.add_argument('--max-jobs', type=int, help='Stop after claiming this many jobs')
+    qwrk.add_argument('--per-host', type=int, default=2, help='Max concurrent requests per host (default: 2)')
+    qwrk.add_argument('--host-delay', type=float, default=0.0, help='Min seconds between request starts to the same host (default: 0)')
+    qwrk.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES,
+                      help='Max response body bytes to read; larger pages are truncated (default: 10 MiB, 0 = no limit)')
+    qwrk.add_argument('--dom-depth', type=int, default=MERKLE_MAX_DEPTH,
+                      help='Deepest element level stored in the DOM Merkle tree (default: %(default)s)')
+    qwrk.add_argument('--blob-store', help='Content-addressed store dir for raw HTML/screenshots; JSON keeps only references')
+    qwrk.add_argument('--history', help='SQLite history DB to record signal hashes into')
+    qwrk.add_argument('--run', help='Run label stored in the history DB (default: capture start time, UTC)')
+    qwrk.add_argument('--timings', action='store_true', help='Record per-stage timings (meta.timings) and summarize them')
+    qsub.add_parser('status', parents=[qdb], help='Show job counts, expired leases and failed URLs')
+    qsub.add_parser('retry', parents=[qdb], help='Move failed jobs back to pending with their attempt counters reset')
+
+    pck = sub.add_parser('pack', help='Move inline html/screenshot_hex of existing snapshots into a blob store')
+    pck.add_argument('--dir', '-d', required=True, help='Snapshot directory to convert in place')
+    pck.add_argument('--blob-store', required=True, help='Content-addressed store directory')
+
+    cnv = sub.add_parser('convert', help='Convert snapshots in a directory between JSON and the binary .snap format')
+    cnv.add_argument('--dir', '-d', required=True, help='Snapshot directory to convert')
+    cnv.add_argument('--to', choices=sorted(SNAPSHOT_FORMATS), default='snap', help='Target format (default: snap)')
+    cnv.add_argument('--remove-source', action='store_true', help='Delete each source file after it is converted')
+
+    fpr = sub.add_parser('fingerprint', help='Store phash + downscaled grayscale thumbnail of each snapshot screenshot')
+    fpr.add_argument('--dir', '-d', required=True, help='Snapshot directory to update in place')
 
     cmp = sub.add_parser('compare', help='Compare two snapshot JSON files')
     cmp.add_argument('--first', '-f', required=True, help='First snapshot JSON path (baseline)')
@@ -253,26 +2036,160 @@ def main():
     
 
     if args.cmd == 'capture':
-        if args.url:
-            if not args.out:
-                print(json.dumps({'error': 'out_required_for_single_url', 'msg': 'Use --out to set output JSON path for single URL mode.'}, ensure_ascii=False, indent=2))
-                sys.exit(2)
-            res = capture_single(args.url, args.out, None)
-            print(json.dumps(res, ensure_ascii=False, indent=2))
-        else:
-            if not args.out_dir:
-                print(json.dumps({'error': 'out_dir_required_for_file_mode', 'msg': 'Use --out-dir to set directory for saving snapshots.'}, ensure_ascii=False, indent=2))
-                sys.exit(2)
-            try:
-                results = capture_from_list(args.file, args.out_dir)
-                print(json.dumps({'message': 'batch_complete', 'count': len(results), 'results': results}, ensure_ascii=False, indent=2))
-            except FileNotFoundError as e:
-                print(json.dumps({'error': 'file_not_found', 'path': str(e)}, ensure_ascii=False, indent=2))
-                sys.exit(2)
+        validator_cache = ValidatorCache(args.validator_cache) if args.validator_cache else None
+        blob_store = BlobStore(args.blob_store) if args.blob_store else None
+        history = HistoryStore(args.history) if args.history else None
+        run = args.run or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        profiler = SlowestProfiles(args.profile_dir, top=args.profile_top) if args.profile_dir else None
+        mask_rules = mask_rules_from_args(args)
+        asset_cache = asset_cache_from_args(args)
+        try:
+            if args.url:
+                if not args.out:
+                    print(json.dumps({'error': 'out_required_for_single_url', 'msg': 'Use --out to set output JSON path for single URL mode.'}, ensure_ascii=False, indent=2))
+                    sys.exit(2)
+                with profiler.profile(args.url) if profiler is not None else nullcontext():
+                    res = capture_single(args.url, args.out, None, validator_cache=validator_cache,
+                                         max_bytes=args.max_bytes, merkle_depth=args.dom_depth, blob_store=blob_store,
+                                         history=history, run=run, timings=args.timings, asset_cache=asset_cache,
+                                         mask_rules=mask_rules)
+                if validator_cache is not None:
+                    validator_cache.save()
+                if asset_cache is not None:
+                    asset_cache.save()
+                if args.ndjson:
+                    res = dict({'url': args.url}, **snapshot_record(res, os.path.abspath(args.out)))
+                if profiler is not None:
+                    res['profiles'] = profiler.dump()
+                if args.ndjson:
+                    print_event(res)
+                else:
+                    print(json.dumps(res, ensure_ascii=False, indent=2))
+            else:
+                if not args.out_dir:
+                    print(json.dumps({'error': 'out_dir_required_for_file_mode', 'msg': 'Use --out-dir to set directory for saving snapshots.'}, ensure_ascii=False, indent=2))
+                    sys.exit(2)
+                if args.ndjson:
+                    try:
+                        stream_capture(args, validator_cache, blob_store, history, run, profiler, asset_cache, mask_rules)
+                    except FileNotFoundError as e:
+                        print_event({'error': 'file_not_found', 'path': str(e)})
+                        sys.exit(2)
+                    return
+                try:
+                    results = capture_from_list(args.file, args.out_dir, workers=args.workers,
+                                                per_host=args.per_host, host_delay=args.host_delay,
+                                                validator_cache=validator_cache, max_bytes=args.max_bytes,
+                                                merkle_depth=args.dom_depth,
+                                                blob_store=blob_store, history=history, run=run,
+                                                timings=args.timings, profiler=profiler,
+                                                snapshot_format=args.format, asset_cache=asset_cache,
+                                                mask_rules=mask_rules)
+                    if validator_cache is not None:
+                        validator_cache.save()
+                    batch = {'message': 'batch_complete', 'count': len(results), 'results': results}
+                    if asset_cache is not None:
+                        asset_cache.save()
+                        batch['assets'] = asset_cache.stats()
+                    if args.timings:
+                        batch['timings'] = summarize_timings(((r.get('out') or {}).get('meta') or {}).get('timings')
+                                                             for r in results)
+                    if profiler is not None:
+                        batch['profiles'] = profiler.dump()
+                    print(json.dumps(batch, ensure_ascii=False, indent=2))
+                except FileNotFoundError as e:
+                    print(json.dumps({'error': 'file_not_found', 'path': str(e)}, ensure_ascii=False, indent=2))
+                    sys.exit(2)
+        finally:
+            if asset_cache is not None:
+                asset_cache.close()
+    elif args.cmd == 'monitor':
+        if not os.path.exists(args.file):
+            print(json.dumps({'error': 'file_not_found', 'path': os.path.abspath(args.file)}, ensure_ascii=False, indent=2))
+            sys.exit(2)
+        mask_rules = mask_rules_from_args(args)
+        history = HistoryStore(args.history) if args.history else None
+        try:
+            res = monitor(args.file, args.out_dir,
+                          min_interval=args.min_interval, max_interval=args.max_interval,
+                          initial_interval=args.initial_interval, backoff=args.backoff, tighten=args.tighten,
+                          jitter=args.jitter, rate=args.rate, workers=args.workers, per_host=args.per_host,
+                          host_delay=args.host_delay, max_bytes=args.max_bytes, merkle_depth=args.dom_depth,
+                          blob_store=BlobStore(args.blob_store) if args.blob_store else None,
+                          history=history, duration=args.duration, max_checks=args.max_checks,
+                          mask_rules=mask_rules)
+        finally:
+            if history is not None:
+                history.close()
+        print(json.dumps(res, ensure_ascii=False, indent=2), file=sys.stderr)
+    elif args.cmd == 'queue':
+        if args.queue_cmd is None:
+            que.print_help()
+            sys.exit(2)
+        queue = JobQueue(args.db, max_attempts=getattr(args, 'max_attempts', 3))
+        try:
+            if args.queue_cmd == 'add':
+                try:
+                    res = enqueue_urls(queue, args.file, args.out_dir, snapshot_format=args.format)
+                except FileNotFoundError as e:
+                    res = {'error': 'file_not_found', 'path': str(e)}
+            elif args.queue_cmd == 'work':
+                mask_rules = mask_rules_from_args(args)
+                history = HistoryStore(args.history) if args.history else None
+                asset_cache = asset_cache_from_args(args)
+                try:
+                    res = run_queue_worker(queue, worker_id=args.worker_id, workers=args.workers, lease=args.lease,
+                                           retry_delay=args.retry_delay, poll=args.poll,
+                                           wait_for_leases=not args.no_wait, max_jobs=args.max_jobs,
+                                           per_host=args.per_host, host_delay=args.host_delay,
+                                           max_bytes=args.max_bytes, merkle_depth=args.dom_depth,
+                                           blob_store=BlobStore(args.blob_store) if args.blob_store else None,
+                                           history=history,
+                                           run=args.run or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ'),
+                                           timings=args.timings, asset_cache=asset_cache, mask_rules=mask_rules,
+                                           progress=print_event)
+                finally:
+                    if history is not None:
+                        history.close()
+                    if asset_cache is not None:
+                        asset_cache.save()
+                        asset_cache.close()
+                res['message'] = 'worker_complete'
+                print_event(res)
+                return
+            elif args.queue_cmd == 'retry':
+                res = {'db': queue.path, 'requeued': queue.retry_failed()}
+            else:
+                res = queue.status()
+        finally:
+            queue.close()
+        print(json.dumps(res, ensure_ascii=False, indent=2))
+        if 'error' in res:
+            sys.exit(2)
+    elif args.cmd == 'pack':
+        if not os.path.isdir(args.dir):
+            print(json.dumps({'error': 'dir_not_found', 'path': os.path.abspath(args.dir)}, ensure_ascii=False, indent=2))
+            sys.exit(2)
+        res = pack_snapshot_dir(args.dir, BlobStore(args.blob_store))
+        print(json.dumps(res, ensure_ascii=False, indent=2))
+    elif args.cmd == 'convert':
+        if not os.path.isdir(args.dir):
+            print(json.dumps({'error': 'dir_not_found', 'path': os.path.abspath(args.dir)}, ensure_ascii=False, indent=2))
+            sys.exit(2)
+        res = convert_snapshot_dir(args.dir, to=args.to, remove_source=args.remove_source)
+        print(json.dumps(res, ensure_ascii=False, indent=2))
+    elif args.cmd == 'fingerprint':
+        if not os.path.isdir(args.dir):
+            print(json.dumps({'error': 'dir_not_found', 'path': os.path.abspath(args.dir)}, ensure_ascii=False, indent=2))
+            sys.exit(2)
+        res = fingerprint_snapshot_dir(args.dir)
+        print(json.dumps(res, ensure_ascii=False, indent=2))
     elif args.cmd == 'compare':
+        from compare_snapshots import compare as compare_snapshots
         res = compare_snapshots(args.first, args.second, out_json=args.out)
         print(json.dumps(res, ensure_ascii=False, indent=2))
     elif args.cmd == 'compare-dirs':
+        from compare_snapshots import compare_dirs
         res = compare_dirs(args.base_dir, args.current_dir, out_dir=args.out_dir)
         print(json.dumps(res, ensure_ascii=False, indent=2))
     else:
@@ -12,24 +12,60 @@
 #python3 compare_snapshots_v1.py dirs --base-dir snaps/base --current-dir snaps/curr --out-dir diffs#\"\"\"
 
 import argparse
+import glob
+import hashlib
+import importlib.util
 import json
 import os
 import sys
-from typing import Optional
+import threading
+from bisect import bisect_left
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+from typing import Callable, List, Optional, Union
 from typing import Dict, Any
 
-# Görsel karşılaştırma kütüphaneleri opsiyonel
-_VIS_LIBS = False
-try:
-    from PIL import Image
-    import imagehash
-    import numpy as np
-    from skimage.metrics import structural_similarity as ssim
-    _VIS_LIBS = True
-except Exception:
-    _VIS_LIBS = False
+from snapshot_profiling import StageTimer, summarize_timings, timed
+from snapshot_store import (HistoryStore, SNAPSHOT_EXT, load_screenshot, load_snapshot, resolve_section,
+                            screenshot_digest, signal_view, time_bound)
+
+# Görsel karşılaştırma kütüphaneleri opsiyonel. numpy/scipy/skimage'ın yüklenmesi CLI açılışının
+# çoğunu (~0.4 sn) tuttuğu için burada yalnızca kurulu olup olmadıklarına bakılır; asıl import
+# ilk görsel işlemde _load_vis_libs() ile yapılır, ekran görüntüsüz kıyaslar bunu hiç ödemez.
+_VIS_MODULES = ('PIL', 'imagehash', 'numpy', 'skimage')
+_VIS_LIBS = all(importlib.util.find_spec(m) is not None for m in _VIS_MODULES)
+_VIS_LOCK = threading.Lock()
+Image = imagehash = np = ssim = None
+
+
+def _load_vis_libs() -> bool:
+    """Görsel kütüphaneleri ilk çağrıda yükler; import başarısız olursa _VIS_LIBS False'a döner."""
+    global Image, imagehash, np, ssim, _VIS_LIBS
+    if ssim is not None or not _VIS_LIBS:
+        return _VIS_LIBS
+    with _VIS_LOCK:
+        if ssim is None and _VIS_LIBS:
+            try:
+                from PIL import Image as _Image
+                import imagehash as _imagehash
+                import numpy as _np
+                from skimage.metrics import structural_similarity as _ssim
+            except Exception:
+                _VIS_LIBS = False
+            else:
+                Image, imagehash, np = _Image, _imagehash, _np
+                ssim = _ssim   # en son atanır: diğer thread'ler ssim'i görünce hepsi hazırdır
+    return _VIS_LIBS
 
 DIFFS_DIR = 'diffs'
+DIFF_CACHE_FILE = '_diff_cache.json'
+BATCH_RESULTS_FILE = '_batch_results.ndjson'   # compare_dirs(stream_results=True) çift başına bir satır
+# diff çıktısının biçimi değişirse artırılır; eski önbellek kayıtları kendiliğinden geçersiz olur
+DIFF_CACHE_VERSION = 7
+# benzerlik bu eşiklerin altındaysa değişim "önemli" sayılır (SimHash: 1 - hamming/64, MinHash: tahmini Jaccard)
+DEFAULT_SIMILARITY_THRESHOLDS = {'text': 0.9, 'structure': 0.8}
+DOM_DIFF_LIMIT = 200   # dom_tree farkında raporlanan en fazla yol sayısı (kategori başına)
 
 def dom_signature(visible_text: str) -> Dict[str, Any]:
     return {
@@ -39,25 +75,184 @@ def dom_signature(visible_text: str) -> Dict[str, Any]:
 
 
 # ---- Görsel metrikler (opsiyonel) ----
-def visual_metrics(png_hex_a: str, png_hex_b: str) -> Optional[Dict[str, Any]]:
-    if not _VIS_LIBS:
+VISUAL_MODES = ('full', 'thumb', 'tiled')
+DEFAULT_VISUAL_MODE = 'full'   # visual.ssim tam çözünürlük SSIM'i kalır; thumb / tiled isteğe bağlı
+THUMB_WIDTH = 256            # küçültülmüş gri kopyanın genişliği (px); yükseklik orantılı
+TILE_SIZE = 32               # tiled modda karo kenarı (küçük kopya pikseli)
+TILE_SSIM_THRESHOLD = 0.95   # bu değerin altındaki karolar "değişmiş" sayılır (visual_hint ile aynı eşik)
+_SSIM_PAD = 3                # skimage varsayılan win_size=7 -> pencere yarıçapı
+
+def _png_bytes(png: Union[bytes, str]) -> bytes:
+    return png if isinstance(png, (bytes, bytearray)) else bytes.fromhex(png)
+
+def _downscale(gray: 'Image.Image') -> 'Image.Image':
+    w, h = gray.size
+    if w <= THUMB_WIDTH:
+        return gray.copy()
+    return gray.resize((THUMB_WIDTH, max(1, round(h * THUMB_WIDTH / w))), Image.LANCZOS)
+
+class DecodedScreenshot:
+    """
+    Gri tonlamaya çevrilmiş ekran görüntüsü, phash'i ve küçültülmüş kopyası
+    (bir kez hesaplanıp önbellekte tutulur). from_fingerprint() ile snapshot'ta saklı
+    parmak izinden kurulanlarda tam çözünürlüklü görüntü yoktur (gray=None).
+    """
+    __slots__ = ('gray', 'phash', 'size', '_thumb')
+
+    def __init__(self, png: Union[bytes, str, None] = None):
+        self.gray = self.phash = self.size = self._thumb = None
+        if png is not None:
+            _load_vis_libs()
+            import io
+            self.gray = Image.open(io.BytesIO(_png_bytes(png))).convert('L')
+            self.gray.load()
+            self.phash = imagehash.phash(self.gray)
+            self.size = self.gray.size
+
+    @classmethod
+    def from_fingerprint(cls, fp: Dict[str, Any]) -> 'DecodedScreenshot':
+        import base64
+        import io
+        _load_vis_libs()
+        shot = cls()
+        shot.phash = imagehash.hex_to_hash(fp['phash'])
+        shot.size = (fp['width'], fp['height'])
+        shot._thumb = Image.open(io.BytesIO(base64.b64decode(fp['thumb_png']))).convert('L')
+        shot._thumb.load()
+        return shot
+
+    @property
+    def thumb(self) -> 'Image.Image':
+        if self._thumb is None:
+            self._thumb = _downscale(self.gray)
+        return self._thumb
+
+    def fingerprint(self, digest: str) -> Dict[str, Any]:
+        """Snapshot JSON'una yazılacak görsel parmak izi (phash + PNG olarak küçük gri kopya)."""
+        import base64
+        import io
+        buf = io.BytesIO()
+        self.thumb.save(buf, format='PNG', optimize=True)
+        return {
+            'screenshot_sha256': digest,
+            'width': self.size[0],
+            'height': self.size[1],
+            'phash': str(self.phash),
+            'thumb_width': self.thumb.size[0],
+            'thumb_height': self.thumb.size[1],
+            'thumb_png': base64.b64encode(buf.getvalue()).decode('ascii'),
+        }
+
+def visual_fingerprint(png: Union[bytes, str], digest: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Yakalama anında bir kez hesaplanıp snapshot'ta 'visual_fp' olarak saklanır; compare() yeniden kullanır."""
+    if not _load_vis_libs():
+        return None
+    data = _png_bytes(png)
+    return DecodedScreenshot(data).fingerprint(digest or hashlib.sha256(data).hexdigest())
+
+def _edges(n: int, step: int) -> list:
+    """0..n aralığını step'lik parçalara böler; SSIM penceresinden kısa artık son parçaya eklenir."""
+    edges = list(range(0, n, step)) + [n]
+    if len(edges) > 2 and edges[-1] - edges[-2] < 2 * _SSIM_PAD + 1:
+        del edges[-2]
+    return edges
+
+def _tiled_ssim(a: 'np.ndarray', b: 'np.ndarray', scale: tuple, threshold: float,
+                early_exit: bool) -> Dict[str, Any]:
+    """
+    SSIM haritasını karo satırı bantları halinde hesaplar (bant kenarlarına pencere yarıçapı
+    kadar pay eklenir, böylece karo değerleri tüm görüntünün haritasıyla aynıdır).
+    early_exit=True ise eşiğin altına düşen ilk karoda durur.
+    """
+    h, w = a.shape
+    ys, xs = _edges(h, TILE_SIZE), _edges(w, TILE_SIZE)
+    sx, sy = scale
+    regions, weighted, area, computed, stopped = [], 0.0, 0, 0, False
+    for y0, y1 in zip(ys, ys[1:]):
+        lo, hi = max(0, y0 - _SSIM_PAD), min(h, y1 + _SSIM_PAD)
+        _, smap = ssim(a[lo:hi], b[lo:hi], full=True, data_range=255)
+        smap = smap[y0 - lo:y1 - lo]
+        run = None  # aynı satırdaki bitişik değişmiş karolar tek bölgede birleşir
+        for x0, x1 in zip(xs, xs[1:]):
+            score = float(smap[:, x0:x1].mean())
+            computed += 1
+            weighted += score * (y1 - y0) * (x1 - x0)
+            area += (y1 - y0) * (x1 - x0)
+            if score < threshold:
+                if run is not None and run['_x1'] == x0:
+                    run['_x1'] = x1
+                    run['min_ssim'] = min(run['min_ssim'], score)
+                else:
+                    run = {'_x0': x0, '_x1': x1, '_y0': y0, '_y1': y1, 'min_ssim': score}
+                    regions.append(run)
+                if early_exit:
+                    stopped = True
+                    break
+            else:
+                run = None
+        if stopped:
+            break
+    changed_regions = [{
+        'x': round(r['_x0'] * sx), 'y': round(r['_y0'] * sy),
+        'w': round((r['_x1'] - r['_x0']) * sx), 'h': round((r['_y1'] - r['_y0']) * sy),
+        'min_ssim': r['min_ssim'],
+    } for r in regions]
+    return {
+        'ssim': (weighted / area) if area else None,
+        'tiles_total': (len(ys) - 1) * (len(xs) - 1),
+        'tiles_computed': computed,
+        'early_exit': stopped,
+        'changed_regions': changed_regions,
+    }
+
+def visual_metrics(png_a: Union[bytes, str, DecodedScreenshot],
+                   png_b: Union[bytes, str, DecodedScreenshot],
+                   mode: str = 'full', threshold: float = TILE_SSIM_THRESHOLD,
+                   early_exit: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    İki PNG'yi (ham byte, eski hex string ya da önceden çözülmüş) phash ve SSIM ile kıyaslar.
+      full : tam çözünürlükte tek SSIM (eski davranış)
+      thumb: THUMB_WIDTH genişliğindeki küçük kopyalarda tek SSIM
+      tiled: küçük kopyalarda karo bazlı SSIM; değişen bölgeler tam çözünürlük koordinatlarıyla döner
+    """
+    if not _load_vis_libs():
         return None
-    import io
-    a = Image.open(io.BytesIO(bytes.fromhex(png_hex_a))).convert('L')
-    b = Image.open(io.BytesIO(bytes.fromhex(png_hex_b))).convert('L')
-    ph_a = imagehash.phash(a)
-    ph_b = imagehash.phash(b)
-    ph_dist = (ph_a - ph_b)
+    if mode not in VISUAL_MODES:
+        raise ValueError(f'unknown visual mode: {mode}')
+    shot_a = png_a if isinstance(png_a, DecodedScreenshot) else DecodedScreenshot(png_a)
+    shot_b = png_b if isinstance(png_b, DecodedScreenshot) else DecodedScreenshot(png_b)
+    ph_dist = (shot_a.phash - shot_b.phash)
+    if mode == 'full':
+        if shot_a.gray is None or shot_b.gray is None:
+            raise ValueError('full mode needs decoded screenshots, not fingerprints')
+        a, b = shot_a.gray, shot_b.gray
+    else:
+        a, b = shot_a.thumb, shot_b.thumb
     aw, ah = a.size
     bw, bh = b.size
     if (aw, ah) != (bw, bh):
         b = b.resize((aw, ah))
-    import numpy as np
-    ssim_score = float(ssim(np.array(a), np.array(b)))
-    return {
-        'phash_distance': int(ph_dist),
-        'ssim': ssim_score,
-    }
+    if mode != 'tiled':
+        ssim_score = float(ssim(np.array(a), np.array(b)))
+        res = {
+            'phash_distance': int(ph_dist),
+            'ssim': ssim_score,
+        }
+        if mode == 'thumb':
+            res['mode'] = mode
+        return res
+    scale = (shot_a.size[0] / aw, shot_a.size[1] / ah)
+    tiled = _tiled_ssim(np.array(a), np.array(b), scale, threshold, early_exit)
+    return dict({'phash_distance': int(ph_dist), 'mode': mode}, **tiled)
+
+def _identical_visual(mode: str) -> Dict[str, Any]:
+    """Ekran görüntüleri byte byte aynıyken görüntü çözmeden dönülen sonuç."""
+    res = {'phash_distance': 0, 'ssim': 1.0}
+    if mode != 'full':
+        res['mode'] = mode
+    if mode == 'tiled':
+        res.update(early_exit=False, changed_regions=[])
+    return res
 
 def slugify(url: str) -> str:
     s = re.sub(r"[^a-zA-Z0-9]+", "-", url)
@@ -79,6 +274,80 @@ def load_json(path: str) -> Optional[Dict[str, Any]]:
         return json.load(f)
 
 
+class SnapshotCache:
+    """
+    Çözülmüş snapshot JSON'ları ve ekran görüntüleri için sınırlı LRU önbellek.
+    Anahtar: (tür, mutlak yol, mtime_ns, boyut) — dosya değişirse eski kayıt kendiliğinden geçersiz olur.
+    Önbellekteki snapshot dict'leri salt okunur kabul edilir (.snap'lerde yalnızca resolve_section
+    ile bölümler yerine konur).
+    """
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max(1, max_entries)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _file_key(path: str) -> Optional[tuple]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (path, st.st_mtime_ns, st.st_size)
+
+    def _get_or_load(self, key: tuple, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = loader()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def load_json(self, path: str) -> Optional[Dict[str, Any]]:
+        path = os.path.abspath(path)
+        key = self._file_key(path)
+        if key is None:
+            return None
+        return self._get_or_load(('json',) + key, lambda: load_snapshot(path, lazy=True))
+
+    def screenshot(self, json_path: str, snap: Dict[str, Any]) -> Optional['DecodedScreenshot']:
+        if not _load_vis_libs():
+            return None
+        json_path = os.path.abspath(json_path)
+        key = self._file_key(json_path)
+        if key is None:
+            return None
+        # yanındaki png değişirse de anahtar değişsin
+        png_key = self._file_key(os.path.splitext(json_path)[0] + '.png')
+
+        def _load():
+            png = load_screenshot(snap, json_path)
+            return DecodedScreenshot(png) if png else None
+        return self._get_or_load(('png',) + key + (png_key,), _load)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / total) if total else None,
+            }
+
+
 def read_png_hex_near_json(json_path: str) -> Optional[str]:
     """If the snapshot JSON doesn't contain screenshot_hex, try to find a PNG with same basename."""
     try:
@@ -97,7 +366,287 @@ def read_png_hex_near_json(json_path: str) -> Optional[str]:
     return None
 
 
-def compare(first_json: str, second_json: str, out_json: Optional[str] = None) -> dict:
+def signal_fingerprint(snap: Dict[str, Any], json_path: str) -> str:
+    """
+    compare() sonucunu belirleyen tüm sinyallerin özeti: http/dom hash, html_hash,
+    tag_counts, asset hash'leri ve ekran görüntüsü özeti. captured_at, validators gibi
+    her çalıştırmada değişen alanlar dahil edilmez. Ağır alanlar (metin parçaları, DOM ağacı,
+    asset listeleri) bölüm sha256'larıyla temsil edilir; JSON ve .snap aynı parmak izini verir.
+    """
+    view = signal_view(snap)
+    payload = {
+        'url': snap.get('url'),
+        'http': (snap.get('http') or {}).get('hash'),
+        'dom': view.get('dom'),
+        'structure': view.get('structure'),
+        'screenshot': screenshot_digest(snap, json_path),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+def pair_fingerprint(first: Dict[str, Any], first_json: str,
+                     second: Dict[str, Any], second_json: str,
+                     visual_mode: str = DEFAULT_VISUAL_MODE, early_exit: bool = False,
+                     thresholds: Optional[Dict[str, float]] = None) -> str:
+    """Bir kıyas çiftinin içerik anahtarı (sıra önemli; görsel kütüphane durumu, görsel mod ve eşikler de dahil)."""
+    thresholds = json.dumps(dict(DEFAULT_SIMILARITY_THRESHOLDS, **(thresholds or {})), sort_keys=True)
+    key = f"{DIFF_CACHE_VERSION}:{int(_VIS_LIBS)}:{visual_mode}:{int(early_exit)}:{thresholds}:" \
+          f"{signal_fingerprint(first, first_json)}:{signal_fingerprint(second, second_json)}"
+    return hashlib.sha256(key.encode('ascii')).hexdigest()
+
+def simhash_similarity(first: Optional[str], second: Optional[str]) -> Dict[str, Any]:
+    """İki 64 bit SimHash (hex) arasındaki Hamming mesafesi ve 1 - mesafe/64 benzerliği (boş metin: None)."""
+    if first is None or second is None:
+        same = first == second
+        return {'simhash_distance': 0 if same else 64, 'similarity': 1.0 if same else 0.0}
+    distance = (int(first, 16) ^ int(second, 16)).bit_count()
+    return {'simhash_distance': distance, 'similarity': 1.0 - distance / 64}
+
+def minhash_jaccard(first: Optional[str], second: Optional[str]) -> float:
+    """Eşit MinHash slotlarının oranı = tahmini Jaccard benzerliği (slotlar 8 hex karakter)."""
+    if first is None or second is None or len(first) != len(second):
+        return 1.0 if first == second else 0.0
+    slots = len(first) // 8
+    return sum(first[i:i + 8] == second[i:i + 8] for i in range(0, len(first), 8)) / slots
+
+def similarity_report(first: Dict[str, Any], second: Dict[str, Any],
+                      thresholds: Optional[Dict[str, float]] = None) -> Any:
+    """Snapshot'lardaki sabit boyutlu taslaklardan O(1) benzerlik raporu; taslak yoksa 'not_available'."""
+    thresholds = dict(DEFAULT_SIMILARITY_THRESHOLDS, **(thresholds or {}))
+    f_dom, s_dom = first.get('dom') or {}, second.get('dom') or {}
+    f_struct, s_struct = first.get('structure') or {}, second.get('structure') or {}
+    report = {'thresholds': thresholds}
+    if 'simhash' in f_dom and 'simhash' in s_dom:
+        text = simhash_similarity(f_dom['simhash'], s_dom['simhash'])
+        text['significant'] = text['similarity'] < thresholds['text']
+        report['text'] = text
+    if 'minhash' in f_struct and 'minhash' in s_struct:
+        jaccard = minhash_jaccard(f_struct['minhash'], s_struct['minhash'])
+        report['structure'] = {'jaccard': jaccard, 'significant': jaccard < thresholds['structure']}
+    if len(report) == 1:
+        return 'not_available'
+    report['significant'] = any(report[k]['significant'] for k in ('text', 'structure') if k in report)
+    return report
+
+class _MerkleTree:
+    """
+    structure.dom_tree kodlamasını ("etiket hash alt_düğüm_sayısı öz_hash" satırları) tembel okur.
+    Eski snapshot'larda öz hash yoktur; düğümün dördüncü alanı o zaman None olur.
+    """
+    __slots__ = ('lines', '_nodes')
+
+    def __init__(self, tree: Dict[str, Any]):
+        self.lines = tree['nodes'].split('\n')
+        self._nodes: Dict[int, tuple] = {}
+
+    def node(self, i: int) -> tuple:
+        n = self._nodes.get(i)
+        if n is None:
+            label, digest, size, *own = self.lines[i].split(' ')
+            n = self._nodes[i] = (label, digest, int(size), own[0] if own else None)
+        return n
+
+    def children(self, i: int) -> List[int]:
+        out, j, end = [], i + 1, i + 1 + self.node(i)[2]
+        while j < end:
+            out.append(j)
+            j += 1 + self.node(j)[2]
+        return out
+
+    def child_names(self, i: int) -> Dict[int, str]:
+        """Çocukların CSS benzeri adları: tag#id, ya da aynı tag'den birden fazlaysa tag:nth-of-type(k)."""
+        kids = self.children(i)
+        tags = [self.node(j)[0].split('#', 1)[0] for j in kids]
+        totals, seen, names = Counter(tags), Counter(), {}
+        for j, tag in zip(kids, tags):
+            seen[tag] += 1
+            label = self.node(j)[0]
+            names[j] = label if '#' in label or totals[tag] == 1 else f'{tag}:nth-of-type({seen[tag]})'
+        return names
+
+def diff_asset_content(first: Dict[str, Any], second: Dict[str, Any], limit: int = DOM_DIFF_LIMIT) -> Dict[str, Any]:
+    """
+    Asset içerik özetlerini (URL -> {sha256, size, ...}) kıyaslar: aynı URL'de içeriği değişenler,
+    yalnızca ikinci/ilk snapshot'ta olanlar. Her kategori en fazla limit kayıtla sınırlanır.
+    """
+    changed, added, removed = [], [], []
+    for url in sorted(set(first) | set(second)):
+        a, b = first.get(url), second.get(url)
+        if a is None:
+            added.append(url)
+        elif b is None:
+            removed.append(url)
+        elif a.get('sha256') != b.get('sha256') or a.get('status') != b.get('status'):
+            changed.append({
+                'url': url,
+                'kind': b.get('kind'),
+                'first_sha256': a.get('sha256'),
+                'second_sha256': b.get('sha256'),
+                'size_delta': (b.get('size') or 0) - (a.get('size') or 0),
+                'status': [a.get('status'), b.get('status')] if a.get('status') != b.get('status') else b.get('status'),
+            })
+    truncated = max(len(changed), len(added), len(removed)) > limit
+    return {'changed': changed[:limit], 'added': added[:limit], 'removed': removed[:limit],
+            'counts': {'changed': len(changed), 'added': len(added), 'removed': len(removed)},
+            'truncated': truncated}
+
+def diff_dom_trees(first: Dict[str, Any], second: Dict[str, Any], limit: int = DOM_DIFF_LIMIT) -> Dict[str, Any]:
+    """
+    İki Merkle DOM ağacını kökten aşağı yürür; yalnızca hash'i farklı alt ağaçlara iner, bu yüzden
+    iş miktarı sayfanın değil değişimin büyüklüğüyle orantılıdır. Çocuklar önce hash ile (aynı ya da
+    taşınmış alt ağaçlar), sonra etiket sırasıyla eşlenir.
+      changed: kendi içeriği (metin/attribute ya da derinlik sınırının altındakiler) değişen ya da
+               çocukları yalnızca yer değiştiren elemanlar; çocukları da değişse öz hash'ten yakalanır
+      added / removed: yalnızca bir tarafta olan elemanlar (removed yolları ilk ağaca göredir)
+    """
+    a, b = _MerkleTree(first), _MerkleTree(second)
+    out = {'max_depth': [first.get('max_depth'), second.get('max_depth')],
+           'changed': [], 'added': [], 'removed': [], 'nodes_visited': 0, 'truncated': False}
+
+    def _report(kind, path):
+        if len(out[kind]) < limit:
+            out[kind].append(path)
+        else:
+            out['truncated'] = True
+
+    stack = [(0, 0, '')]
+    while stack:
+        i, j, path = stack.pop()
+        out['nodes_visited'] += 1
+        if a.node(i)[1] == b.node(j)[1]:
+            continue
+        kids_a, kids_b = a.children(i), b.children(j)
+        if not kids_a or not kids_b:
+            _report('changed', path or ':root')
+            if kids_a or kids_b:
+                names = (a if kids_a else b).child_names(i if kids_a else j)
+                for k in (kids_a or kids_b):
+                    _report('removed' if kids_a else 'added', f'{path} > {names[k]}' if path else names[k])
+            continue
+
+        # 1) aynı hash'li çocuklar: değişmemiş (ya da yer değiştirmiş) alt ağaçlar
+        by_hash = defaultdict(deque)
+        for k in kids_b:
+            by_hash[b.node(k)[1]].append(k)
+        rest_a = []
+        for k in kids_a:
+            q = by_hash.get(a.node(k)[1])
+            if q:
+                q.popleft()
+            else:
+                rest_a.append(k)
+        matched_b = {k for q in by_hash.values() for k in q}
+        rest_b = [k for k in kids_b if k in matched_b]
+        own_a, own_b = a.node(i)[3], b.node(j)[3]
+        own_changed = own_a is not None and own_b is not None and own_a != own_b
+        if own_changed:
+            _report('changed', path or ':root')
+        if not rest_a and not rest_b:
+            # tüm çocuklar eşleşti: fark elemanın kendisinde ya da çocukların sırasında
+            if not own_changed:
+                _report('changed', path or ':root')
+            continue
+
+        # 2) kalanlar etikete göre sırayla eşlenir ve içlerine inilir
+        names_a, names_b = a.child_names(i), b.child_names(j)
+        by_label = defaultdict(deque)
+        for k in rest_b:
+            by_label[b.node(k)[0]].append(k)
+        paired = set()
+        for k in rest_a:
+            q = by_label.get(a.node(k)[0])
+            if q:
+                kb = q.popleft()
+                paired.add(kb)
+                stack.append((k, kb, f'{path} > {names_b[kb]}' if path else names_b[kb]))
+            else:
+                _report('removed', f'{path} > {names_a[k]}' if path else names_a[k])
+        for k in rest_b:
+            if k not in paired:
+                _report('added', f'{path} > {names_b[k]}' if path else names_b[k])
+    return out
+
+def _merge_ranges(chunks: list) -> list:
+    """Bitişik parçaları (aralarında tek boşluk) [offset, uzunluk] aralıklarında birleştirir."""
+    ranges = []
+    for _, off, length in chunks:
+        if ranges and ranges[-1][0] + ranges[-1][1] + 1 >= off:
+            ranges[-1][1] = off + length - ranges[-1][0]
+        else:
+            ranges.append([off, length])
+    return [{'offset': off, 'length': length} for off, length in ranges]
+
+def diff_text_chunks(first: list, second: list) -> Dict[str, Any]:
+    """
+    İki snapshot'ın dom.chunks listelerini ([hash16, offset, uzunluk]) kıyaslar; tam metne gerek yoktur.
+      removed: yalnızca ilkinde olan parçalar (ilk metindeki byte aralıkları)
+      added  : yalnızca ikincide olan parçalar (ikinci metindeki byte aralıkları)
+      moved  : iki tarafta da bir kez geçen ama göreli sırası değişen parçalar
+    Eşleştirme hash sayımıyla doğrusal; taşınanlar en uzun artan alt dizi ile O(n log n) bulunur.
+    """
+    count_a, count_b = Counter(c[0] for c in first), Counter(c[0] for c in second)
+
+    def _surplus(chunks, mine, other):
+        left = {h: n - other.get(h, 0) for h, n in mine.items() if n > other.get(h, 0)}
+        out = []
+        for c in chunks:
+            if left.get(c[0], 0) > 0:
+                left[c[0]] -= 1
+                out.append(c)
+        return out
+
+    removed = _surplus(first, count_a, count_b)
+    added = _surplus(second, count_b, count_a)
+
+    # her iki tarafta da tekil olan parçalar: ikinci listedeki sıraları, birincideki sırayla
+    pos_b = {c[0]: (i, c) for i, c in enumerate(second) if count_b[c[0]] == 1 and count_a[c[0]] == 1}
+    common = [(pos_b[c[0]], c) for c in first if c[0] in pos_b]
+    tails, tails_idx, prev = [], [], [-1] * len(common)
+    for k, ((j, _), _) in enumerate(common):
+        t = bisect_left(tails, j)
+        if t == len(tails):
+            tails.append(j)
+            tails_idx.append(k)
+        else:
+            tails[t] = j
+            tails_idx[t] = k
+        prev[k] = tails_idx[t - 1] if t else -1
+    in_order = set()
+    k = tails_idx[-1] if tails_idx else -1
+    while k >= 0:
+        in_order.add(k)
+        k = prev[k]
+    moved = []
+    for k, ((_, cb), c) in enumerate(common):
+        if k in in_order:
+            continue
+        last = moved[-1] if moved else None
+        if last and last['from'] + last['length'] + 1 == c[1] and last['to'] + last['length'] + 1 == cb[1]:
+            last['length'] = c[1] + c[2] - last['from']
+            last['chunks'] += 1
+        else:
+            moved.append({'from': c[1], 'to': cb[1], 'length': c[2], 'chunks': 1})
+
+    return {
+        'first_chunks': len(first),
+        'second_chunks': len(second),
+        'unchanged': len(first) - len(removed) - sum(m['chunks'] for m in moved),
+        'removed': _merge_ranges(removed),
+        'added': _merge_ranges(added),
+        'moved': moved,
+    }
+
+def compare(first_json: str, second_json: str, out_json: Optional[str] = None,
+            cache: Optional[SnapshotCache] = None, save: bool = True,
+            visual_mode: str = DEFAULT_VISUAL_MODE, early_exit: bool = False,
+            thresholds: Optional[Dict[str, float]] = None, timer: Optional[StageTimer] = None) -> dict:
+    """
+    İki snapshot'ı kıyaslar. cache verilirse JSON'lar ve çözülmüş ekran görüntüleri
+    önbellekten okunur (servis modu); save=False ise diff dosyası yazılmaz.
+    visual_mode 'full' dışındaysa snapshot'taki 'visual_fp' (ekran görüntüsüyle eşleşiyorsa)
+    kullanılır ve PNG hiç çözülmez. thresholds: {'text': ..., 'structure': ...} benzerlik eşikleri.
+    timer verilirse load / screenshots / text / structure / visual / write aşamalarının süreleri
+    sonuçta 'timings' altında döner ('write' diff dosyasına değil yalnızca dönen sonuca girer).
+    """
     first_json = os.path.abspath(first_json)
     second_json = os.path.abspath(second_json)
     if not os.path.exists(first_json):
@@ -105,21 +654,38 @@ def compare(first_json: str, second_json: str, out_json: Optional[str] = None) -
     if not os.path.exists(second_json):
         return {'error': 'second_not_found', 'path': second_json}
 
-    first = load_json(first_json)
-    second = load_json(second_json)
+    with timed(timer, 'load'):
+        # .snap'lerde yalnızca başlık okunur; metin parçaları / DOM ağacı gerektiğinde yüklenir
+        load = cache.load_json if cache is not None else partial(load_snapshot, lazy=True)
+        first = load(first_json)
+        second = load(second_json)
     if not first or not second:
         return {'error': 'failed_to_load_json', 'first': bool(first), 'second': bool(second)}
 
-    # ensure screenshot_hex present by trying adjacent png files
-    if not first.get('screenshot_hex'):
-        fh = read_png_hex_near_json(first_json)
-        if fh:
-            first['screenshot_hex'] = fh
-    if not second.get('screenshot_hex'):
-        sh = read_png_hex_near_json(second_json)
-        if sh:
-            second['screenshot_hex'] = sh
-    
+    # ekran görüntüleri: satır içi hex, blob deposu referansı ya da yanındaki png.
+    # İki taraf byte byte aynıysa görüntüler hiç çözülmez (phash 0, SSIM 1.0); yalnızca bir tarafta
+    # görüntü varsa da çözülmez (görsel kütüphaneler hiç yüklenmez).
+    with timed(timer, 'screenshots'):
+        identical_shots = False
+        first_png = second_png = None
+        if _VIS_LIBS:
+            digest_a = screenshot_digest(first, first_json)
+            digest_b = screenshot_digest(second, second_json)
+            identical_shots = digest_a is not None and digest_a == digest_b
+
+            def _shot(snap, json_path, digest):
+                fp = snap.get('visual_fp')
+                if visual_mode != 'full' and fp and digest and fp.get('screenshot_sha256') == digest:
+                    resolve_section(snap, json_path, 'visual_fp', 'thumb_png')
+                    return DecodedScreenshot.from_fingerprint(fp)
+                if cache is not None:
+                    return cache.screenshot(json_path, snap)
+                return load_screenshot(snap, json_path)
+
+            if not identical_shots and digest_a and digest_b:
+                first_png = _shot(first, first_json, digest_a)
+                second_png = _shot(second, second_json, digest_b)
+
     http_changed = (
         first.get('http', {}).get('hash') != second.get('http', {}).get('hash')
     )
@@ -129,55 +695,109 @@ def compare(first_json: str, second_json: str, out_json: Optional[str] = None) -
         first.get('dom', {}).get('hash') != second.get('dom', {}).get('hash')
     )
 
+    with timed(timer, 'text'):
+        # Parça bazlı metin farkı: hangi byte aralıkları eklendi/silindi/taşındı (tam metin olmadan)
+        f_chunks = resolve_section(first, first_json, 'dom', 'chunks')
+        s_chunks = resolve_section(second, second_json, 'dom', 'chunks')
+        if f_chunks is not None and s_chunks is not None:
+            text_chunks = diff_text_chunks(f_chunks, s_chunks)
+            text_chunks_summary = {k: len(text_chunks[k]) for k in ('added', 'removed', 'moved')}
+        else:
+            text_chunks = 'not_available'
+            text_chunks_summary = None
+
+        # Değişimin büyüklüğü: SimHash / MinHash taslaklarından tahmini benzerlik
+        similarity = similarity_report(first, second, thresholds)
+        if isinstance(similarity, dict):
+            similarity_summary = {
+                'text_similarity': similarity.get('text', {}).get('similarity'),
+                'structure_similarity': similarity.get('structure', {}).get('jaccard'),
+                'significant_change': similarity['significant'],
+            }
+        else:
+            similarity_summary = {}
+
     # Metin uzunluğu farkı (rapor için faydalı)
     text_len_delta = (
         (second.get('dom', {}).get('text_len') or 0) - (first.get('dom', {}).get('text_len') or 0)
     )
 
-    # ------------------ Yapısal (gerçek DOM sinyalleri) ------------------
-    f_struct = first.get('structure', {}) or {}
-    s_struct = second.get('structure', {}) or {}
+    with timed(timer, 'structure'):
+        # ------------------ Yapısal (gerçek DOM sinyalleri) ------------------
+        f_struct = first.get('structure', {}) or {}
+        s_struct = second.get('structure', {}) or {}
 
-    # Tag sayımları
-    tag_counts_changed = (f_struct.get('tag_counts') != s_struct.get('tag_counts'))
+        # Nerede değişti: Merkle DOM ağaçlarında yalnızca farklı alt ağaçlara inilir
+        f_tree = resolve_section(first, first_json, 'structure', 'dom_tree')
+        s_tree = resolve_section(second, second_json, 'structure', 'dom_tree')
+        if f_tree and s_tree:
+            dom_tree = diff_dom_trees(f_tree, s_tree)
+            dom_tree_summary = {k: len(dom_tree[k]) for k in ('changed', 'added', 'removed')}
+        else:
+            dom_tree = 'not_available'
+            dom_tree_summary = None
 
-    # Assets
-    f_assets = f_struct.get('assets', {}) or {}
-    s_assets = s_struct.get('assets', {}) or {}
+        # Tag sayımları
+        tag_counts_changed = (f_struct.get('tag_counts') != s_struct.get('tag_counts'))
 
-    assets_changed = any([
-        # Liste hash'leri (duplikasyonları da yakalar)
-        f_assets.get('imgs_list_hash')     != s_assets.get('imgs_list_hash'),
-        f_assets.get('links_list_hash')    != s_assets.get('links_list_hash'),
-        f_assets.get('scripts_list_hash')  != s_assets.get('scripts_list_hash'),
+        # Assets
+        f_assets = f_struct.get('assets', {}) or {}
+        s_assets = s_struct.get('assets', {}) or {}
 
-        # Unique hash'ler (yeni/kalkan kaynaklar)
-        f_assets.get('imgs_unique_hash')   != s_assets.get('imgs_unique_hash'),
-        f_assets.get('links_unique_hash')  != s_assets.get('links_unique_hash'),
-        f_assets.get('scripts_unique_hash')!= s_assets.get('scripts_unique_hash'),
+        assets_changed = any([
+            # Liste hash'leri (duplikasyonları da yakalar)
+            f_assets.get('imgs_list_hash')     != s_assets.get('imgs_list_hash'),
+            f_assets.get('links_list_hash')    != s_assets.get('links_list_hash'),
+            f_assets.get('scripts_list_hash')  != s_assets.get('scripts_list_hash'),
 
-        # Sayılar
-        f_assets.get('img_count')          != s_assets.get('img_count'),
-        f_assets.get('link_count')         != s_assets.get('link_count'),
-        f_assets.get('script_count')       != s_assets.get('script_count'),
-    ])
+            # Unique hash'ler (yeni/kalkan kaynaklar)
+            f_assets.get('imgs_unique_hash')   != s_assets.get('imgs_unique_hash'),
+            f_assets.get('links_unique_hash')  != s_assets.get('links_unique_hash'),
+            f_assets.get('scripts_unique_hash')!= s_assets.get('scripts_unique_hash'),
 
+            # Sayılar
+            f_assets.get('img_count')          != s_assets.get('img_count'),
+            f_assets.get('link_count')         != s_assets.get('link_count'),
+            f_assets.get('script_count')       != s_assets.get('script_count'),
+        ])
 
-    # Normalize HTML hash farkı
-    html_hash_changed = (f_struct.get('html_hash') != s_struct.get('html_hash'))
 
-    # Tag sayımları farkı
-    tag_counts_changed = (f_struct.get('tag_counts') != s_struct.get('tag_counts'))
+        # Asset içerikleri (capture --assets): önce özet hash, fark varsa URL bazında
+        f_content = f_struct.get('asset_content')
+        s_content = s_struct.get('asset_content')
+        if f_content and s_content:
+            asset_content_changed = f_content.get('hash') != s_content.get('hash')
+            if asset_content_changed:
+                asset_content = diff_asset_content(
+                    resolve_section(first, first_json, 'structure', 'asset_content', 'items') or {},
+                    resolve_section(second, second_json, 'structure', 'asset_content', 'items') or {})
+            else:
+                asset_content = {'changed': [], 'added': [], 'removed': [],
+                                 'counts': {'changed': 0, 'added': 0, 'removed': 0}, 'truncated': False}
+            asset_content_summary = asset_content['counts']
+        else:
+            asset_content_changed = False
+            asset_content = 'not_available'
+            asset_content_summary = None
 
-    # "dom_changed": yapısal değişimin özeti (html/tag/assets'ten herhangi biri)
-    dom_changed = any([html_hash_changed, tag_counts_changed, assets_changed])
+        # Normalize HTML hash farkı
+        html_hash_changed = (f_struct.get('html_hash') != s_struct.get('html_hash'))
 
-    visual = None
-    if _VIS_LIBS and first.get('screenshot_hex') and second.get('screenshot_hex'):
-        try:
-            visual = visual_metrics(first['screenshot_hex'], second['screenshot_hex'])
-        except Exception as e:
-            visual = {'error': 'visual_failed', 'exception': repr(e)}
+        # Tag sayımları farkı
+        tag_counts_changed = (f_struct.get('tag_counts') != s_struct.get('tag_counts'))
+
+        # "dom_changed": yapısal değişimin özeti (html/tag/assets'ten herhangi biri)
+        dom_changed = any([html_hash_changed, tag_counts_changed, assets_changed])
+
+    with timed(timer, 'visual'):
+        visual = None
+        if identical_shots:
+            visual = _identical_visual(visual_mode)
+        elif _VIS_LIBS and first_png and second_png:
+            try:
+                visual = visual_metrics(first_png, second_png, mode=visual_mode, early_exit=early_exit)
+            except Exception as e:
+                visual = {'error': 'visual_failed', 'exception': repr(e)}
 
     # prepare output name
     fbase = os.path.splitext(os.path.basename(first_json))[0]
@@ -200,6 +820,10 @@ def compare(first_json: str, second_json: str, out_json: Optional[str] = None) -
             'changed': dom_changed,
             'text_len_delta': second['dom']['text_len'] - first['dom']['text_len'],
         },
+        'text_chunks': text_chunks,
+        'dom_tree': dom_tree,
+        'asset_content': asset_content,
+        'similarity': similarity,
         'visual': visual or ('not_available' if not _VIS_LIBS else 'not_computed'),
         'artifacts': {
             'diff_json': out_json,
@@ -210,7 +834,8 @@ def compare(first_json: str, second_json: str, out_json: Optional[str] = None) -
         }
     }
 
-    changed = any([http_changed, dom_changed, assets_changed, html_hash_changed, tag_counts_changed])
+    changed = any([http_changed, dom_changed, assets_changed, html_hash_changed, tag_counts_changed,
+                   asset_content_changed])
     #changed = http_changed or dom_changed
     if isinstance(visual, dict):
         ph = visual.get('phash_distance')
@@ -223,8 +848,15 @@ def compare(first_json: str, second_json: str, out_json: Optional[str] = None) -
             'visual_ssim': sv,
             'visual_hint': (
                 'significant' if (ph is not None and ph > 8) and (sv is not None and sv < 0.95) else 'minor_or_none'
-            )
+            ),
+            'text_chunks': text_chunks_summary,
+            'dom_tree': dom_tree_summary,
+            'asset_content_changed': asset_content_changed,
+            'asset_content': asset_content_summary,
+            **similarity_summary,
         }
+        if 'changed_regions' in visual:
+            result['summary']['visual_changed_regions'] = len(visual['changed_regions'])
     else:
         """
         result['summary'] = {
@@ -242,27 +874,139 @@ def compare(first_json: str, second_json: str, out_json: Optional[str] = None) -
             'html_hash_changed': html_hash_changed,
             'tag_counts_changed': tag_counts_changed,
             'assets_changed': assets_changed,
+            'asset_content_changed': asset_content_changed,
+            'text_chunks': text_chunks_summary,
+            'dom_tree': dom_tree_summary,
+            'asset_content': asset_content_summary,
+            **similarity_summary,
             'visual': 'skipped',
         }
-    save_json(out_json, result)
+    if timer is not None:
+        result['timings'] = timer.as_dict()
+    if save:
+        with timed(timer, 'write'):
+            save_json(out_json, result)
+        if timer is not None:
+            result['timings'] = timer.as_dict()
     return result
 
 def _json_map_by_stem(dir_path: str) -> dict[str, str]:
     """
-    Klasördeki .json dosyalarını stem -> path şeklinde eşler.
+    Klasördeki .json / .snap dosyalarını stem -> path şeklinde eşler.
     Örn: 001_example-com.json -> {'001_example-com': '/abs/path/...'}
+    Aynı stem'in iki biçimi de varsa daha yeni olan (mtime) kullanılır.
     """
     m = {}
     for name in os.listdir(dir_path):
-        if name.lower().endswith('.json'):
+        if name.lower().endswith(('.json', SNAPSHOT_EXT)):
             stem = os.path.splitext(name)[0]
-            m[stem] = os.path.join(dir_path, name)
+            path = os.path.join(dir_path, name)
+            if stem not in m or os.path.getmtime(path) > os.path.getmtime(m[stem]):
+                m[stem] = path
     return m
 
-def compare_dirs(base_dir: str, current_dir: str, out_dir: str | None = None) -> dict:
+def _reuse_diff(out_json: str, first: str, second: str) -> Optional[dict]:
+    """
+    Önceki diff dosyasını yeniden kullanır. Girdi yolları değiştiyse (ör. tarihli klasörler)
+    yalnızca yol alanları güncellenip dosya yeniden yazılır; metrikler yeniden hesaplanmaz.
+    """
+    try:
+        prev = load_json(out_json)
+    except (OSError, ValueError):
+        return None
+    if not prev or 'summary' not in prev:
+        return None
+    first, second = os.path.abspath(first), os.path.abspath(second)
+    if prev.get('first', {}).get('path') != first or prev.get('second', {}).get('path') != second:
+        prev['first']['path'] = first
+        prev['second']['path'] = second
+        prev['artifacts'].update({
+            'diff_json': out_json,
+            'first_json': first,
+            'second_json': second,
+            'first_png': os.path.splitext(first)[0] + '.png',
+            'second_png': os.path.splitext(second)[0] + '.png',
+        })
+        save_json(out_json, prev)
+    return prev
+
+def _compare_pair(stem: str, first: str, second: str, out_json: str,
+                  prior_fingerprint: Optional[str] = None,
+                  visual_mode: str = DEFAULT_VISUAL_MODE, early_exit: bool = False,
+                  thresholds: Optional[Dict[str, float]] = None, timings: bool = False) -> dict:
+    """
+    Tek bir çifti kıyaslar; process pool worker'larında çalışır (picklable olmalı).
+    Çiftin parmak izi prior_fingerprint ile aynıysa ve diff dosyası duruyorsa sonuç yeniden kullanılır.
+    """
+    entry = {'stem': stem, 'first': first, 'second': second, 'out': out_json}
+    timer = StageTimer() if timings else None
+    try:
+        # JSON'lar parmak izi için bir kez çözülür, compare() aynı nesneleri kullanır
+        cache = SnapshotCache(max_entries=4)
+        with timed(timer, 'load'):
+            first_snap, second_snap = cache.load_json(first), cache.load_json(second)
+        if first_snap and second_snap:
+            with timed(timer, 'fingerprint'):
+                entry['fingerprint'] = pair_fingerprint(first_snap, first, second_snap, second,
+                                                        visual_mode, early_exit, thresholds)
+        if prior_fingerprint and entry.get('fingerprint') == prior_fingerprint:
+            prev = _reuse_diff(out_json, first, second)
+            if prev is not None:
+                entry.update(summary=prev.get('summary'), cached=True)
+                return entry
+        diff = compare(first, second, out_json=out_json, cache=cache,
+                       visual_mode=visual_mode, early_exit=early_exit, thresholds=thresholds, timer=timer)
+        entry['summary'] = diff.get('summary')
+        if diff.get('timings'):
+            entry['timings'] = diff['timings']
+        if diff.get('error'):
+            entry['error'] = diff['error']
+            entry.pop('fingerprint', None)
+    except Exception as e:
+        entry.pop('fingerprint', None)
+        entry.update(summary=None, error='compare_failed', exception=repr(e))
+    return entry
+
+def _load_diff_cache(out_dir: str) -> Dict[str, str]:
+    """out_dir/_diff_cache.json -> {stem: fingerprint}; sürüm uyuşmazsa boş döner."""
+    try:
+        data = load_json(os.path.join(out_dir, DIFF_CACHE_FILE))
+    except (OSError, ValueError):
+        return {}
+    if not data or data.get('version') != DIFF_CACHE_VERSION:
+        return {}
+    return data.get('pairs') or {}
+
+def print_progress(done: int, total: int, entry: dict):
+    """Her çift bittiğinde stderr'e tek satırlık JSON ilerleme kaydı yazar."""
+    summary = entry.get('summary') or {}
+    print(json.dumps({'done': done, 'total': total, 'stem': entry['stem'],
+                      'changed': summary.get('changed'), 'cached': entry.get('cached', False),
+                      'error': entry.get('error')},
+                     ensure_ascii=False), file=sys.stderr, flush=True)
+
+def print_record(done: int, total: int, entry: dict):
+    """dirs --ndjson: her çift bittiğinde stdout'a tek satırlık JSON kayıt yazar."""
+    print(json.dumps(dict(entry, done=done, total=total), ensure_ascii=False), flush=True)
+
+def compare_dirs(base_dir: str, current_dir: str, out_dir: str | None = None, jobs: int = 1,
+                 progress: Optional[Callable[[int, int, dict], None]] = None,
+                 incremental: bool = True, visual_mode: str = DEFAULT_VISUAL_MODE,
+                 early_exit: bool = False, thresholds: Optional[Dict[str, float]] = None,
+                 timings: bool = False, stream_results: bool = False) -> dict:
     """
     İki klasörde aynı basename/stem'e sahip JSON'ları eşleyip toplu kıyaslar.
     Örn: 001_example-com.json ↔ 001_example-com.json
+    jobs > 1 ise çiftler bir process pool'da paralel kıyaslanır (0 = CPU sayısı).
+    progress(done, total, entry) her çift bittiğinde (bitiş sırasıyla) çağrılır;
+    _batch_summary.json yine stem sırasıyla yazılır.
+    incremental=True ise out_dir/_diff_cache.json'daki parmak izi değişmeyen çiftler
+    yeniden hesaplanmaz, önceki <stem>_diff.json kullanılır.
+    timings=True ise her çiftin aşama süreleri ve özette yüzdelik istatistikleri döner
+    (önbellekten gelen çiftler ölçülmez).
+    stream_results=True ise sonuçlar bellekte toplanmaz: her çift bittiği anda
+    out_dir/_batch_results.ndjson'a bir satır olarak eklenir; _batch_summary.json ve dönen özet
+    yalnızca sayaçları ve bu dosyanın yolunu içerir.
     """
     base_dir = os.path.abspath(base_dir)
     current_dir = os.path.abspath(current_dir)
@@ -282,27 +1026,278 @@ def compare_dirs(base_dir: str, current_dir: str, out_dir: str | None = None) ->
     missing_in_curr = sorted(set(base_map.keys()) - set(curr_map.keys()))
     missing_in_base = sorted(set(curr_map.keys()) - set(base_map.keys()))
 
-    results = []
-    for stem in common:
-        first = base_map[stem]
-        second = curr_map[stem]
-        # diff dosya adı: diffs/<stem>_diff.json
-        out_json = os.path.join(out_dir, f'{stem}_diff.json')
-        diff = compare(first, second, out_json=out_json)
-        results.append({'stem': stem, 'first': first, 'second': second, 'out': out_json, 'summary': diff.get('summary')})
+    # diff dosya adı: diffs/<stem>_diff.json
+    prior = _load_diff_cache(out_dir) if incremental else {}
+    pairs = ((stem, base_map[stem], curr_map[stem], os.path.join(out_dir, f'{stem}_diff.json'), prior.get(stem),
+              visual_mode, early_exit, thresholds, timings)
+             for stem in common)
+    total = len(common)
+    jobs = jobs if jobs > 0 else (os.cpu_count() or 1)
+
+    def _entries():
+        if jobs == 1 or total <= 1:
+            for pair in pairs:
+                yield _compare_pair(*pair)
+            return
+        # bekleyen iş sayısı sınırlı tutulur; biten future'lar hemen bırakılır
+        from concurrent.futures import ProcessPoolExecutor   # multiprocessing yalnızca jobs > 1'de yüklenir
+        with ProcessPoolExecutor(max_workers=min(jobs, total)) as ex:
+            pending = set()
+            for pair in pairs:
+                pending.add(ex.submit(_compare_pair, *pair))
+                if len(pending) >= jobs * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        yield fut.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+
+    # Parmak izi önbelleği: önceki kayıtlar korunur, bu çalıştırmadakiler güncellenir
+    fingerprints = dict(prior)
+    by_stem = {}
+    timing_list = []
+    done_count = cached_count = 0
+    results_path = os.path.join(out_dir, BATCH_RESULTS_FILE)
+    stream = open(results_path, 'w', encoding='utf-8') if stream_results else None
+    try:
+        for entry in _entries():
+            done_count += 1
+            fp = entry.pop('fingerprint', None)
+            if fp:
+                fingerprints[entry['stem']] = fp
+            else:
+                fingerprints.pop(entry['stem'], None)
+            cached_count += bool(entry.get('cached'))
+            if timings:
+                timing_list.append(entry.get('timings'))
+            if stream is not None:
+                stream.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                stream.flush()
+            else:
+                by_stem[entry['stem']] = entry
+            if progress:
+                progress(done_count, total, entry)
+    finally:
+        if stream is not None:
+            stream.close()
+    save_json(os.path.join(out_dir, DIFF_CACHE_FILE), {'version': DIFF_CACHE_VERSION, 'pairs': fingerprints})
 
     summary = {
-        'count_compared': len(common),
+        'count_compared': total,
+        'count_cached': cached_count,
         'missing_in_current': missing_in_curr,
         'missing_in_base': missing_in_base,
         'out_dir': os.path.abspath(out_dir),
-        'results': results,
     }
+    if stream_results:
+        summary['results_file'] = os.path.abspath(results_path)
+    else:
+        summary['results'] = [by_stem[stem] for stem in common]
+    if timings:
+        summary['timings'] = summarize_timings(timing_list)
     # Toplu özet de yazılsın:
     with open(os.path.join(out_dir, '_batch_summary.json'), 'w', encoding='utf-8') as f:
         json.dump(summary, f, ensure_ascii=False, indent=2)
     return summary
 
+TIMELINE_KINDS = ('http', 'text', 'dom', 'assets', 'asset_content', 'visual')
+_ASSET_HASH_KEYS = ('imgs_list_hash', 'links_list_hash', 'scripts_list_hash',
+                    'imgs_unique_hash', 'links_unique_hash', 'scripts_unique_hash')
+
+def timeline_signals(snap: Dict[str, Any], path: str) -> Dict[str, Any]:
+    """
+    Zaman çizelgesi için snapshot'ın küçük, sabit boyutlu özeti: yalnızca hash'ler ve taslaklar.
+    Bir sonraki çalıştırmanın snapshot'ı gelene kadar bellekte tutulan tek şey budur.
+    """
+    dom = snap.get('dom') or {}
+    struct = snap.get('structure') or {}
+    assets = struct.get('assets') or {}
+    digest = screenshot_digest(snap, path)
+    fp = snap.get('visual_fp') or {}
+    return {
+        'status': snap.get('status_code'),
+        'http': (snap.get('http') or {}).get('hash'),
+        'text': dom.get('hash'),
+        'simhash': dom.get('simhash'),
+        'dom': (struct.get('html_hash'), json.dumps(struct.get('tag_counts'), sort_keys=True)),
+        'minhash': struct.get('minhash'),
+        'assets': tuple(assets.get(k) for k in _ASSET_HASH_KEYS),
+        'asset_content': (struct.get('asset_content') or {}).get('hash'),
+        'visual': digest,
+        'phash': fp.get('phash') if digest and fp.get('screenshot_sha256') == digest else None,
+    }
+
+def timeline_event(prev: Dict[str, Any], cur: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """İki ardışık özet arasındaki değişim; hiçbir sinyal değişmediyse None."""
+    changed = [k for k in TIMELINE_KINDS if prev[k] != cur[k]]
+    # asset içerikleri yalnızca iki tarafta da yakalandıysa kıyaslanır (--assets sonradan açılmış olabilir)
+    if 'asset_content' in changed and (prev['asset_content'] is None or cur['asset_content'] is None):
+        changed.remove('asset_content')
+    if not changed:
+        return None
+    event: Dict[str, Any] = {'changed': changed}
+    if 'http' in changed:
+        event['status'] = [prev['status'], cur['status']]
+    if 'text' in changed:
+        event['text_similarity'] = simhash_similarity(prev['simhash'], cur['simhash'])['similarity']
+    if 'dom' in changed or 'assets' in changed:
+        event['structure_similarity'] = minhash_jaccard(prev['minhash'], cur['minhash'])
+    if 'visual' in changed and prev['phash'] and cur['phash']:
+        event['phash_distance'] = (int(prev['phash'], 16) ^ int(cur['phash'], 16)).bit_count()
+    return event
+
+def timeline_dirs(dirs: Optional[List[str]] = None, pattern: Optional[str] = None) -> List[str]:
+    """Sıralı klasör listesi ya da glob deseni (ör. 'runs/2024-*') -> var olan klasörlerin mutlak yolları."""
+    if pattern:
+        dirs = sorted(glob.glob(pattern))
+    return [os.path.abspath(d) for d in dirs or [] if os.path.isdir(d)]
+
+def timeline(dirs: List[str], out_json: Optional[str] = None,
+             progress: Optional[Callable[[int, int, dict], None]] = None) -> dict:
+    """
+    Sıralı snapshot klasörlerinden (eskiden yeniye) URL başına değişim zaman çizelgesi çıkarır.
+    Klasörler tek geçişte okunur ve her snapshot bir kez yüklenir (.snap'lerde yalnızca başlık);
+    URL başına bellekte yalnızca son snapshot'ın timeline_signals() özeti ve olay listesi tutulur.
+    Snapshot'lar dosya adıyla değil içlerindeki URL ile eşlenir; URL listesi çalıştırmalar arasında
+    değişse de zincir kopmaz. Hatalı snapshot'lar olay olarak kaydedilir ama kıyas son sağlam
+    snapshot'a karşı sürer. progress(done, total, run) her klasör bitince çağrılır.
+    """
+    if len(dirs) < 2:
+        return {'error': 'need_at_least_two_dirs', 'dirs': dirs}
+    states: Dict[str, Dict[str, Any]] = {}
+    runs = []
+    for run_index, dir_path in enumerate(dirs):
+        label = os.path.basename(dir_path.rstrip(os.sep))
+        run = {'run': label, 'dir': dir_path, 'snapshots': 0, 'changed': 0, 'errors': 0}
+        for stem, path in sorted(_json_map_by_stem(dir_path).items()):
+            try:
+                snap = load_snapshot(path, lazy=True)
+            except (OSError, ValueError):
+                snap = None
+            # başka araçların yazdığı liste / NDJSON özet dosyaları gibi snapshot olmayan JSON'lar atlanır
+            if not isinstance(snap, dict) or not snap.get('url'):
+                continue
+            run['snapshots'] += 1
+            url = snap['url']
+            state = states.get(url)
+            if state is None:
+                state = states[url] = {
+                    'url': url, 'first_run': label, 'last_run': label, 'snapshots': 0, 'gaps': 0, 'errors': 0,
+                    'changes': dict.fromkeys(TIMELINE_KINDS, 0), 'events': [],
+                    '_signals': None, '_last_index': run_index - 1,
+                }
+            state['snapshots'] += 1
+            state['gaps'] += run_index - state['_last_index'] - 1   # aradaki çalıştırmalarda yoktu
+            state['last_run'], state['_last_index'] = label, run_index
+            base = {'run': label, 'captured_at': snap.get('captured_at')}
+            if snap.get('error'):
+                state['errors'] += 1
+                run['errors'] += 1
+                state['events'].append(dict(base, error=snap['error']))
+                continue
+            signals = timeline_signals(snap, path)
+            del snap
+            if state['_signals'] is not None:
+                event = timeline_event(state['_signals'], signals)
+                if event is not None:
+                    run['changed'] += 1
+                    for kind in event['changed']:
+                        state['changes'][kind] += 1
+                    state['events'].append(dict(base, **event))
+            state['_signals'] = signals
+        runs.append(run)
+        if progress:
+            progress(run_index + 1, len(dirs), run)
+
+    urls = []
+    totals = dict.fromkeys(TIMELINE_KINDS, 0)
+    for url in sorted(states):
+        entry = {k: v for k, v in states.pop(url).items() if not k.startswith('_')}
+        entry['change_count'] = sum(1 for e in entry['events'] if 'changed' in e)
+        for kind, n in entry['changes'].items():
+            totals[kind] += n
+        urls.append(entry)
+    result = {
+        'runs': runs,
+        'count_urls': len(urls),
+        'count_urls_changed': sum(1 for e in urls if e['change_count']),
+        'changes': totals,
+        'urls': urls,
+    }
+    if out_json:
+        ensure_dir(os.path.dirname(os.path.abspath(out_json)))
+        save_json(out_json, result)
+        result['out'] = os.path.abspath(out_json)
+    return result
+
+def serve(host: str = '127.0.0.1', port: int = 8787, cache_size: int = 256):
+    """
+    compare() etrafında yerel HTTP servisi. Süreç açık kaldığı için kütüphaneler bir kez
+    yüklenir; snapshot'lar ve ekran görüntüleri LRU önbellekte tutulur.
+      POST /compare  {"first": ..., "second": ..., "out": (opsiyonel), "visual": (opsiyonel mod),
+                      "early_exit": (opsiyonel), "thresholds": (opsiyonel), "timings": (opsiyonel)}
+      GET  /stats    önbellek isabet/ıska istatistikleri
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    cache = SnapshotCache(max_entries=cache_size)
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code: int, payload: Dict[str, Any]):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._send(200, cache.stats())
+            else:
+                self._send(404, {'error': 'not_found', 'path': self.path})
+
+        def do_POST(self):
+            if self.path != '/compare':
+                self._send(404, {'error': 'not_found', 'path': self.path})
+                return
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                req = json.loads(self.rfile.read(length) or b'{}')
+                first, second = req['first'], req['second']
+            except (ValueError, KeyError, TypeError) as e:
+                self._send(400, {'error': 'bad_request', 'msg': 'Body must be JSON with "first" and "second" paths.', 'exception': repr(e)})
+                return
+            out = req.get('out')
+            visual_mode = req.get('visual', DEFAULT_VISUAL_MODE)
+            if visual_mode not in VISUAL_MODES:
+                self._send(400, {'error': 'bad_request', 'msg': f'"visual" must be one of {list(VISUAL_MODES)}.'})
+                return
+            try:
+                res = compare(first, second, out_json=out, cache=cache, save=bool(out),
+                              visual_mode=visual_mode, early_exit=bool(req.get('early_exit')),
+                              thresholds=req.get('thresholds'),
+                              timer=StageTimer() if req.get('timings') else None)
+            except Exception as e:
+                self._send(500, {'error': 'compare_failed', 'exception': repr(e)})
+                return
+            self._send(200, res)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    print(json.dumps({'message': 'serving', 'host': host, 'port': httpd.server_address[1], 'cache_size': cache_size}), file=sys.stderr, flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
 def main():
 
     ap = argparse.ArgumentParser(description='Compare snapshots')
@@ -313,21 +1308,107 @@ def main():
     p_pair.add_argument('--first','-f', required=True)
     p_pair.add_argument('--second','-s', required=True)
     p_pair.add_argument('--out','-o')
+    p_pair.add_argument('--visual', choices=VISUAL_MODES, default=DEFAULT_VISUAL_MODE,
+                        help='SSIM mode: full-resolution, downscaled thumbnail, or tiled on the thumbnail (default: full)')
+    p_pair.add_argument('--early-exit', action='store_true', help='Tiled mode: stop at the first changed tile')
+    p_pair.add_argument('--text-threshold', type=float, default=DEFAULT_SIMILARITY_THRESHOLDS['text'],
+                        help='SimHash text similarity below this is a significant change (default: %(default)s)')
+    p_pair.add_argument('--structure-threshold', type=float, default=DEFAULT_SIMILARITY_THRESHOLDS['structure'],
+                        help='MinHash tag/asset Jaccard below this is a significant change (default: %(default)s)')
+    p_pair.add_argument('--timings', action='store_true', help='Report per-stage wall/CPU times (load, screenshots, text, structure, visual, write)')
 
     # Klasör ↔ klasör (toplu)
     p_dirs = sub.add_parser('dirs', help='Compare all matching JSONs in two dirs')
     p_dirs.add_argument('--base-dir', required=True)
     p_dirs.add_argument('--current-dir', required=True)
     p_dirs.add_argument('--out-dir', default='diffs')
+    p_dirs.add_argument('--jobs', '-j', type=int, default=1, help='Parallel compare processes (0 = CPU count, default: 1)')
+    p_dirs.add_argument('--force', action='store_true', help='Ignore the diff cache and recompare every pair')
+    p_dirs.add_argument('--visual', choices=VISUAL_MODES, default=DEFAULT_VISUAL_MODE,
+                        help='SSIM mode: full-resolution, downscaled thumbnail, or tiled on the thumbnail (default: full)')
+    p_dirs.add_argument('--early-exit', action='store_true', help='Tiled mode: stop at the first changed tile')
+    p_dirs.add_argument('--text-threshold', type=float, default=DEFAULT_SIMILARITY_THRESHOLDS['text'],
+                        help='SimHash text similarity below this is a significant change (default: %(default)s)')
+    p_dirs.add_argument('--structure-threshold', type=float, default=DEFAULT_SIMILARITY_THRESHOLDS['structure'],
+                        help='MinHash tag/asset Jaccard below this is a significant change (default: %(default)s)')
+    p_dirs.add_argument('--timings', action='store_true', help='Report per-stage wall/CPU times (load, screenshots, text, structure, visual, write)')
+    p_dirs.add_argument('--ndjson', action='store_true',
+                        help='Stream one compact JSON line per pair as it completes, then a summary line; '
+                             'results are appended to _batch_results.ndjson instead of being held in memory')
+
+    # Çok çalıştırmalı zaman çizelgesi
+    p_tl = sub.add_parser('timeline', help='Per-URL change timeline across an ordered series of snapshot dirs')
+    tgrp = p_tl.add_mutually_exclusive_group(required=True)
+    tgrp.add_argument('--dirs', nargs='+', help='Snapshot directories, oldest first')
+    tgrp.add_argument('--glob', help='Glob matching snapshot directories; sorted by name (e.g. "runs/2024-*")')
+    p_tl.add_argument('--out', '-o', default=os.path.join(DIFFS_DIR, 'timeline.json'),
+                      help='Timeline JSON path (default: %(default)s)')
+
+    # Kalıcı servis (önbellekli)
+    p_serve = sub.add_parser('serve', help='Run a local HTTP compare service with an in-memory LRU cache')
+    p_serve.add_argument('--host', default='127.0.0.1')
+    p_serve.add_argument('--port', type=int, default=8787)
+    p_serve.add_argument('--cache-size', type=int, default=256, help='Max cached snapshots/screenshots (default: 256)')
+
+    # SQLite geçmişi üzerinde indeksli değişim sorguları
+    p_hist = sub.add_parser('history', help='Query the SQLite snapshot history for changes')
+    p_hist.add_argument('--db', required=True, help='History DB written by capture_snapshot.py --history')
+    hgrp = p_hist.add_mutually_exclusive_group(required=True)
+    hgrp.add_argument('--runs', nargs=2, metavar=('RUN_A', 'RUN_B'), help='Changes between two capture runs')
+    hgrp.add_argument('--since', help='Changes since this ISO-8601 UTC time (e.g. 2024-05-01)')
+    hgrp.add_argument('--list-runs', action='store_true', help='List recorded runs')
+    hgrp.add_argument('--url', help='Full recorded history of one URL')
+    p_hist.add_argument('--until', help='Upper bound (ISO-8601 UTC) for --since/--url; a date-only bound includes that whole day')
 
     args = ap.parse_args()
 
-    if args.cmd == 'pair':
-        res = compare(args.first, args.second, args.out)
+    if args.cmd == 'history':
+        if not os.path.exists(args.db):
+            print(json.dumps({'error': 'db_not_found', 'path': os.path.abspath(args.db)}, ensure_ascii=False, indent=2))
+            sys.exit(2)
+        try:
+            time_bound(args.since)
+            time_bound(args.until)
+        except ValueError as e:
+            print(json.dumps({'error': 'invalid_time', 'msg': str(e)}, ensure_ascii=False, indent=2))
+            sys.exit(2)
+        store = HistoryStore(args.db)
+        if args.runs:
+            res = store.changes_between_runs(*args.runs)
+        elif args.since:
+            res = store.changes_in_range(args.since, args.until)
+        elif args.url:
+            res = {'url': args.url, 'history': store.url_history(args.url, until=args.until)}
+        else:
+            res = {'runs': store.runs()}
+        store.close()
         print(json.dumps(res, ensure_ascii=False, indent=2))
-    elif args.cmd == 'dirs':
-        res = compare_dirs(args.base_dir, args.current_dir, args.out_dir)
+    elif args.cmd == 'timeline':
+        dirs = timeline_dirs(args.dirs, args.glob)
+        res = timeline(dirs, args.out, progress=lambda done, total, run: print(
+            json.dumps(dict(run, done=done, total=total), ensure_ascii=False), file=sys.stderr, flush=True))
+        if 'error' in res:
+            print(json.dumps(res, ensure_ascii=False, indent=2))
+            sys.exit(2)
+        res.pop('urls')
         print(json.dumps(res, ensure_ascii=False, indent=2))
+    elif args.cmd == 'serve':
+        serve(args.host, args.port, args.cache_size)
+    elif args.cmd == 'pair':
+        res = compare(args.first, args.second, args.out, visual_mode=args.visual, early_exit=args.early_exit,
+                      thresholds={'text': args.text_threshold, 'structure': args.structure_threshold},
+                      timer=StageTimer() if args.timings else None)
+        print(json.dumps(res, ensure_ascii=False, indent=2))
+    elif args.cmd == 'dirs':
+        res = compare_dirs(args.base_dir, args.current_dir, args.out_dir, jobs=args.jobs,
+                           progress=print_record if args.ndjson else print_progress,
+                           incremental=not args.force, visual_mode=args.visual, early_exit=args.early_exit,
+                           thresholds={'text': args.text_threshold, 'structure': args.structure_threshold},
+                           timings=args.timings, stream_results=args.ndjson)
+        if args.ndjson:
+            print(json.dumps(res, ensure_ascii=False), flush=True)
+        else:
+            print(json.dumps(res, ensure_ascii=False, indent=2))
 
 if __name__ == '__main__':
     main()
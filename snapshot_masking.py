@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+#\"\"\"snapshot_masking.py
+
+#Her yakalamada değişen (uçucu) içeriği hash'lemeden önce maskeleyen site bazlı kurallar.
+# - Kural dosyası (JSON): site -> seçiciler, attribute desenleri, metin regex'leri, URL kuralları
+# - MaskRules: dosyayı okur, her host için kuralları bir kez derleyip önbellekte tutar
+# - CompiledMask: _SignalExtractor'ın tek geçişte çağırdığı birleşik eşleştirici
+#
+#Örnek kural dosyası:
+#{
+#  "*":           {"query_params": ["v", "ver", "_", "cb"]},
+#  "example.com": {"selectors": ["div.ad-slot", "#csrf", "[data-ad-unit]"],
+#                  "attributes": [{"name": "nonce"}, {"tag": "meta", "name": "content", "pattern": "^[A-Za-z0-9+/=_-]{32,}$"}],
+#                  "text": ["\\d{1,2}:\\d{2}(:\\d{2})?"],
+#                  "urls": ["/build/[0-9a-f]{8,}/"]}
+#}
+#\"\"\"
+
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+MASK_TOKEN = '*'                      # maskelenen metin / attribute değerinin yerine yazılır
+_URL_ATTRS = frozenset(['src', 'href'])
+_RULE_KEYS = frozenset(['selectors', 'attributes', 'text', 'urls', 'query_params'])
+_STRING_LIST_KEYS = ('selectors', 'text', 'urls', 'query_params')
+_NO_CLASSES = frozenset()
+_DANGLING_QUERY_RE = re.compile(r'[?&]+(?=#|$)')   # parametre atıldıktan sonra kalan boş '?' / sondaki '&'
+
+# Desteklenen seçiciler: tag, #id, .class, [attr], [attr=v], [attr^=v], [attr$=v], [attr*=v] ve bunların
+# birleşimleri (div.ad#top[data-x]); virgülle ayrılmış listeler. Torun/çocuk birleştiricileri yoktur.
+_SELECTOR_RE = re.compile(r'^([a-zA-Z][\w-]*|\*)?((?:[#.][\w-]+|\[[^\]]+\])*)$')
+_SELECTOR_PART_RE = re.compile(r'([#.])([\w-]+)|\[\s*([\w:-]+)\s*(?:([\^$*]?=)\s*["\']?(.*?)["\']?\s*)?\]')
+_ATTR_OPS = {
+    '=': lambda value, arg: value == arg,
+    '^=': lambda value, arg: value.startswith(arg),
+    '$=': lambda value, arg: value.endswith(arg),
+    '*=': lambda value, arg: arg in value,
+}
+
+
+class _Selector:
+    __slots__ = ('text', 'tag', 'id', 'classes', 'attrs')
+
+    def __init__(self, text: str):
+        m = _SELECTOR_RE.match(text)
+        if not m or not text:
+            raise ValueError(f'unsupported selector: {text!r}')
+        self.text = text
+        self.tag = (m.group(1) or '*').lower()
+        self.id: Optional[str] = None
+        self.classes: frozenset = frozenset()
+        attrs = []
+        classes = []
+        for sym, name, attr, op, arg in _SELECTOR_PART_RE.findall(m.group(2)):
+            if sym == '#':
+                self.id = name
+            elif sym == '.':
+                classes.append(name)
+            else:
+                attrs.append((attr.lower(), _ATTR_OPS[op] if op else None, arg))
+        self.classes = frozenset(classes)
+        self.attrs = tuple(attrs)
+
+    def matches(self, name: str, attrs: Dict[str, str], classes: frozenset) -> bool:
+        if self.tag != '*' and self.tag != name:
+            return False
+        if self.id is not None and attrs.get('id') != self.id:
+            return False
+        if self.classes and not self.classes <= classes:
+            return False
+        for attr, test, arg in self.attrs:
+            value = attrs.get(attr)
+            if value is None or (test is not None and not test(value, arg)):
+                return False
+        return True
+
+
+def _class_set(attrs: Dict[str, str]) -> frozenset:
+    cls = attrs.get('class')
+    return frozenset(cls.split()) if cls else _NO_CLASSES
+
+
+def _combined(patterns: List[str]) -> Optional['re.Pattern']:
+    """Regex listesini tek bir alternasyona derler; tek subn() çağrısı hepsini uygular."""
+    if not patterns:
+        return None
+    return re.compile('|'.join('(?:%s)' % p for p in patterns))
+
+
+class CompiledMask:
+    """
+    Bir sitenin kurallarının derlenmiş hali. Seçiciler id / class / tag üzerinden indekslenir; her
+    açılış tag'inde yalnızca aday seçiciler denenir. Metin ve URL regex'leri birer birleşik desene,
+    attribute kuralları ad -> (tag, değer deseni) tablosuna derlenir. Nesne thread'ler arasında
+    paylaşılır; sayaçları çağıran (sayfa başına) tutar.
+    """
+
+    def __init__(self, rules: Dict[str, Any]):
+        self._by_id: Dict[str, List[_Selector]] = {}
+        self._by_class: Dict[str, List[_Selector]] = {}
+        self._by_tag: Dict[str, List[_Selector]] = {}
+        self._by_attr: List[_Selector] = []
+        for group in rules.get('selectors') or []:
+            for text in group.split(','):
+                sel = _Selector(text.strip())
+                if sel.id is not None:
+                    self._by_id.setdefault(sel.id, []).append(sel)
+                elif sel.classes:
+                    self._by_class.setdefault(min(sel.classes), []).append(sel)
+                elif sel.tag != '*':
+                    self._by_tag.setdefault(sel.tag, []).append(sel)
+                else:
+                    self._by_attr.append(sel)
+        self._attr_exact: Dict[str, List[tuple]] = {}
+        self._attr_glob: List[tuple] = []
+        for rule in rules.get('attributes') or []:
+            entry = ((rule.get('tag') or '').lower() or None,
+                     re.compile(rule['pattern']) if rule.get('pattern') else None)
+            name = rule['name'].lower()
+            if any(ch in name for ch in '*?['):
+                self._attr_glob.append((re.compile(fnmatch.translate(name)), entry))
+            else:
+                self._attr_exact.setdefault(name, []).append(entry)
+        self._text_re = _combined(rules.get('text') or [])
+        self._url_re = _combined(rules.get('urls') or [])
+        # sorgu parametreleri de tek regex'e derlenir: ?v=1&x=2 -> ?x=2 (urlsplit/parse_qsl'den çok daha ucuz)
+        params = rules.get('query_params') or []
+        self._query_re = re.compile(r'(?<=[?&])(?:%s)(?:=[^&#]*)?(?:&|(?=#)|$)' % '|'.join(map(re.escape, params))) \
+            if params else None
+        # glob'lu attribute kuralı yoksa ilgisiz tag'ler tek bir küme kontrolüyle geçilir
+        self._attr_names = None if self._attr_glob else \
+            frozenset(self._attr_exact) | (_URL_ATTRS if (self._url_re or self._query_re) else frozenset())
+        self.has_elements = bool(self._by_id or self._by_class or self._by_tag or self._by_attr)
+        self.has_attrs = bool(self._attr_exact or self._attr_glob or self._url_re or self._query_re)
+        self.has_text = self._text_re is not None
+
+    def match_element(self, name: str, attrs: Dict[str, str]) -> bool:
+        """Eleman bir seçiciyle eşleşiyorsa True (alt ağacıyla birlikte hash'lerden çıkarılır)."""
+        if not self.has_elements:
+            return False
+        for sel in self._by_tag.get(name, ()):
+            if sel.matches(name, attrs, _class_set(attrs)):
+                return True
+        if self._by_id and attrs.get('id') in self._by_id:
+            if any(sel.matches(name, attrs, _class_set(attrs)) for sel in self._by_id[attrs['id']]):
+                return True
+        if self._by_class and attrs.get('class'):
+            for c in attrs['class'].split():
+                sels = self._by_class.get(c)
+                if sels and any(sel.matches(name, attrs, _class_set(attrs)) for sel in sels):
+                    return True
+        return any(sel.matches(name, attrs, _class_set(attrs)) for sel in self._by_attr)
+
+    def mask_url(self, url: str) -> Tuple[str, bool]:
+        """Cache-busting sorgu parametrelerini atar ve URL regex'lerini maskeler; (url, değişti mi)."""
+        out = url
+        if self._query_re is not None and '?' in out:
+            out = self._query_re.sub('', out)
+            if out != url:
+                out = _DANGLING_QUERY_RE.sub('', out)
+        if self._url_re is not None:
+            out = self._url_re.sub(MASK_TOKEN, out)
+        return out, out != url
+
+    def mask_attrs(self, name: str, attrs: Dict[str, str]) -> Tuple[Dict[str, str], int, int]:
+        """
+        Uçucu attribute değerlerini MASK_TOKEN ile, src/href'leri mask_url ile değiştirir.
+        Değişiklik varsa kopya dict döner (orijinali asset indirmede kullanılır); (attrs, attr, url) sayıları.
+        """
+        if not self.has_attrs or not attrs or (self._attr_names is not None and self._attr_names.isdisjoint(attrs)):
+            return attrs, 0, 0
+        out = None
+        n_attrs = n_urls = 0
+        for key, value in attrs.items():
+            entries = self._attr_exact.get(key)
+            if self._attr_glob:
+                entries = list(entries or ()) + [e for rx, e in self._attr_glob if rx.match(key)]
+            if entries and any((tag is None or tag == name) and (pattern is None or pattern.search(value))
+                               for tag, pattern in entries):
+                if value != MASK_TOKEN:
+                    out = out or dict(attrs)
+                    out[key] = MASK_TOKEN
+                    n_attrs += 1
+            elif key in _URL_ATTRS and value:
+                url, changed = self.mask_url(value)
+                if changed:
+                    out = out or dict(attrs)
+                    out[key] = url
+                    n_urls += 1
+        return (out if out is not None else attrs), n_attrs, n_urls
+
+    def mask_text(self, text: str) -> Tuple[str, int]:
+        if self._text_re is None:
+            return text, 0
+        return self._text_re.subn(MASK_TOKEN, text)
+
+
+def _validate_site(site: str, rules: Any):
+    """Bir site bölümünün anahtarlarını ve değer tiplerini doğrular (tek string listeye genişletilmez)."""
+    if not isinstance(rules, dict):
+        raise ValueError(f'{site}: rules must be an object')
+    unknown = set(rules) - _RULE_KEYS
+    if unknown:
+        raise ValueError(f'{site}: unknown rule keys {sorted(unknown)}')
+    for key in _STRING_LIST_KEYS:
+        value = rules.get(key)
+        if value is not None and not (isinstance(value, list) and all(isinstance(v, str) for v in value)):
+            raise ValueError(f'{site}: {key} must be a list of strings')
+    attributes = rules.get('attributes')
+    if attributes is None:
+        return
+    if not isinstance(attributes, list):
+        raise ValueError(f'{site}: attributes must be a list of objects')
+    for i, rule in enumerate(attributes):
+        if not isinstance(rule, dict) or not isinstance(rule.get('name'), str) or not rule['name']:
+            raise ValueError(f'{site}: attributes[{i}] must be an object with a string "name"')
+        for opt in ('tag', 'pattern'):
+            if rule.get(opt) is not None and not isinstance(rule[opt], str):
+                raise ValueError(f'{site}: attributes[{i}].{opt} must be a string')
+
+
+class MaskRules:
+    """
+    Kural dosyasını yükler ve doğrular. Site anahtarı bir host'tur ('example.com' alt alan adlarını da
+    kapsar) ya da tüm sitelere uygulanan '*'. Bir URL için eşleşen tüm bölümler (genelden özele)
+    birleştirilip o host için bir kez derlenir. Dosyadaki hata ValueError olarak yükleme anında çıkar.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        self.digest = hashlib.sha256(raw).hexdigest()[:16]
+        try:
+            sites = json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f'invalid JSON: {e}') from None
+        if not isinstance(sites, dict):
+            raise ValueError('rule file must be an object of site -> rules')
+        for site, rules in sites.items():
+            _validate_site(site, rules)
+        self._sites = {site.lower(): rules for site, rules in sites.items()}
+        self._lock = threading.Lock()
+        self._compiled: Dict[str, Tuple[CompiledMask, List[str]]] = {}
+        for site in self._sites:
+            # tüm seçici / regex hataları ilk sayfada değil burada görünsün
+            self._compile([site])
+
+    def _sites_for(self, host: str) -> List[str]:
+        matched = [s for s in self._sites if s != '*' and (host == s or host.endswith('.' + s))]
+        return (['*'] if '*' in self._sites else []) + sorted(matched, key=len)
+
+    def _compile(self, sites: List[str]) -> CompiledMask:
+        merged: Dict[str, list] = {}
+        for site in sites:
+            for key, value in self._sites[site].items():
+                merged.setdefault(key, []).extend(value)
+        try:
+            return CompiledMask(merged)
+        except (re.error, KeyError, TypeError, AttributeError, ValueError) as e:
+            raise ValueError(f'{", ".join(sites)}: {e}') from None
+
+    def for_url(self, url: str) -> Tuple[Optional[CompiledMask], List[str]]:
+        """URL'nin host'u için derlenmiş maske ve eşleşen site anahtarları; kural yoksa (None, [])."""
+        host = (urlsplit(url).hostname or '').lower()
+        with self._lock:
+            hit = self._compiled.get(host)
+        if hit is None:
+            sites = self._sites_for(host)
+            hit = (self._compile(sites) if sites else None, sites)
+            with self._lock:
+                self._compiled[host] = hit
+        return hit
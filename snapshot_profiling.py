@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+#\"\"\"snapshot_profiling.py
+
+#Yakalama ve karşılaştırma aşamaları için opsiyonel ölçüm araçları.
+# - StageTimer: aşama başına duvar saati + thread CPU süresi (snapshot meta.timings / diff timings)
+# - summarize_timings: toplu çalıştırmada aşama bazında yüzdelik istatistikler
+# - SlowestProfiles: cProfile + tracemalloc ile en yavaş N işin profilini diske döker
+#\"\"\"
+
+import heapq
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterable, List, Optional
+
+# cProfile / pstats / tracemalloc yalnızca SlowestProfiles içinde yüklenir; StageTimer'ı kullanan
+# CLI'ların açılış süresine eklenmezler.
+PROFILE_STATS_LINES = 40     # .txt özetinde gösterilen en pahalı fonksiyon sayısı
+TRACEMALLOC_TOP_LINES = 25   # .txt özetinde gösterilen en çok bellek ayıran satır sayısı
+TRACEMALLOC_FRAMES = 8
+
+
+class StageTimer:
+    """
+    Adlandırılmış aşamaların duvar saati (perf_counter) ve CPU süresini (thread_time) toplar.
+    thread_time kullanıldığı için paralel worker'larda her iş yalnızca kendi CPU'sunu görür.
+    Aynı aşama birden çok kez ölçülürse süreler toplanır.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        wall0, cpu0 = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall0, time.thread_time() - cpu0)
+
+    def add(self, name: str, wall: float, cpu: float = 0.0):
+        st = self.stages.setdefault(name, {'wall_ms': 0.0, 'cpu_ms': 0.0})
+        st['wall_ms'] += wall * 1000
+        st['cpu_ms'] += cpu * 1000
+
+    def count(self, name: str, value: int):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self) -> Dict[str, Any]:
+        stages = {name: {k: round(v, 3) for k, v in st.items()} for name, st in self.stages.items()}
+        return dict({
+            'stages': stages,
+            'total_wall_ms': round(sum(st['wall_ms'] for st in self.stages.values()), 3),
+            'total_cpu_ms': round(sum(st['cpu_ms'] for st in self.stages.values()), 3),
+        }, **self.counters)
+
+
+def timed(timer: Optional[StageTimer], name: str):
+    """timer None ise hiçbir şey yapmayan bağlam; çağıran kodda if'leri önler."""
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """En yakın sıra yöntemiyle yüzdelik (q: 0..1); boş listede None."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _stats(values: List[float]) -> Dict[str, float]:
+    return {
+        'p50': round(percentile(values, 0.5), 3),
+        'p90': round(percentile(values, 0.9), 3),
+        'p99': round(percentile(values, 0.99), 3),
+        'max': round(max(values), 3),
+        'total': round(sum(values), 3),
+    }
+
+
+def summarize_timings(timings: Iterable[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """StageTimer.as_dict() çıktılarını aşama bazında p50/p90/p99/max/toplam istatistiklere indirger."""
+    timings = [t for t in timings if t]
+    per_stage: Dict[str, Dict[str, List[float]]] = {}
+    counters: Dict[str, List[float]] = {}
+    for t in timings:
+        for name, st in t.get('stages', {}).items():
+            bucket = per_stage.setdefault(name, {'wall_ms': [], 'cpu_ms': []})
+            bucket['wall_ms'].append(st['wall_ms'])
+            bucket['cpu_ms'].append(st['cpu_ms'])
+        for key, value in t.items():
+            if key not in ('stages', 'total_wall_ms', 'total_cpu_ms') and isinstance(value, (int, float)):
+                counters.setdefault(key, []).append(value)
+    return dict({
+        'count': len(timings),
+        'total_wall_ms': _stats([t['total_wall_ms'] for t in timings]) if timings else None,
+        'total_cpu_ms': _stats([t['total_cpu_ms'] for t in timings]) if timings else None,
+        'stages': {name: {k: _stats(v) for k, v in bucket.items()} for name, bucket in per_stage.items()},
+    }, **{key: _stats(values) for key, values in counters.items()})
+
+
+class SlowestProfiles:
+    """
+    Her işi cProfile (ve memory=True ise tracemalloc) altında çalıştırır, yalnızca en yavaş
+    top tanesinin profilini bellekte tutar; dump() bunları out_dir'e .prof + .txt olarak yazar.
+    cProfile thread başınadır; paralel worker'lar profilli işleri aynı anda yürütür. tracemalloc ise
+    process geneli: ilk profilli iş başlatır, son biten durdurur; paralel işlerde bellek raporu (tepe
+    ve en çok ayıran satırlar) aynı anda çalışan diğer işlerin ayırdıklarını da içerir.
+    Python 3.12+'da cProfile process genelinde tek bir izleme aracı kullandığından orada işler sırayla profillenir.
+    """
+
+    def __init__(self, out_dir: str, top: int = 5, memory: bool = True):
+        self.out_dir = os.path.abspath(out_dir)
+        self.top = max(1, top)
+        self.memory = memory
+        self._lock = threading.Lock()          # yalnızca tracemalloc çağrıları ve heap güncellemesi
+        self._serial = threading.Lock() if sys.version_info >= (3, 12) else None
+        self._tracing = 0                      # tracemalloc'u kullanan (süren) profilli iş sayısı
+        self._heap: List[tuple] = []   # (wall, sıra, key, Profile, bellek özeti) — en hızlısı tepede
+        self._seq = 0
+
+    @contextmanager
+    def profile(self, key: str):
+        import cProfile
+        import tracemalloc
+        with self._serial if self._serial is not None else nullcontext():
+            if self.memory:
+                with self._lock:
+                    if not self._tracing:
+                        tracemalloc.start(TRACEMALLOC_FRAMES)
+                    self._tracing += 1
+            prof = cProfile.Profile()
+            wall0 = time.perf_counter()
+            prof.enable()
+            try:
+                yield
+            finally:
+                prof.disable()
+                wall = time.perf_counter() - wall0
+                memory = None
+                with self._lock:
+                    if self.memory:
+                        peak = tracemalloc.get_traced_memory()[1]
+                        top_stats = tracemalloc.take_snapshot().statistics('lineno')[:TRACEMALLOC_TOP_LINES]
+                        self._tracing -= 1
+                        if not self._tracing:
+                            tracemalloc.stop()
+                        memory = {'peak_bytes': peak, 'top': [str(s) for s in top_stats]}
+                    self._seq += 1
+                    item = (wall, self._seq, key, prof, memory)
+                    if len(self._heap) < self.top:
+                        heapq.heappush(self._heap, item)
+                    elif wall > self._heap[0][0]:
+                        heapq.heapreplace(self._heap, item)
+
+    def dump(self) -> List[Dict[str, Any]]:
+        """En yavaştan hızlıya NN_<key>.prof (pstats/snakeviz) ve NN_<key>.txt yazar; özet listesi döner."""
+        import io
+        import pstats
+        os.makedirs(self.out_dir, exist_ok=True)
+        out = []
+        for rank, (wall, _, key, prof, memory) in enumerate(sorted(self._heap, key=lambda x: -x[0]), start=1):
+            base = os.path.join(self.out_dir, f'{rank:02d}_{re.sub(r"[^a-zA-Z0-9]+", "-", key).strip("-")[:100]}')
+            prof.dump_stats(base + '.prof')
+            buf = io.StringIO()
+            buf.write(f'{key}\nwall: {wall * 1000:.1f} ms\n\n')
+            pstats.Stats(prof, stream=buf).sort_stats('cumulative').print_stats(PROFILE_STATS_LINES)
+            if memory:
+                buf.write(f'\ntracemalloc peak: {memory["peak_bytes"]} bytes\n')
+                buf.write('\n'.join(memory['top']) + '\n')
+            with open(base + '.txt', 'w', encoding='utf-8') as f:
+                f.write(buf.getvalue())
+            out.append({'key': key, 'wall_ms': round(wall * 1000, 3), 'profile': base + '.prof', 'report': base + '.txt',
+                        'tracemalloc_peak_bytes': memory['peak_bytes'] if memory else None})
+        return out
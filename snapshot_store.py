@@ -0,0 +1,806 @@
+#!/usr/bin/env python3
+#\"\"\"snapshot_store.py
+
+#Snapshot'ların büyük alanları (ham HTML, ekran görüntüsü) için içerik adresli blob deposu.
+#Her blob sha256(içerik) anahtarıyla sıkıştırılmış olarak bir kez yazılır; snapshot JSON'u
+#yalnızca referans tutar. Aynı HTML'e sahip sayfalar (farklı çalıştırma/URL) otomatik tekilleşir.
+
+#Dizin yapısı: <root>/ab/cd/abcd...<sha256>.zst  (zstandard yoksa .gz)
+
+#Ayrıca opsiyonel SQLite geçmiş deposu (HistoryStore): (url, captured_at) başına sinyal hash'leri.
+#JobQueue: birden çok worker'ın (farklı makineler dahil) süreli kiralarla paylaştığı SQLite yakalama kuyruğu.
+
+#İkili snapshot biçimi (.snap): küçük bir JSON başlık (tüm sinyal alanları) + uzunluğu bilinen,
+#opsiyonel sıkıştırılmış bölümler (ham HTML, ekran görüntüsü, metin parçaları, DOM ağacı, asset listeleri).
+#Kıyas yalnızca başlığı okur; ağır bölümler ihtiyaç olduğunda seek ile yüklenir.
+#\"\"\"
+
+import gzip
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# zstd opsiyonel; yoksa gzip kullanılır
+_ZSTD = False
+try:
+    import zstandard
+    _ZSTD = True
+except Exception:
+    _ZSTD = False
+
+BLOB_REF_KEYS = ('html_blob', 'screenshot_blob')
+_EXTENSIONS = {'zstd': '.zst', 'gzip': '.gz'}
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        if not _ZSTD:
+            raise RuntimeError('zstandard is required to read zstd blobs')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class BlobStore:
+    """
+    sha256 -> sıkıştırılmış blob deposu.
+    put() aynı içeriği ikinci kez yazmaz; yazma geçici dosya + os.replace ile atomiktir,
+    bu yüzden paralel yakalama worker'ları aynı depoyu güvenle paylaşabilir.
+    """
+    def __init__(self, root: str, codec: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        self.codec = codec or ('zstd' if _ZSTD else 'gzip')
+        if self.codec not in _EXTENSIONS:
+            raise ValueError(f'unknown codec: {self.codec}')
+
+    def _path(self, digest: str, codec: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest + _EXTENSIONS[codec])
+
+    def put(self, data: bytes) -> Dict[str, Any]:
+        digest = hashlib.sha256(data).hexdigest()
+        for codec in _EXTENSIONS:
+            if os.path.exists(self._path(digest, codec)):
+                return {'sha256': digest, 'size': len(data), 'codec': codec}
+
+        path = self._path(digest, self.codec)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_compress(data, self.codec))
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return {'sha256': digest, 'size': len(data), 'codec': self.codec}
+
+    def get(self, ref: Dict[str, Any]) -> bytes:
+        with open(self._path(ref['sha256'], ref.get('codec', 'gzip')), 'rb') as f:
+            return _decompress(f.read(), ref.get('codec', 'gzip'))
+
+    def link(self, ref: Dict[str, Any], json_path: str) -> Dict[str, Any]:
+        """Referansa, snapshot JSON'unun klasörüne göre göreli depo yolunu ekler."""
+        json_dir = os.path.dirname(os.path.abspath(json_path))
+        return dict(ref, store=os.path.relpath(self.root, json_dir))
+
+
+def ref_store_dir(ref: Dict[str, Any], json_path: str) -> str:
+    store = ref.get('store') or '.'
+    if os.path.isabs(store):
+        return store
+    return os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(json_path)), store))
+
+
+def read_ref(ref: Optional[Dict[str, Any]], json_path: str) -> Optional[bytes]:
+    """Snapshot içindeki bir blob referansını okur; bulunamazsa None."""
+    if not ref or not ref.get('sha256'):
+        return None
+    try:
+        return BlobStore(ref_store_dir(ref, json_path), codec=ref.get('codec')).get(ref)
+    except (OSError, ValueError, RuntimeError):
+        return None
+
+
+def absolutize_refs(snap: Dict[str, Any], json_path: str) -> Dict[str, Any]:
+    """Referanslardaki göreli depo yollarını mutlak yapar (snapshot başka klasöre yazılacaksa)."""
+    for key in BLOB_REF_KEYS:
+        ref = snap.get(key)
+        if isinstance(ref, dict) and ref.get('sha256'):
+            snap[key] = dict(ref, store=ref_store_dir(ref, json_path))
+    return snap
+
+
+def relink_refs(snap: Dict[str, Any], json_path: str) -> Dict[str, Any]:
+    """Mutlak depo yollarını json_path'in klasörüne göre göreli hale getirir."""
+    json_dir = os.path.dirname(os.path.abspath(json_path))
+    for key in BLOB_REF_KEYS:
+        ref = snap.get(key)
+        if isinstance(ref, dict) and os.path.isabs(ref.get('store') or ''):
+            snap[key] = dict(ref, store=os.path.relpath(ref['store'], json_dir))
+    return snap
+
+
+def externalize(snap: Dict[str, Any], store: BlobStore, json_path: str) -> Dict[str, Any]:
+    """
+    Snapshot'taki satır içi 'html' ve 'screenshot_hex' alanlarını depoya taşır,
+    yerlerine 'html_blob' / 'screenshot_blob' referanslarını koyar.
+    """
+    html = snap.pop('html', None)
+    if isinstance(html, str):
+        snap['html_blob'] = store.link(store.put(html.encode('utf-8')), json_path)
+    shot = snap.pop('screenshot_hex', None)
+    if shot:
+        snap['screenshot_blob'] = store.link(store.put(bytes.fromhex(shot)), json_path)
+    return snap
+
+
+def load_html(snap: Dict[str, Any], json_path: str) -> Optional[str]:
+    if is_section_ref(snap.get('html')):
+        resolve_section(snap, json_path, 'html')
+    if isinstance(snap.get('html'), str):
+        return snap['html']
+    data = read_ref(snap.get('html_blob'), json_path)
+    return data.decode('utf-8') if data is not None else None
+
+
+def load_screenshot(snap: Dict[str, Any], json_path: str) -> Optional[bytes]:
+    """Ekran görüntüsünü sırasıyla: satır içi hex (.snap'te ayrı bölüm), blob referansı, yanındaki .png'den okur."""
+    shot = snap.get('screenshot_hex')
+    if is_section_ref(shot):
+        return read_section(json_path, shot)['screenshot_hex']
+    if shot:
+        return bytes.fromhex(shot)
+    data = read_ref(snap.get('screenshot_blob'), json_path)
+    if data is not None:
+        return data
+    png = os.path.splitext(json_path)[0] + '.png'
+    if os.path.exists(png):
+        with open(png, 'rb') as f:
+            return f.read()
+    return None
+
+
+def screenshot_digest(snap: Dict[str, Any], json_path: str) -> Optional[str]:
+    """
+    Ekran görüntüsünün sha256'sı (load_screenshot ile aynı öncelik sırası), görüntüyü çözmeden.
+    Blob referansında (ve .snap bölümünde) özet zaten kayıtlı olduğu için görüntü hiç okunmaz.
+    """
+    if is_section_ref(snap.get('screenshot_hex')):
+        return snap['screenshot_hex']['sha256']
+    if snap.get('screenshot_hex'):
+        return hashlib.sha256(bytes.fromhex(snap['screenshot_hex'])).hexdigest()
+    ref = snap.get('screenshot_blob')
+    if isinstance(ref, dict) and ref.get('sha256'):
+        return ref['sha256']
+    png = os.path.splitext(json_path)[0] + '.png'
+    if os.path.exists(png):
+        h = hashlib.sha256()
+        with open(png, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                h.update(chunk)
+        return h.hexdigest()
+    return None
+
+
+# ---- İkili snapshot biçimi (.snap) ----
+# Düzen: MAGIC | sürüm (u8) | başlık uzunluğu (u32, big-endian) | başlık JSON'u | bölüm verileri
+# Başlık, snapshot dict'inin kendisidir; ağır alanların yerinde {'$section': ad, ...} yer tutucuları
+# durur. Yer tutucu bölümün dosyadaki konumunu, codec'ini ve ham verisinin sha256'sını taşır; böylece
+# başlık tek başına parmak izi/kıyas için yeterlidir ve bölüm içerik değişince yer tutucu da değişir.
+SNAPSHOT_EXT = '.snap'
+_SNAP_MAGIC = b'WSNP'
+_SNAP_VERSION = 1
+_SNAP_PREFIX = struct.Struct('>4sBI')
+_SNAP_COMPRESS_MIN = 512     # bundan küçük bölümler sıkıştırılmaz
+_SECTION_KEY = '$section'
+
+# (üst dict yolu, taşınan anahtarlar, bölüm adı, tür)
+#   text: tek str alan, utf-8 | hex: tek hex str alan, ham byte olarak saklanır | json: {anahtar: değer}
+_SNAP_SECTIONS = (
+    ((), ('html',), 'html', 'text'),
+    ((), ('screenshot_hex',), 'screenshot', 'hex'),
+    (('dom',), ('chunks',), 'chunks', 'json'),
+    (('structure',), ('dom_tree',), 'dom_tree', 'json'),
+    (('structure', 'assets'), ('img_srcs', 'link_hrefs', 'script_srcs',
+                               'img_srcs_unique', 'link_hrefs_unique', 'script_srcs_unique'), 'asset_lists', 'json'),
+    (('structure', 'asset_content'), ('items',), 'asset_content', 'json'),
+    (('visual_fp',), ('thumb_png',), 'thumb', 'json'),
+)
+_SECTION_SPECS = {name: (keys, kind) for _, keys, name, kind in _SNAP_SECTIONS}
+
+
+def is_snapshot_file(path: str) -> bool:
+    return path.lower().endswith(SNAPSHOT_EXT)
+
+
+def is_section_ref(value: Any) -> bool:
+    return isinstance(value, dict) and _SECTION_KEY in value
+
+
+def _section_payload(parent: Dict[str, Any], keys: tuple, kind: str) -> bytes:
+    if kind == 'text':
+        return parent[keys[0]].encode('utf-8')
+    if kind == 'hex':
+        return bytes.fromhex(parent[keys[0]])
+    return json.dumps({k: parent[k] for k in keys if k in parent}, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def _section_values(payload: bytes, keys: tuple, kind: str) -> Dict[str, Any]:
+    if kind == 'text':
+        return {keys[0]: payload.decode('utf-8')}
+    if kind == 'hex':
+        return {keys[0]: payload}
+    return json.loads(payload)
+
+
+def _copy_path(snap: Dict[str, Any], parent_path: tuple) -> Optional[Dict[str, Any]]:
+    """Yol üzerindeki dict'leri kopyalayıp son üst dict'i döner; asıl snapshot'a dokunulmaz."""
+    parent = snap
+    for key in parent_path:
+        if not isinstance(parent.get(key), dict):
+            return None
+        parent[key] = dict(parent[key])
+        parent = parent[key]
+    return parent
+
+
+def _inline_keys(parent: Optional[Dict[str, Any]], keys: tuple, kind: str) -> tuple:
+    """Bölüme taşınabilecek (mevcut ve yer tutucu olmayan) anahtarlar."""
+    present = tuple(k for k in keys if parent is not None and k in parent and not is_section_ref(parent[k]))
+    if present and kind in ('text', 'hex') and not isinstance(parent[present[0]], str):
+        return ()
+    return present
+
+
+def write_snapshot_file(path: str, snap: Dict[str, Any], codec: Optional[str] = None,
+                        finalize: Optional[Callable[[Dict[str, Any]], None]] = None):
+    """
+    Snapshot'ı .snap olarak (geçici dosya + os.replace ile atomik) yazar. Girdi dict'i değiştirilmez.
+    codec: bölüm sıkıştırması ('zstd' / 'gzip'); verilmezse zstandard varsa zstd.
+    finalize verilirse bölümler sıkıştırıldıktan sonra, başlık serileştirilmeden hemen önce başlık
+    dict'iyle çağrılır (ör. serileştirme süresini başlığın meta alanına eklemek için).
+    """
+    codec = codec or ('zstd' if _ZSTD else 'gzip')
+    header = dict(snap)
+    chunks, offset = [], 0
+    for parent_path, keys, name, kind in _SNAP_SECTIONS:
+        parent = _copy_path(header, parent_path)
+        present = _inline_keys(parent, keys, kind)
+        if not present:
+            continue
+        raw = _section_payload(parent, present, kind)
+        use = codec if kind != 'hex' and len(raw) >= _SNAP_COMPRESS_MIN else 'raw'
+        data = _compress(raw, use) if use != 'raw' else raw
+        # tam yer tutucu ilk anahtarda; aynı bölümdeki diğer anahtarlar yalnızca bölüm adını taşır
+        parent[present[0]] = {_SECTION_KEY: name, 'offset': offset, 'length': len(data), 'codec': use,
+                              'size': len(raw), 'sha256': hashlib.sha256(raw).hexdigest()}
+        for k in present[1:]:
+            parent[k] = {_SECTION_KEY: name}
+        chunks.append(data)
+        offset += len(data)
+
+    if finalize is not None:
+        finalize(header)
+    head = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    dirpath = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dirpath, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dirpath, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_SNAP_PREFIX.pack(_SNAP_MAGIC, _SNAP_VERSION, len(head)))
+            f.write(head)
+            for data in chunks:
+                f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def read_snapshot_file(path: str, lazy: bool = False) -> Dict[str, Any]:
+    """
+    .snap dosyasını okur. lazy=True ise yalnızca başlık okunur; ağır alanlar yer tutucu olarak kalır
+    ve resolve_section() ile istenince yüklenir. lazy=False ise JSON snapshot'ın aynısı döner.
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(_SNAP_PREFIX.size)
+        if len(prefix) != _SNAP_PREFIX.size:
+            raise ValueError(f'not a snapshot file: {path}')
+        magic, version, head_len = _SNAP_PREFIX.unpack(prefix)
+        if magic != _SNAP_MAGIC or version != _SNAP_VERSION:
+            raise ValueError(f'unsupported snapshot file: {path}')
+        snap = json.loads(f.read(head_len))
+        if lazy:
+            return snap
+        for parent_path, _, name, _ in _SNAP_SECTIONS:
+            parent = _walk(snap, parent_path)
+            ref = _full_ref(parent, name) if parent is not None else None
+            if ref is not None:
+                parent.update(_as_fields(ref, _unpack_section(ref, _read_at(f, _SNAP_PREFIX.size + head_len, ref))))
+    return snap
+
+
+def _walk(snap: Dict[str, Any], parent_path: tuple) -> Optional[Dict[str, Any]]:
+    for key in parent_path:
+        snap = snap.get(key) if isinstance(snap, dict) else None
+    return snap if isinstance(snap, dict) else None
+
+
+def _full_ref(parent: Dict[str, Any], name: str) -> Optional[Dict[str, Any]]:
+    """Üst dict'te name bölümünün konum bilgisi taşıyan yer tutucusu."""
+    for value in parent.values():
+        if is_section_ref(value) and value[_SECTION_KEY] == name and 'offset' in value:
+            return value
+    return None
+
+
+def _read_at(f, data_start: int, ref: Dict[str, Any]) -> bytes:
+    f.seek(data_start + ref['offset'])
+    return f.read(ref['length'])
+
+
+def _unpack_section(ref: Dict[str, Any], data: bytes) -> Dict[str, Any]:
+    raw = data if ref['codec'] == 'raw' else _decompress(data, ref['codec'])
+    keys, kind = _SECTION_SPECS[ref[_SECTION_KEY]]
+    return _section_values(raw, keys, kind)
+
+
+def _as_fields(ref: Dict[str, Any], values: Dict[str, Any]) -> Dict[str, Any]:
+    """Bölüm değerlerini JSON snapshot'taki biçimine çevirir ('hex' türü ham byte -> hex str)."""
+    if _SECTION_SPECS[ref[_SECTION_KEY]][1] == 'hex':
+        return {k: v.hex() for k, v in values.items()}
+    return values
+
+
+def read_section(path: str, ref: Dict[str, Any]) -> Dict[str, Any]:
+    """Tek bir bölümü okur; 'hex' türü ham byte olarak döner (ekran görüntüsü hex'e çevrilmeden kullanılır)."""
+    with open(path, 'rb') as f:
+        _, _, head_len = _SNAP_PREFIX.unpack(f.read(_SNAP_PREFIX.size))
+        return _unpack_section(ref, _read_at(f, _SNAP_PREFIX.size + head_len, ref))
+
+
+def resolve_section(snap: Dict[str, Any], path: str, *keys: str) -> Any:
+    """
+    snap[keys[0]]...[keys[-1]] değerini döner; yer tutucuysa bölümü dosyadan okuyup aynı bölümdeki
+    tüm alanlarla birlikte dict'e yerleştirir (sonraki erişimler dosyaya gitmez). JSON snapshot'larda
+    değer olduğu gibi döner.
+    """
+    parent = _walk(snap, tuple(keys[:-1]))
+    if parent is None:
+        return None
+    value = parent.get(keys[-1])
+    if is_section_ref(value):
+        ref = _full_ref(parent, value[_SECTION_KEY])
+        parent.update(_as_fields(ref, read_section(path, ref)))
+        value = parent.get(keys[-1])
+    return value
+
+
+def signal_view(snap: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Snapshot'ın bölümlere taşınan alanları yerine bölüm sha256'ları konmuş sığ kopyası.
+    JSON, tembel okunmuş ve çözülmüş .snap snapshot'ları için aynı sonucu verir; parmak izi
+    hesabında ağır alanları serileştirmeden (ve .snap'te dosyaya gitmeden) kullanılır.
+    """
+    view = dict(snap)
+    for parent_path, keys, name, kind in _SNAP_SECTIONS:
+        parent = _copy_path(view, parent_path)
+        if parent is None:
+            continue
+        ref = _full_ref(parent, name)
+        if ref is not None:
+            present = tuple(k for k in keys if is_section_ref(parent.get(k)))
+            digest = ref['sha256']
+        else:
+            present = _inline_keys(parent, keys, kind)
+            if not present:
+                continue
+            digest = hashlib.sha256(_section_payload(parent, present, kind)).hexdigest()
+        parent[present[0]] = {'sha256': digest}
+        for k in present[1:]:
+            del parent[k]
+    return view
+
+
+def load_snapshot(path: str, lazy: bool = False) -> Optional[Dict[str, Any]]:
+    """Uzantıya göre JSON ya da .snap snapshot'ı okur; dosya yoksa None."""
+    if not os.path.exists(path):
+        return None
+    if is_snapshot_file(path):
+        return read_snapshot_file(path, lazy=lazy)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# ---- SQLite snapshot geçmişi ----
+_ASSET_HASH_KEYS = (
+    'imgs_list_hash', 'links_list_hash', 'scripts_list_hash',
+    'imgs_unique_hash', 'links_unique_hash', 'scripts_unique_hash',
+)
+_SIGNAL_COLUMNS = ('status_code', 'text_hash', 'html_hash', 'http_hash') + _ASSET_HASH_KEYS + ('tag_counts',)
+_CAPTURED_AT_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'   # capture_snapshot.utc_now_iso ile aynı, sabit genişlikte
+
+
+def time_bound(value: Optional[str], upper: bool = False) -> Optional[str]:
+    """
+    ISO-8601 zaman sınırını captured_at biçimine çevirir; sorgular [since, until) yarı açık aralık kullanır.
+    Yalnızca tarih verilen üst sınır o günün tamamını kapsar (ertesi gün 00:00), tam zaman damgası olan
+    üst sınır dahil edilir (+1 µs). Saat dilimi yoksa UTC kabul edilir. Geçersiz değer ValueError.
+    """
+    if not value:
+        return None
+    text = value.strip()
+    try:
+        if 'T' not in text and ' ' not in text:
+            moment = datetime.combine(date.fromisoformat(text), datetime.min.time(), timezone.utc)
+            step = timedelta(days=1)
+        else:
+            moment = datetime.fromisoformat(text)
+            moment = moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+            step = timedelta(microseconds=1)
+    except ValueError:
+        raise ValueError(f'invalid ISO-8601 time: {value!r}') from None
+    return (moment + step if upper else moment).strftime(_CAPTURED_AT_FORMAT)
+
+_HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    captured_at TEXT NOT NULL,
+    run TEXT,
+    status_code INTEGER,
+    error TEXT,
+    text_hash TEXT,
+    html_hash TEXT,
+    http_hash TEXT,
+    imgs_list_hash TEXT,
+    links_list_hash TEXT,
+    scripts_list_hash TEXT,
+    imgs_unique_hash TEXT,
+    links_unique_hash TEXT,
+    scripts_unique_hash TEXT,
+    tag_counts TEXT,
+    signature TEXT,
+    path TEXT,
+    UNIQUE (url, captured_at)
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_url_time ON snapshots (url, captured_at);
+CREATE INDEX IF NOT EXISTS idx_snapshots_time ON snapshots (captured_at);
+CREATE INDEX IF NOT EXISTS idx_snapshots_run_url ON snapshots (run, url);
+"""
+
+
+def _history_row(snap: Dict[str, Any]) -> Dict[str, Any]:
+    """Snapshot dict'inden geçmiş tablosu satırı (yalnızca küçük sinyal alanları)."""
+    structure = snap.get('structure') or {}
+    assets = structure.get('assets') or {}
+    row: Dict[str, Any] = {
+        'status_code': snap.get('status_code'),
+        'error': snap.get('error'),
+        'text_hash': (snap.get('dom') or {}).get('hash'),
+        'html_hash': structure.get('html_hash'),
+        'http_hash': (snap.get('http') or {}).get('hash'),
+        'tag_counts': json.dumps(structure['tag_counts'], sort_keys=True) if 'tag_counts' in structure else None,
+    }
+    for key in _ASSET_HASH_KEYS:
+        row[key] = assets.get(key)
+    if row['error']:
+        row['signature'] = None
+    else:
+        row['signature'] = hashlib.sha256(
+            '\n'.join(str(row[c]) for c in _SIGNAL_COLUMNS).encode('utf-8')
+        ).hexdigest()
+    return row
+
+
+def _changed_fields(a: Dict[str, Any], b: Dict[str, Any]) -> List[str]:
+    return [c for c in _SIGNAL_COLUMNS if a.get(c) != b.get(c)]
+
+
+class HistoryStore:
+    """
+    Snapshot geçmişi için yerel SQLite deposu: (url, captured_at) başına bir satır.
+    url/zaman/run indeksleri sayesinde "hangi URL'ler değişti" soruları JSON
+    dosyaları yüklenmeden indeksli sorgularla cevaplanır.
+    """
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        dirpath = os.path.dirname(self.path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+        import sqlite3   # yalnızca geçmiş deposu kullanılınca yüklenir (CLI açılışı)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(_HISTORY_SCHEMA)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record(self, snap: Dict[str, Any], path: Optional[str] = None, run: Optional[str] = None):
+        if not snap.get('url') or not snap.get('captured_at'):
+            return
+        row = _history_row(snap)
+        row.update(url=snap['url'], captured_at=snap['captured_at'], run=run,
+                   path=os.path.abspath(path) if path else None)
+        cols = ', '.join(row)
+        marks = ', '.join('?' for _ in row)
+        with self._lock:
+            self._conn.execute(f'INSERT OR REPLACE INTO snapshots ({cols}) VALUES ({marks})', tuple(row.values()))
+            self._conn.commit()
+
+    def runs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT run, COUNT(*) AS count, MIN(captured_at) AS started, MAX(captured_at) AS finished '
+                'FROM snapshots WHERE run IS NOT NULL GROUP BY run ORDER BY started'
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def changes_between_runs(self, run_a: str, run_b: str) -> Dict[str, Any]:
+        """İki çalıştırma arasında değişen URL'ler (run, url indeksiyle birleştirme)."""
+        with self._lock:
+            pairs = self._conn.execute(
+                'SELECT a.url AS url, a.captured_at AS a_at, b.captured_at AS b_at, '
+                + ', '.join(f'a.{c} AS a_{c}, b.{c} AS b_{c}' for c in _SIGNAL_COLUMNS + ('signature', 'error'))
+                + ' FROM snapshots a JOIN snapshots b ON a.url = b.url'
+                ' WHERE a.run = ? AND b.run = ? ORDER BY a.url',
+                (run_a, run_b),
+            ).fetchall()
+            only_a = [r[0] for r in self._conn.execute(
+                'SELECT url FROM snapshots WHERE run = ? AND url NOT IN (SELECT url FROM snapshots WHERE run = ?) ORDER BY url',
+                (run_a, run_b))]
+            only_b = [r[0] for r in self._conn.execute(
+                'SELECT url FROM snapshots WHERE run = ? AND url NOT IN (SELECT url FROM snapshots WHERE run = ?) ORDER BY url',
+                (run_b, run_a))]
+
+        changed = []
+        for r in pairs:
+            if r['a_signature'] is not None and r['a_signature'] == r['b_signature']:
+                continue
+            a = {c: r[f'a_{c}'] for c in _SIGNAL_COLUMNS}
+            b = {c: r[f'b_{c}'] for c in _SIGNAL_COLUMNS}
+            changed.append({
+                'url': r['url'],
+                'first_captured_at': r['a_at'],
+                'second_captured_at': r['b_at'],
+                'changed_fields': _changed_fields(a, b) if not (r['a_error'] or r['b_error']) else ['error'],
+            })
+        return {
+            'run_a': run_a,
+            'run_b': run_b,
+            'count_compared': len(pairs),
+            'count_changed': len(changed),
+            'changed': changed,
+            'missing_in_b': only_a,
+            'missing_in_a': only_b,
+        }
+
+    def changes_in_range(self, since: str, until: Optional[str] = None) -> Dict[str, Any]:
+        """
+        [since, until] aralığında bir önceki snapshot'ına göre değişmiş URL'ler.
+        Aralıktan önceki son snapshot da karşılaştırmaya dahildir (LAG penceresi).
+        Sınırlar time_bound ile normalize edilir; yalnızca tarih verilen until o günü de kapsar.
+        """
+        since_at, until_at = time_bound(since), time_bound(until, upper=True)
+        with self._lock:
+            rows = self._conn.execute(
+                'WITH w AS ('
+                ' SELECT url, captured_at, signature, LAG(signature) OVER (PARTITION BY url ORDER BY captured_at) AS prev'
+                ' FROM snapshots WHERE captured_at < ? AND signature IS NOT NULL'
+                ') SELECT url, COUNT(*) AS changes, MIN(captured_at) AS first_change, MAX(captured_at) AS last_change'
+                ' FROM w WHERE captured_at >= ? AND prev IS NOT NULL AND prev != signature'
+                ' GROUP BY url ORDER BY url',
+                (until_at or '9999', since_at or ''),
+            ).fetchall()
+        return {
+            'since': since,
+            'until': until,
+            'count_changed': len(rows),
+            'changed': [dict(r) for r in rows],
+        }
+
+    def url_history(self, url: str, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        since_at, until_at = time_bound(since), time_bound(until, upper=True)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM snapshots WHERE url = ? AND captured_at >= ? AND captured_at < ? ORDER BY captured_at',
+                (url, since_at or '', until_at or '9999'),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+
+# ---- Yakalama iş kuyruğu ----
+_QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    out_path TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    error TEXT,
+    result TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, lease_until, id);
+"""
+JOB_STATES = ('pending', 'leased', 'done', 'failed')
+
+
+class JobQueue:
+    """
+    Yakalama işleri için SQLite kuyruğu: URL başına bir satır (pending -> leased -> done / failed).
+    Worker'lar işleri süreli kirayla (lease) alır ve bitirince 'done' olarak işaretler; çöken bir
+    worker'ın kirası süresi dolunca başka worker'a geçer. Bir iş max_attempts kez denendikten sonra
+    'failed' olur. Durum tamamen veritabanında olduğu için yeniden başlatmada kalan işlerden devam edilir.
+    Aynı dosya sistemini paylaşan farklı makinelerden de kullanılabilsin diye WAL yerine (paylaşılan
+    bellek gerektirir) klasik rollback journal ve BEGIN IMMEDIATE kilitleri kullanılır. Kira süreleri
+    duvar saatiyle tutulur; makinelerin saatleri senkron olmalıdır.
+    pending işlerde lease_until "bu zamandan önce alınmasın" anlamına gelir (yeniden deneme gecikmesi).
+    """
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = os.path.abspath(path)
+        self.max_attempts = max(1, max_attempts)
+        dirpath = os.path.dirname(self.path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+        import sqlite3
+        self._lock = threading.Lock()
+        # isolation_level=None: işlemler aşağıda açıkça (BEGIN IMMEDIATE) yönetilir
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=60, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=DELETE')
+            self._conn.executescript(_QUEUE_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def _tx(self):
+        """Yazma kilidini baştan alan işlem; aynı anda yalnızca bir worker kuyruğu değiştirir."""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def add(self, urls: Iterable[str], out_path: Callable[[int, str], str]) -> Dict[str, int]:
+        """
+        URL'leri sırayla kuyruğa ekler; out_path(sıra, url) çıktı dosyasını verir. Sıra numaraları
+        kuyruktaki son işten devam eder. Zaten kuyrukta olan URL'ler atlanır (ekleme tekrarlanabilir).
+        """
+        added = skipped = 0
+        now = time.time()
+        with self._tx() as conn:
+            idx = conn.execute('SELECT COALESCE(MAX(id), 0) FROM jobs').fetchone()[0]
+            for url in urls:
+                if conn.execute('SELECT 1 FROM jobs WHERE url = ?', (url,)).fetchone():
+                    skipped += 1
+                    continue
+                idx += 1
+                conn.execute('INSERT INTO jobs (id, url, out_path, updated_at) VALUES (?, ?, ?, ?)',
+                             (idx, url, out_path(idx, url), now))
+                added += 1
+        return {'added': added, 'skipped': skipped}
+
+    def claim(self, worker: str, lease: float) -> Optional[Dict[str, Any]]:
+        """
+        Sıradaki alınabilir işi (bekleyen ya da kirası dolmuş) worker adına lease saniyeliğine kiralar.
+        Kirası dolan ve deneme hakkı biten işler önce 'failed' yapılır. Alınacak iş yoksa None.
+        """
+        now = time.time()
+        with self._tx() as conn:
+            conn.execute("UPDATE jobs SET state = 'failed', error = COALESCE(error, 'lease_expired'), worker = NULL,"
+                         " lease_until = NULL, updated_at = ?"
+                         " WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                         (now, now, self.max_attempts))
+            row = conn.execute("SELECT id, url, out_path, attempts FROM jobs"
+                               " WHERE (state = 'pending' AND (lease_until IS NULL OR lease_until <= ?))"
+                               " OR (state = 'leased' AND lease_until < ?) ORDER BY id LIMIT 1",
+                               (now, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1,"
+                         " updated_at = ? WHERE id = ?", (worker, now + lease, now, row['id']))
+        return dict(row, attempts=row['attempts'] + 1)
+
+    def renew(self, job_ids: List[int], worker: str, lease: float) -> int:
+        """Worker'ın hâlâ elinde tuttuğu işlerin kirasını uzatır; uzatılan iş sayısını döner."""
+        if not job_ids:
+            return 0
+        now = time.time()
+        marks = ', '.join('?' for _ in job_ids)
+        with self._tx() as conn:
+            cur = conn.execute(f"UPDATE jobs SET lease_until = ?, updated_at = ?"
+                               f" WHERE state = 'leased' AND worker = ? AND id IN ({marks})",
+                               (now + lease, now, worker, *job_ids))
+        return cur.rowcount
+
+    def complete(self, job_id: int, worker: str, result: Dict[str, Any]) -> bool:
+        """İşi 'done' olarak işaretler (checkpoint). Kira bu arada başka worker'a geçtiyse False."""
+        with self._tx() as conn:
+            cur = conn.execute("UPDATE jobs SET state = 'done', result = ?, error = NULL, worker = NULL,"
+                               " lease_until = NULL, updated_at = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                               (json.dumps(result, ensure_ascii=False), time.time(), job_id, worker))
+        return cur.rowcount == 1
+
+    def fail(self, job_id: int, worker: str, error: str, retry_delay: float = 0.0) -> str:
+        """
+        Başarısız denemeyi kaydeder: deneme hakkı kaldıysa iş retry_delay sonra yeniden alınmak üzere
+        'pending'e döner ('retry'), bittiyse 'failed' olur. Kira başka worker'a geçtiyse 'lost'.
+        """
+        now = time.time()
+        with self._tx() as conn:
+            row = conn.execute("SELECT attempts FROM jobs WHERE id = ? AND worker = ? AND state = 'leased'",
+                               (job_id, worker)).fetchone()
+            if row is None:
+                return 'lost'
+            if row['attempts'] >= self.max_attempts:
+                conn.execute("UPDATE jobs SET state = 'failed', error = ?, worker = NULL, lease_until = NULL,"
+                             " updated_at = ? WHERE id = ?", (error, now, job_id))
+                return 'failed'
+            conn.execute("UPDATE jobs SET state = 'pending', error = ?, worker = NULL, lease_until = ?,"
+                         " updated_at = ? WHERE id = ?", (error, now + retry_delay, now, job_id))
+        return 'retry'
+
+    def release_worker(self, worker: str) -> int:
+        """Worker'ın elindeki işleri hemen 'pending'e döndürür (aynı worker adıyla yeniden başlatma)."""
+        with self._tx() as conn:
+            cur = conn.execute("UPDATE jobs SET state = 'pending', worker = NULL, lease_until = NULL, updated_at = ?"
+                               " WHERE state = 'leased' AND worker = ?", (time.time(), worker))
+        return cur.rowcount
+
+    def retry_failed(self) -> int:
+        """'failed' işleri deneme sayaçları sıfırlanmış olarak yeniden kuyruğa alır."""
+        with self._tx() as conn:
+            cur = conn.execute("UPDATE jobs SET state = 'pending', attempts = 0, lease_until = NULL, updated_at = ?"
+                               " WHERE state = 'failed'", (time.time(),))
+        return cur.rowcount
+
+    def remaining(self) -> int:
+        """Henüz bitmemiş (bekleyen ya da kirada) iş sayısı."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('pending', 'leased')").fetchone()[0]
+
+    def status(self, failed_limit: int = 20) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            counts = dict.fromkeys(JOB_STATES, 0)
+            counts.update((r['state'], r['n']) for r in self._conn.execute(
+                'SELECT state, COUNT(*) AS n FROM jobs GROUP BY state'))
+            expired = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'leased' AND lease_until < ?",
+                                         (now,)).fetchone()[0]
+            workers = {r['worker']: r['n'] for r in self._conn.execute(
+                "SELECT worker, COUNT(*) AS n FROM jobs WHERE state = 'leased' GROUP BY worker ORDER BY worker")}
+            failed = [dict(r) for r in self._conn.execute(
+                "SELECT id, url, attempts, error FROM jobs WHERE state = 'failed' ORDER BY id LIMIT ?",
+                (failed_limit,))]
+        return {'db': self.path, 'total': sum(counts.values()), 'counts': counts, 'expired_leases': expired,
+                'workers': workers, 'failed': failed}
+
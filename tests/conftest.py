@@ -0,0 +1,59 @@
+#\"\"\"conftest.py
+
+#Testler için ortak fixture'lar.
+# - Depo kökü sys.path'e eklenir (modüller düz, paket değil)
+# - site: geçici bir klasörü sunan yerel HTTP sunucusu (Last-Modified / 304 destekli)
+#\"\"\"
+
+import functools
+import os
+import sys
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Site:
+    """Klasöre sayfa yazar ve URL'sini verir."""
+
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url
+
+    def write(self, name: str, body, mtime: float = None) -> str:
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body.encode('utf-8') if isinstance(body, str) else body)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return self.url(name)
+
+    def url(self, name: str) -> str:
+        return f'{self.base_url}/{name}'
+
+
+@pytest.fixture
+def site(tmp_path):
+    root = tmp_path / 'site'
+    root.mkdir()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_QuietHandler, directory=str(root)))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    try:
+        yield Site(str(root), f'http://{host}:{port}')
+    finally:
+        server.shutdown()
+        server.server_close()
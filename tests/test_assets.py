@@ -0,0 +1,51 @@
+#\"\"\"test_assets.py
+
+#Ortak AssetCache: asset içeriklerinin bir kez indirilip hash'lenmesi ve capture komutunun
+#her modda (tek URL, liste, --ndjson) önbelleği kapatması.
+#\"\"\"
+
+import sys
+
+import pytest
+
+import capture_snapshot
+from capture_snapshot import AssetCache, take_snapshot
+
+PAGE = '<html><head><link rel="stylesheet" href="/s.css"></head><body><img src="/a.png"><img src="{img}"></body></html>'
+
+
+def test_shared_cache_fetches_each_asset_once(site):
+    site.write('s.css', 'p{}')
+    site.write('a.png', b'\x89PNG1')
+    first = site.write('one.html', PAGE.format(img='/a.png'))
+    second = site.write('two.html', PAGE.format(img='/yok.png'))
+    cache = AssetCache(workers=2)
+    try:
+        one = take_snapshot(first, asset_cache=cache)['structure']['asset_content']
+        two = take_snapshot(second, asset_cache=cache)['structure']['asset_content']
+    finally:
+        cache.close()
+    assert one['count'] == 2 and one['errors'] == 0
+    assert two['count'] == 3 and two['errors'] == 1
+    assert two['items'][site.url('yok.png')]['status'] == 404
+    stats = cache.stats()
+    assert (stats['urls'], stats['fetched'], stats['errors'], stats['shared']) == (3, 2, 1, 2)
+
+
+@pytest.mark.parametrize('mode', ['url', 'file', 'ndjson'])
+def test_capture_closes_asset_cache(site, tmp_path, monkeypatch, capsys, mode):
+    url = site.write('page.html', PAGE.format(img='/a.png'))
+    closed = []
+    real_close = AssetCache.close
+    monkeypatch.setattr(AssetCache, 'close', lambda self: (closed.append(self), real_close(self)))
+    monkeypatch.chdir(tmp_path)
+    urls = tmp_path / 'urls.txt'
+    urls.write_text(url + '\n', encoding='utf-8')
+    argv = ['capture_snapshot.py', 'capture', '--assets']
+    if mode == 'url':
+        argv += ['--url', url, '--out', str(tmp_path / 'out.json')]
+    else:
+        argv += ['--file', str(urls), '--out-dir', str(tmp_path / 'out')] + (['--ndjson'] if mode == 'ndjson' else [])
+    monkeypatch.setattr(sys, 'argv', argv)
+    capture_snapshot.main()
+    assert len(closed) == 1
@@ -0,0 +1,79 @@
+#\"\"\"test_compare.py
+
+#compare_snapshots: çok çalıştırmalı zaman çizelgesi ve Merkle DOM ağacı farkı.
+#\"\"\"
+
+import json
+
+from capture_snapshot import capture_single, extract_signals
+from compare_snapshots import diff_dom_trees, timeline
+
+
+def _runs(site, tmp_path, bodies):
+    """bodies[i] i. çalıştırmada sayfanın içeriği; her çalıştırma ayrı bir klasöre yakalanır."""
+    dirs = []
+    for i, body in enumerate(bodies):
+        url = site.write('page.html', body)
+        run_dir = tmp_path / f'run{i}'
+        run_dir.mkdir()
+        capture_single(url, str(run_dir / '001_page.json'))
+        dirs.append(str(run_dir))
+    return dirs
+
+
+def test_timeline_reports_changes_per_run(site, tmp_path):
+    dirs = _runs(site, tmp_path, ['<p>bir</p>', '<p>bir</p>', '<p>iki</p>'])
+    res = timeline(dirs)
+    assert [r['snapshots'] for r in res['runs']] == [1, 1, 1]
+    [entry] = res['urls']
+    assert entry['change_count'] == 1
+    assert [e['run'] for e in entry['events'] if 'changed' in e] == ['run2']
+    assert 'text' in entry['events'][-1]['changed']
+
+
+def test_timeline_skips_non_dict_json(site, tmp_path):
+    dirs = _runs(site, tmp_path, ['<p>bir</p>', '<p>iki</p>'])
+    (tmp_path / 'run0' / 'summary.json').write_text(json.dumps([{'url': 'x'}]), encoding='utf-8')
+    (tmp_path / 'run1' / 'count.json').write_text('42', encoding='utf-8')
+    (tmp_path / 'run1' / 'name.json').write_text('"run1"', encoding='utf-8')
+    (tmp_path / 'run1' / 'broken.json').write_text('{', encoding='utf-8')
+    res = timeline(dirs)
+    assert [r['snapshots'] for r in res['runs']] == [1, 1]
+    assert res['count_urls'] == 1 and res['count_urls_changed'] == 1
+
+
+PAGE = '<html><body><div id="m" class="{cls}">{text}<p>bir</p><p>{second}</p></div><footer>son</footer></body></html>'
+
+
+def _dom_diff(first, second):
+    return diff_dom_trees(extract_signals(first)['dom_tree'], extract_signals(second)['dom_tree'])
+
+
+def _legacy(tree):
+    """Öz hash alanı olmayan (eski) ağaç kodlaması."""
+    return dict(tree, nodes='\n'.join(' '.join(line.split(' ')[:3]) for line in tree['nodes'].split('\n')))
+
+
+def test_dom_diff_reports_parent_and_child_edits():
+    base = PAGE.format(cls='a', text='selam', second='iki')
+    res = _dom_diff(base, PAGE.format(cls='b', text='selam', second='İKİ'))
+    assert res['changed'] == ['html > body > div#m', 'html > body > div#m > p:nth-of-type(2)']
+    res = _dom_diff(base, PAGE.format(cls='a', text='merhaba', second='İKİ'))
+    assert res['changed'] == ['html > body > div#m', 'html > body > div#m > p:nth-of-type(2)']
+
+
+def test_dom_diff_child_only_and_reorder():
+    base = PAGE.format(cls='a', text='selam', second='iki')
+    assert _dom_diff(base, PAGE.format(cls='a', text='selam', second='İKİ'))['changed'] == \
+        ['html > body > div#m > p:nth-of-type(2)']
+    swapped = base.replace('<p>bir</p><p>iki</p>', '<p>iki</p><p>bir</p>')
+    res = _dom_diff(base, swapped)
+    assert res['changed'] == ['html > body > div#m'] and not res['added'] and not res['removed']
+    assert _dom_diff(base, base)['changed'] == []
+
+
+def test_dom_diff_legacy_trees_without_own_hash():
+    first = extract_signals(PAGE.format(cls='a', text='selam', second='iki'))['dom_tree']
+    second = extract_signals(PAGE.format(cls='b', text='selam', second='İKİ'))['dom_tree']
+    assert diff_dom_trees(_legacy(first), _legacy(second))['changed'] == ['html > body > div#m > p:nth-of-type(2)']
+    assert diff_dom_trees(_legacy(first), second)['changed'] == ['html > body > div#m > p:nth-of-type(2)']
@@ -0,0 +1,55 @@
+#\"\"\"test_history.py
+
+#HistoryStore zaman aralığı sorguları: yalnızca tarih verilen --until o günü de kapsamalı,
+#geçersiz zaman sınırları ValueError / invalid_time (çıkış kodu 2) vermeli.
+#\"\"\"
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from snapshot_store import HistoryStore, time_bound
+
+
+def _snap(captured_at, text):
+    return {'url': 'https://example.com/', 'captured_at': captured_at, 'status_code': 200, 'dom': {'hash': text}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.db'))
+    store.record(_snap('2024-05-07T09:00:00.000000Z', 'a'), run='mon')
+    store.record(_snap('2024-05-08T10:00:00.000000Z', 'b'), run='tue')
+    store.record(_snap('2024-05-09T08:00:00.000000Z', 'c'), run='wed')
+    yield store
+    store.close()
+
+
+def test_date_only_until_includes_that_day(store):
+    res = store.changes_in_range('2024-05-08', '2024-05-08')
+    assert [r['last_change'] for r in res['changed']] == ['2024-05-08T10:00:00.000000Z']
+    history = store.url_history('https://example.com/', until='2024-05-08')
+    assert [r['captured_at'][:10] for r in history] == ['2024-05-07', '2024-05-08']
+
+
+def test_timestamp_until_is_inclusive(store):
+    history = store.url_history('https://example.com/', since='2024-05-08T10:00:00Z', until='2024-05-08T12:00:00+02:00')
+    assert [r['captured_at'] for r in history] == ['2024-05-08T10:00:00.000000Z']
+
+
+@pytest.mark.parametrize('value', ['yesterday', '2024-13-01', '2024-05-08T25:00'])
+def test_invalid_bound_rejected(store, value):
+    with pytest.raises(ValueError):
+        time_bound(value)
+    with pytest.raises(ValueError):
+        store.changes_in_range(value)
+
+
+def test_cli_invalid_until(store, tmp_path):
+    out = subprocess.run([sys.executable, 'compare_snapshots.py', 'history', '--db', store.path,
+                          '--since', '2024-05-01', '--until', 'tomorrow'], cwd=ROOT, capture_output=True, text=True)
+    assert out.returncode == 2
+    assert json.loads(out.stdout)['error'] == 'invalid_time'
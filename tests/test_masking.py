@@ -0,0 +1,97 @@
+#\"\"\"test_masking.py
+
+#Uçucu içerik maskeleme: kural dosyası doğrulaması, hash kararlılığı ve 304 yolunda maskeli
+#asset'lerin gerçek URL'den yeniden doğrulanması / kural değişince 304'ün kullanılmaması.
+#\"\"\"
+
+import json
+
+import pytest
+
+from capture_snapshot import AssetCache, extract_signals, take_snapshot
+from snapshot_masking import MaskRules
+
+PAGE = """<html><head><meta name="csrf" content="{token}"><script src="/app.js?v={n}"></script></head>
+<body><div class="ad-slot">reklam {n}</div><p>Saat {n}:00:00 itibarıyla</p><img src="/logo.png?v={n}"></body></html>"""
+
+RULES = {
+    '*': {'query_params': ['v']},
+    '127.0.0.1': {'selectors': ['div.ad-slot'],
+                  'attributes': [{'tag': 'meta', 'name': 'content'}],
+                  'text': [r'\d{1,2}:\d{2}:\d{2}']},
+}
+
+
+def _rules(tmp_path, rules, name='rules.json'):
+    path = tmp_path / name
+    path.write_text(json.dumps(rules), encoding='utf-8')
+    return MaskRules(str(path))
+
+
+@pytest.mark.parametrize('rules, msg', [
+    ({'a': {'text': 'abc'}}, 'text must be a list of strings'),
+    ({'a': {'query_params': 'ver'}}, 'query_params must be a list of strings'),
+    ({'a': {'selectors': ['div', 3]}}, 'selectors must be a list of strings'),
+    ({'a': {'attributes': ['nonce']}}, 'attributes[0] must be an object'),
+    ({'a': {'attributes': {'name': 'nonce'}}}, 'attributes must be a list'),
+    ({'a': {'attributes': [{'name': 'n', 'pattern': 1}]}}, 'attributes[0].pattern must be a string'),
+    ({'a': {'colors': []}}, 'unknown rule keys'),
+    ({'a': 5}, 'rules must be an object'),
+    ({'a': {'text': ['(']}}, 'a:'),
+    ({'a': {'selectors': ['div > p']}}, 'unsupported selector'),
+])
+def test_invalid_rules_rejected_at_load(tmp_path, rules, msg):
+    with pytest.raises(ValueError, match=msg.replace('[', r'\[').replace(']', r'\]')):
+        _rules(tmp_path, rules)
+
+
+def test_masked_signals_are_stable(tmp_path):
+    rules = _rules(tmp_path, RULES)
+    mask, sites = rules.for_url('http://127.0.0.1/page')
+    assert sites == ['*', '127.0.0.1']
+    one = extract_signals(PAGE.format(token='x' * 32, n=1), mask=mask)
+    two = extract_signals(PAGE.format(token='y' * 32, n=2), mask=mask)
+    for key in ('text_hash', 'html_hash', 'dom_tree'):
+        assert one[key] == two[key]
+    assert one['mask_counts'] == {'elements': 1, 'attributes': 1, 'urls': 2, 'text': 1}
+    plain = extract_signals(PAGE.format(token='x' * 32, n=1)), extract_signals(PAGE.format(token='y' * 32, n=2))
+    assert plain[0]['text_hash'] != plain[1]['text_hash']
+
+
+def test_not_modified_revalidates_assets_from_real_url(site, tmp_path):
+    rules = _rules(tmp_path, RULES)
+    site.write('app.js', 'console.log(1)')
+    site.write('logo.png', b'\x89PNG')
+    url = site.write('page.html', PAGE.format(token='t' * 32, n=7), mtime=1_700_000_000)
+    cache = AssetCache(workers=2)
+    try:
+        first = take_snapshot(url, asset_cache=cache, mask_rules=rules)
+        items = first['structure']['asset_content']['items']
+        assert sorted(items) == [site.url('app.js'), site.url('logo.png')]
+        assert items[site.url('app.js')]['url'] == site.url('app.js?v=7')
+
+        second = take_snapshot(url, previous=first, asset_cache=cache, mask_rules=rules)
+        assert second['validators']['not_modified']
+        content = second['structure']['asset_content']
+        assert content['errors'] == 0
+        assert content['hash'] == first['structure']['asset_content']['hash']
+        assert sorted(content['items']) == sorted(items)
+    finally:
+        cache.close()
+
+
+def test_rule_change_skips_not_modified_reuse(site, tmp_path):
+    url = site.write('page.html', PAGE.format(token='t' * 32, n=7), mtime=1_700_000_000)
+    old = _rules(tmp_path, RULES, 'old.json')
+    first = take_snapshot(url, mask_rules=old)
+    assert take_snapshot(url, previous=first, mask_rules=old)['validators'].get('not_modified')
+
+    new = _rules(tmp_path, dict(RULES, **{'127.0.0.1': {'selectors': ['p']}}), 'new.json')
+    refetched = take_snapshot(url, previous=first, mask_rules=new)
+    assert not refetched['validators'].get('not_modified')
+    assert refetched['masking']['rules'] == new.digest
+    assert refetched['dom']['hash'] != first['dom']['hash']
+
+    unmasked = take_snapshot(url, previous=first)
+    assert not unmasked['validators'].get('not_modified')
+    assert 'masking' not in unmasked
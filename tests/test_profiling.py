@@ -0,0 +1,63 @@
+#\"\"\"test_profiling.py
+
+#SlowestProfiles: paralel işler profillenirken birbirini beklememeli, yalnızca en yavaş N iş
+#saklanıp diske yazılmalı; tracemalloc son iş bitince kapanmalı.
+#--timings: serileştirme süresi yazılan snapshot'ın meta.timings alanında olmalı.
+#\"\"\"
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import pytest
+
+from capture_snapshot import capture_single
+from snapshot_profiling import SlowestProfiles
+from snapshot_store import load_snapshot
+
+
+def _job(profiler, key, seconds, barrier=None):
+    with profiler.profile(key):
+        if barrier is not None:
+            barrier.wait(timeout=5)
+        time.sleep(seconds)
+
+
+@pytest.mark.skipif(sys.version_info >= (3, 12), reason='cProfile is process-wide on 3.12+, jobs are serialized')
+def test_profiled_jobs_run_concurrently(tmp_path):
+    profiler = SlowestProfiles(str(tmp_path), top=2)
+    # dört iş de profil bağlamına aynı anda girebilmeli; kilit tutulsaydı barrier zaman aşımına uğrardı
+    barrier = threading.Barrier(4)
+    threads = [threading.Thread(target=_job, args=(profiler, f'job{i}', 0.05 * (i + 1), barrier)) for i in range(4)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert time.perf_counter() - t0 < 0.05 * (1 + 2 + 3 + 4)
+    assert not tracemalloc.is_tracing()
+    assert sorted(key for _, _, key, _, _ in profiler._heap) == ['job2', 'job3']
+
+
+def test_dump_writes_slowest_first(tmp_path):
+    profiler = SlowestProfiles(str(tmp_path), top=2, memory=False)
+    for i, seconds in enumerate((0.01, 0.05, 0.03)):
+        _job(profiler, f'https://example.com/{i}', seconds)
+    out = profiler.dump()
+    assert [o['key'] for o in out] == ['https://example.com/1', 'https://example.com/2']
+    assert all(os.path.exists(o['profile']) and os.path.exists(o['report']) for o in out)
+    assert out[0]['tracemalloc_peak_bytes'] is None
+
+
+@pytest.mark.parametrize('ext', ['.json', '.snap'])
+def test_serialize_timing_is_persisted(site, tmp_path, ext):
+    url = site.write('page.html', '<html><body>' + '<p>satır</p>' * 500 + '</body></html>')
+    out = tmp_path / f'page{ext}'
+    returned = capture_single(url, str(out), timings=True)
+    stored = load_snapshot(str(out))['meta']['timings']
+    for stage in ('download', 'parse', 'serialize'):
+        assert stage in stored['stages']
+    assert 'write' not in stored['stages'] and 'write' in returned['meta']['timings']['stages']
+    assert returned['meta']['timings']['stages']['serialize'] == stored['stages']['serialize']
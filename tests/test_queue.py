@@ -0,0 +1,106 @@
+#\"\"\"test_queue.py
+
+#JobQueue: kira süresi dolan işin başka worker'a geçmesi, yeniden deneme / failed geçişleri ve
+#run_queue_worker ile uçtan uca yakalama (ağ hatası yeniden denenir, başarılı işler checkpoint'lenir).
+#\"\"\"
+
+import os
+
+import pytest
+
+import snapshot_store
+from capture_snapshot import run_queue_worker
+from snapshot_store import JobQueue
+
+
+class _Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(snapshot_store.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.db'), max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def _out(tmp_path):
+    return lambda idx, url: str(tmp_path / f'{idx:03d}.json')
+
+
+def test_add_is_idempotent(queue, tmp_path):
+    assert queue.add(['https://a/', 'https://b/'], _out(tmp_path)) == {'added': 2, 'skipped': 0}
+    assert queue.add(['https://b/', 'https://c/'], _out(tmp_path)) == {'added': 1, 'skipped': 1}
+    assert queue.status()['counts']['pending'] == 3
+
+
+def test_expired_lease_moves_to_another_worker(queue, clock, tmp_path):
+    queue.add(['https://a/'], _out(tmp_path))
+    job = queue.claim('w1', lease=30)
+    assert job['attempts'] == 1
+    assert queue.claim('w2', lease=30) is None          # kirada
+
+    clock.now += 10
+    assert queue.renew([job['id']], 'w1', lease=30) == 1
+    clock.now += 35                                     # yenilenen kira da doldu
+    stolen = queue.claim('w2', lease=30)
+    assert stolen['id'] == job['id'] and stolen['attempts'] == 2
+    assert queue.complete(job['id'], 'w1', {}) is False  # eski sahibinin checkpoint'i reddedilir
+    assert queue.fail(job['id'], 'w1', 'x') == 'lost'
+    assert queue.complete(job['id'], 'w2', {'ok': True}) is True
+    assert queue.status()['counts']['done'] == 1
+
+
+def test_expired_lease_without_attempts_left_fails(queue, clock, tmp_path):
+    queue.add(['https://a/'], _out(tmp_path))
+    queue.claim('w1', lease=5)
+    clock.now += 6
+    queue.claim('w2', lease=5)
+    clock.now += 6
+    assert queue.claim('w3', lease=5) is None
+    status = queue.status()
+    assert status['counts']['failed'] == 1
+    assert status['failed'][0]['error'] == 'lease_expired'
+
+
+def test_fail_retries_after_delay_then_fails(queue, clock, tmp_path):
+    queue.add(['https://a/'], _out(tmp_path))
+    job = queue.claim('w1', lease=30)
+    assert queue.fail(job['id'], 'w1', 'timeout', retry_delay=10) == 'retry'
+    assert queue.claim('w1', lease=30) is None           # gecikme dolmadı
+    clock.now += 10
+    job = queue.claim('w1', lease=30)
+    assert job['attempts'] == 2
+    assert queue.fail(job['id'], 'w1', 'timeout') == 'failed'
+    assert queue.remaining() == 0
+
+    assert queue.retry_failed() == 1
+    assert queue.claim('w1', lease=30)['attempts'] == 1
+
+
+def test_release_worker_returns_leases(queue, tmp_path):
+    queue.add(['https://a/', 'https://b/'], _out(tmp_path))
+    queue.claim('w1', lease=300)
+    queue.claim('w1', lease=300)
+    assert queue.release_worker('w1') == 2
+    assert queue.status()['counts']['pending'] == 2
+
+
+def test_worker_captures_and_retries(queue, site, tmp_path):
+    ok = site.write('ok.html', '<html><body><p>tamam</p></body></html>')
+    queue.add([ok, 'http://127.0.0.1:9/kapali'], _out(tmp_path))
+    res = run_queue_worker(queue, worker_id='w1', workers=2, retry_delay=0, poll=0.05, per_host=2)
+    assert res['jobs'] == {'claimed': 3, 'done': 1, 'retry': 1, 'failed': 1, 'lost': 0}
+    assert res['queue']['done'] == 1 and res['queue']['failed'] == 1
+    assert os.path.exists(tmp_path / '001.json')
@@ -0,0 +1,74 @@
+#\"\"\"test_signals.py
+
+#Tek geçişli _SignalExtractor, eski BeautifulSoup(html, "html.parser") yoluyla aynı sinyalleri
+#üretmeli (title, görünür metin hash'i / uzunluğu, tag_counts, asset listeleri, normalize HTML hash'i);
+#aksi halde eski snapshot'larla kıyaslar sahte değişim gösterir.
+#\"\"\"
+
+import hashlib
+import re
+from collections import Counter
+
+import pytest
+
+from capture_snapshot import extract_signals
+
+bs4 = pytest.importorskip('bs4')
+
+PAGES = {
+    'basic': '<html><head><title> Başlık </title></head><body><p>Merhaba <b>dünya</b>!</p></body></html>',
+    'script_style': '<html><head><style>p{color:red}</style><script src="/a.js">var x = "<p>";</script></head>'
+                    '<body><p>görünür</p><script>document.write(1)</script></body></html>',
+    'assets': '<link rel="stylesheet" href=" /s.css "><link rel="canonical" href="/c"><img src="/1.png">'
+              '<img src="/1.png"><img alt="yok"><img src=""><script src="/b.js"></script>',
+    'unclosed': '<div><p>bir<p>iki<li>üç<table><tr><td>dört</table></div><span>beş',
+    'void_and_stray': '<br><br/></br><p>x</p></p><img src=a.png></img><hr>son',
+    'entities': '<p>&amp; &lt;tag&gt; &copy; &#169; &#xA9; &nosuch; &amp</p><p title="&quot;q&quot;">a&nbsp;b</p>',
+    'attrs': '<div class="  b   a  " id=x data-x=\'1"2\' hidden>t</div><a rel="nofollow  noopener" href=/y>y</a>',
+    'meta_charset': '<head><meta charset="windows-1254"><meta http-equiv="Content-Type" '
+                    'content="text/html; charset=iso-8859-9"></head><body>ş</body>',
+    'whitespace': '<pre>\n  a\n   b</pre><textarea>  x  </textarea><p>\n\n   çok    boşluk \t </p>\n\n',
+    'comments_cdata': '<!DOCTYPE html><!-- yorum --><p>a<![CDATA[ veri ]]>b</p><?pi x?><!ELEMENT x>',
+    'template_ruby': '<template><p>gizli</p></template><ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby>',
+    'nested_title': '<title>dış</title><svg><title>iç</title></svg><p>gövde</p>',
+    'empty': '',
+    'text_only': 'sadece metin',
+}
+
+
+def _bs4_signals(html):
+    """Yakalamanın eski (BeautifulSoup) sürümündeki sinyal hesabı."""
+    soup = bs4.BeautifulSoup(html, 'html.parser')
+    title = soup.title.string.strip() if soup.title and soup.title.string else ''
+    for tag in soup(['script', 'style']):
+        tag.extract()
+    visible_text = soup.get_text(separator=' ', strip=True)
+    norm = re.sub(r'\s+', ' ', visible_text).strip()
+    tokens = re.findall(r'[^\s]+', norm)
+    return {
+        'title': title,
+        'text_hash': hashlib.sha256(' '.join(tokens).encode('utf-8')).hexdigest(),
+        'text_len': len(visible_text),
+        'tag_counts': dict(Counter(t.name for t in soup.find_all(True))),
+        'img_srcs': [(t.get('src') or '').strip() for t in soup.find_all('img') if t.get('src')],
+        'link_hrefs': [(t.get('href') or '').strip() for t in soup.find_all('link') if t.get('href')],
+        'script_srcs': [(t.get('src') or '').strip() for t in soup.find_all('script') if t.get('src')],
+        'html_hash': hashlib.sha256(re.sub(r'\s+', ' ', soup.decode()).encode('utf-8')).hexdigest(),
+    }
+
+
+@pytest.mark.parametrize('name', sorted(PAGES))
+def test_matches_beautifulsoup(name):
+    html = PAGES[name]
+    expected = _bs4_signals(html)
+    got = extract_signals(html)
+    assert {k: got[k] for k in expected} == expected
+
+
+def test_matches_beautifulsoup_on_chunk_boundaries():
+    # uzun sayfa: HTMLParser veriyi parça parça işler, metin birleştirme sınırları değişmemeli
+    html = '<html><body>' + ''.join(f'<div id="d{i}"><p>satır {i} &amp; devamı</p><img src="/i{i % 7}.png"></div>\n'
+                                    for i in range(2000)) + '</body></html>'
+    expected = _bs4_signals(html)
+    got = extract_signals(html)
+    assert {k: got[k] for k in expected} == expected
@@ -0,0 +1,54 @@
+#\"\"\"test_startup.py
+
+#CLI açılış bütçesi: import'ta ağır modüller yüklenmemeli, görselsiz bir 'pair' kıyası
+#yalın interpreter açılışına STARTUP_BUDGET_MS'ten fazla eklememeli.
+#\"\"\"
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+from bench_snapshots import LAZY_MODULES, STARTUP_BUDGET_MS
+from capture_snapshot import capture_single
+from conftest import ROOT
+
+STARTUP_RUNS = 5
+
+
+def _env():
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+
+def _median_ms(cmd):
+    times = []
+    for i in range(STARTUP_RUNS + 1):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT, env=_env(), check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if i:   # ilk çalıştırma ısınma (.pyc derleme)
+            times.append((time.perf_counter() - t0) * 1000)
+    return sorted(times)[len(times) // 2]
+
+
+def test_import_does_not_load_lazy_modules():
+    probe = subprocess.run(
+        [sys.executable, '-c', 'import json, sys, compare_snapshots, capture_snapshot; '
+                               f'print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))'],
+        cwd=ROOT, env=_env(), capture_output=True, text=True, check=True)
+    assert json.loads(probe.stdout) == []
+
+
+def test_pair_startup_within_budget(site, tmp_path):
+    first, second = tmp_path / 'a.json', tmp_path / 'b.json'
+    capture_single(site.write('a.html', '<html><body><p>bir</p></body></html>'), str(first))
+    capture_single(site.write('b.html', '<html><body><p>iki</p></body></html>'), str(second))
+    assert 'screenshot_hex' not in json.loads(first.read_text(encoding='utf-8'))
+
+    interpreter = _median_ms([sys.executable, '-c', 'pass'])
+    pair = _median_ms([sys.executable, '-m', 'compare_snapshots', 'pair', '--first', str(first),
+                       '--second', str(second), '--out', str(tmp_path / 'pair.json')])
+    assert json.loads((tmp_path / 'pair.json').read_text(encoding='utf-8'))['summary']['text_changed']
+    assert pair - interpreter <= STARTUP_BUDGET_MS, f'pair overhead {pair - interpreter:.1f} ms'